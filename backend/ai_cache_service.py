@@ -0,0 +1,86 @@
+"""
+Cache en base des résultats IA (table ai_result_cache)
+La clé est un hash des entrées normalisées, de la version du prompt et du modèle : changer le
+prompt ou le modèle invalide donc naturellement les anciennes entrées. Les entrées expirent
+après AI_CACHE_TTL et les moins récemment utilisées sont supprimées au-delà de AI_CACHE_MAX_ENTRIES.
+"""
+
+import json
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, AIResultCache
+
+class AIResultCacheStore:
+    """
+    Lecture / écriture du cache ; une erreur de base est traitée comme un miss, et le cache
+    est ignoré hors contexte d'application (AIService utilisé dans un script)
+    """
+
+    @staticmethod
+    def make_key(operation: str, inputs: Dict, model: str, prompt_version: str) -> str:
+        payload = json.dumps([operation, model, prompt_version, inputs], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Résultat en cache (avec 'cached': True et le coût en tokens de l'appel d'origine), ou None"""
+        if not has_app_context():
+            return None
+        try:
+            now = datetime.utcnow()
+            entry = db.session.get(AIResultCache, key)
+            if entry is None or entry.expires_at <= now:
+                return None
+
+            AIResultCache.query.filter_by(cache_key=key) \
+                .update({'hits': AIResultCache.hits + 1, 'last_used_at': now}, synchronize_session=False)
+            result = json.loads(entry.result)
+            tokens_used = entry.tokens_used
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[AI CACHE] Lecture impossible: {e}")
+            return None
+
+        result.update({'cached': True, 'tokens_used': tokens_used})
+        return result
+
+    def put(self, key: str, operation: str, model: str, prompt_version: str, result: Dict):
+        """Enregistre un résultat réussi, puis applique l'expiration et la limite de taille"""
+        if not has_app_context():
+            return
+        now = datetime.utcnow()
+        try:
+            db.session.merge(AIResultCache(
+                cache_key=key,
+                operation=operation,
+                model=model,
+                prompt_version=prompt_version,
+                result=json.dumps(result),
+                tokens_used=result.get('tokens_used', 0),
+                hits=0,
+                created_at=now,
+                last_used_at=now,
+                expires_at=now + timedelta(seconds=current_app.config['AI_CACHE_TTL'])
+            ))
+            self._evict(now)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[AI CACHE] Écriture impossible: {e}")
+
+    def _evict(self, now: datetime):
+        AIResultCache.query.filter(AIResultCache.expires_at <= now).delete(synchronize_session=False)
+
+        max_entries = current_app.config['AI_CACHE_MAX_ENTRIES']
+        # Date de dernière utilisation de la plus récente entrée à supprimer (LRU)
+        cutoff = db.session.query(AIResultCache.last_used_at) \
+            .order_by(AIResultCache.last_used_at.desc()) \
+            .offset(max_entries) \
+            .limit(1) \
+            .scalar()
+        if cutoff is not None:
+            AIResultCache.query.filter(AIResultCache.last_used_at <= cutoff).delete(synchronize_session=False)
@@ -0,0 +1,362 @@
+"""
+Clients des providers IA (OpenAI, Anthropic Claude, Google Gemini) derrière une interface commune
+Chaque provider a une session HTTP persistante partagée par tout le processus (pool de connexions,
+TLS réutilisé), avec timeouts et nouvelles tentatives (backoff exponentiel avec jitter) sur les
+erreurs réseau, 429 et 5xx. Les URLs sont surchargeables, par exemple vers un faux provider local.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import requests
+from abc import ABC, abstractmethod
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, Optional
+
+from metrics_service import record_ai_call
+
+# Connexions conservées par provider (au moins le nombre de threads gunicorn)
+POOL_SIZE = int(os.getenv('AI_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('AI_READ_TIMEOUT', 30))  # En streaming : délai max entre deux morceaux
+MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+BACKOFF_BASE = float(os.getenv('AI_BACKOFF_BASE', 0.5))  # secondes, doublé à chaque tentative
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class ProviderError(Exception):
+    """
+    Échec d'un appel à un provider ; le message ne contient jamais la clé API
+    error_class : timeout, rate_limit, server_error, client_error, network ou bad_response
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, error_class: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        if error_class is None and status is not None:
+            error_class = 'rate_limit' if status == 429 else 'server_error' if status >= 500 else 'client_error'
+        self.error_class = error_class or 'network'
+
+def _network_error_class(error: requests.RequestException) -> str:
+    # Un délai dépassé pendant la lecture d'un flux arrive sous forme de ConnectionError
+    if isinstance(error, requests.Timeout) or 'timed out' in str(error):
+        return 'timeout'
+    return 'network'
+
+class ProviderClient(ABC):
+    """
+    Interface commune : complete() pour une réponse complète, stream() pour un flux de morceaux
+    Les sous-classes décrivent seulement le format de requête et de réponse de leur API.
+    """
+    name = ''
+    label = ''  # Nom affiché du modèle
+    error_label = ''  # Préfixe des messages d'erreur
+    key_env = ''
+    base_url_env = ''
+    default_base_url = ''
+    default_max_tokens = 1000
+    # Tarifs en dollars par million de tokens (entrée / sortie), pour l'estimation du coût
+    price_input = 0.0
+    price_output = 0.0
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self.api_key = api_key if api_key is not None else os.getenv(self.key_env)
+        self.base_url = (base_url or os.getenv(self.base_url_env) or self.default_base_url).rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def mask(self, message: str) -> str:
+        """Masque la clé API dans un message d'erreur"""
+        return message.replace(self.api_key, '***') if self.api_key else message
+
+    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (input_tokens * self.price_input + output_tokens * self.price_output) / 1_000_000
+
+    def complete(self, prompt: str, system: Optional[str] = None, temperature: float = 0.7,
+                 max_tokens: Optional[int] = None, operation: str = 'other') -> Dict:
+        """
+        Génère une réponse complète ; operation sert uniquement aux métriques
+
+        Returns:
+            {'text': ..., 'tokens_used': ..., 'input_tokens': ..., 'output_tokens': ...}
+
+        Raises:
+            ProviderError après épuisement des nouvelles tentatives
+        """
+        start = time.monotonic()
+        try:
+            url, headers, payload = self._request(prompt, system, temperature,
+                                                  max_tokens or self.default_max_tokens, stream=False)
+            response = self._post(url, headers, payload)
+            try:
+                result = self._parse(response.json())
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise ProviderError(f'Réponse inattendue: {self.mask(str(e))}', error_class='bad_response')
+        except ProviderError as e:
+            record_ai_call(self.name, operation, time.monotonic() - start, e.error_class)
+            raise
+        self._record(operation, start, result)
+        return result
+
+    def stream(self, prompt: str, system: Optional[str] = None, temperature: float = 0.7,
+               max_tokens: Optional[int] = None, operation: str = 'other') -> Iterator[Dict]:
+        """
+        Génère une réponse en streaming. Les nouvelles tentatives n'ont lieu qu'avant le premier octet.
+
+        Yields:
+            {'type': 'token', 'text': ...} puis {'type': 'usage', 'tokens_used': ..., 'input_tokens': ...,
+            'output_tokens': ...}
+        """
+        start = time.monotonic()
+        try:
+            url, headers, payload = self._request(prompt, system, temperature,
+                                                  max_tokens or self.default_max_tokens, stream=True)
+            response = self._post(url, headers, payload, stream=True)
+            with response:
+                try:
+                    for event in self._parse_stream(self._iter_sse(response)):
+                        if event['type'] == 'usage':
+                            self._record(operation, start, event)
+                        yield event
+                except requests.RequestException as e:
+                    raise ProviderError(self.mask(str(e)), error_class=_network_error_class(e))
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ProviderError(f'Réponse inattendue: {self.mask(str(e))}', error_class='bad_response')
+        except ProviderError as e:
+            record_ai_call(self.name, operation, time.monotonic() - start, e.error_class)
+            raise
+
+    def _record(self, operation: str, start: float, usage: Dict):
+        input_tokens, output_tokens = usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+        record_ai_call(self.name, operation, time.monotonic() - start, None, input_tokens, output_tokens,
+                       self.estimate_cost(input_tokens, output_tokens))
+
+    def _post(self, url: str, headers: Dict, payload: Dict, stream: bool = False) -> requests.Response:
+        """POST avec nouvelles tentatives (erreurs réseau, 429, 5xx) et backoff exponentiel avec jitter"""
+        for attempt in range(MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                response = self.session.post(url, headers=headers, json=payload, stream=stream,
+                                             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                if response.status_code < 400:
+                    return response
+                error = ProviderError(f'{response.status_code} {self.mask(response.text[:300])}',
+                                      response.status_code)
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    raise error
+            except requests.RequestException as e:
+                error = ProviderError(self.mask(str(e)), error_class=_network_error_class(e))
+
+            if attempt < MAX_RETRIES:
+                delay = self._backoff(attempt, retry_after)
+                print(f"[AI] {self.error_label}: {error} - nouvelle tentative dans {delay:.1f}s")
+                time.sleep(delay)
+        raise error
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+        """Full jitter : délai aléatoire entre 0 et BACKOFF_BASE * 2^attempt, Retry-After respecté"""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        try:
+            delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    @staticmethod
+    def _iter_sse(response) -> Iterator[Dict]:
+        """Décode un flux Server-Sent Events et retourne le JSON de chaque ligne 'data:'"""
+        response.encoding = 'utf-8'
+        # chunk_size=None : les lignes sont traitées dès leur arrivée, sans attendre un tampon plein
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            yield json.loads(data)
+
+    # À implémenter par chaque provider
+    @abstractmethod
+    def _request(self, prompt, system, temperature, max_tokens, stream):
+        """Retourne (url, headers, payload)"""
+
+    @abstractmethod
+    def _parse(self, data: Dict) -> Dict:
+        ...
+
+    @abstractmethod
+    def _parse_stream(self, events: Iterator[Dict]) -> Iterator[Dict]:
+        ...
+
+class OpenAIClient(ProviderClient):
+    name = 'openai'
+    label = 'OpenAI GPT-4o-mini'
+    error_label = 'OpenAI'
+    key_env = 'OPENAI_API_KEY'
+    base_url_env = 'OPENAI_BASE_URL'
+    default_base_url = 'https://api.openai.com'
+    model = 'gpt-4o-mini'  # Plus économique que GPT-4
+    price_input, price_output = 0.15, 0.60
+
+    def _request(self, prompt, system, temperature, max_tokens, stream):
+        messages = [{'role': 'system', 'content': system}] if system else []
+        messages.append({'role': 'user', 'content': prompt})
+        payload = {'model': self.model, 'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens}
+        if stream:
+            payload.update({'stream': True, 'stream_options': {'include_usage': True}})
+        headers = {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'}
+        return f'{self.base_url}/v1/chat/completions', headers, payload
+
+    @staticmethod
+    def _usage(usage: Dict) -> Dict:
+        return {
+            'tokens_used': usage.get('total_tokens', 0),
+            'input_tokens': usage.get('prompt_tokens', 0),
+            'output_tokens': usage.get('completion_tokens', 0)
+        }
+
+    def _parse(self, data):
+        return {'text': data['choices'][0]['message']['content'], **self._usage(data.get('usage') or {})}
+
+    def _parse_stream(self, events):
+        usage = {}
+        for chunk in events:
+            for choice in chunk.get('choices') or []:
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    yield {'type': 'token', 'text': text}
+            if chunk.get('usage'):
+                usage = chunk['usage']
+        yield {'type': 'usage', **self._usage(usage)}
+
+class AnthropicClient(ProviderClient):
+    name = 'anthropic'
+    label = 'Claude 3 Haiku'
+    error_label = 'Claude'
+    key_env = 'ANTHROPIC_API_KEY'
+    base_url_env = 'ANTHROPIC_BASE_URL'
+    default_base_url = 'https://api.anthropic.com'
+    default_max_tokens = 1024
+    model = 'claude-3-haiku-20240307'  # Version économique
+    price_input, price_output = 0.25, 1.25
+
+    def _request(self, prompt, system, temperature, max_tokens, stream):
+        payload = {
+            'model': self.model,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
+        if system:
+            payload['system'] = system
+        if stream:
+            payload['stream'] = True
+        headers = {
+            'x-api-key': self.api_key,
+            'anthropic-version': '2023-06-01',
+            'content-type': 'application/json'
+        }
+        return f'{self.base_url}/v1/messages', headers, payload
+
+    def _parse(self, data):
+        usage = data.get('usage', {})
+        input_tokens, output_tokens = usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+        return {
+            'text': data['content'][0]['text'],
+            'tokens_used': input_tokens + output_tokens,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens
+        }
+
+    def _parse_stream(self, events):
+        input_tokens = output_tokens = 0
+        for event in events:
+            event_type = event.get('type')
+            if event_type == 'message_start':
+                input_tokens = event.get('message', {}).get('usage', {}).get('input_tokens', 0)
+            elif event_type == 'content_block_delta':
+                text = event.get('delta', {}).get('text')
+                if text:
+                    yield {'type': 'token', 'text': text}
+            elif event_type == 'message_delta':
+                output_tokens = event.get('usage', {}).get('output_tokens', 0)
+            elif event_type == 'error':
+                raise ProviderError(event.get('error', {}).get('message', 'erreur du flux'), error_class='server_error')
+        yield {'type': 'usage', 'tokens_used': input_tokens + output_tokens,
+               'input_tokens': input_tokens, 'output_tokens': output_tokens}
+
+class GeminiClient(ProviderClient):
+    name = 'gemini'
+    label = 'Google Gemini 2.5 Flash'
+    error_label = 'Gemini'
+    key_env = 'GEMINI_API_KEY'
+    base_url_env = 'GEMINI_BASE_URL'
+    default_base_url = 'https://generativelanguage.googleapis.com'
+    default_max_tokens = 2048
+    model = 'gemini-2.5-flash'
+    price_input, price_output = 0.30, 2.50
+
+    def _request(self, prompt, system, temperature, max_tokens, stream):
+        payload = {
+            'contents': [{'parts': [{'text': prompt}]}],
+            'generationConfig': {'temperature': temperature, 'maxOutputTokens': max_tokens}
+        }
+        if system:
+            payload['systemInstruction'] = {'parts': [{'text': system}]}
+        method = 'streamGenerateContent?alt=sse&' if stream else 'generateContent?'
+        url = f'{self.base_url}/v1beta/models/{self.model}:{method}key={self.api_key}'
+        return url, {'Content-Type': 'application/json'}, payload
+
+    @staticmethod
+    def _usage(usage: Dict) -> Dict:
+        output_tokens = usage.get('candidatesTokenCount', 0) + usage.get('thoughtsTokenCount', 0)
+        return {
+            'tokens_used': usage.get('totalTokenCount', 0),
+            'input_tokens': usage.get('promptTokenCount', 0),
+            'output_tokens': output_tokens
+        }
+
+    def _parse(self, data):
+        if not data.get('candidates'):
+            raise ProviderError('Réponse Gemini vide', error_class='bad_response')
+        return {
+            'text': data['candidates'][0]['content']['parts'][0]['text'],
+            **self._usage(data.get('usageMetadata') or {})
+        }
+
+    def _parse_stream(self, events):
+        usage = {}
+        for chunk in events:
+            for candidate in chunk.get('candidates') or []:
+                for part in candidate.get('content', {}).get('parts') or []:
+                    if part.get('text'):
+                        yield {'type': 'token', 'text': part['text']}
+            usage = chunk.get('usageMetadata') or usage
+        yield {'type': 'usage', **self._usage(usage)}
+
+PROVIDERS = {
+    'openai': OpenAIClient,
+    'anthropic': AnthropicClient,
+    'gemini': GeminiClient
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_provider(name: str) -> Optional[ProviderClient]:
+    """Client partagé (une seule session par provider et par processus), None si provider inconnu"""
+    with _clients_lock:
+        if name not in _clients and name in PROVIDERS:
+            _clients[name] = PROVIDERS[name]()
+        return _clients.get(name)
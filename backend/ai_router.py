@@ -0,0 +1,199 @@
+"""
+Routage des appels IA entre providers selon leur santé récente
+Pour chaque provider : fenêtre des dernières latences / erreurs et disjoncteur (circuit breaker)
+ouvert après AI_BREAKER_FAILURES échecs consécutifs, pendant AI_BREAKER_COOLDOWN secondes, puis
+un seul appel d'essai (half-open). Le provider demandé passe en premier s'il est disponible,
+les autres ensuite du plus fiable au plus rapide. Avec AI_HEDGE=1, une requête de secours est
+envoyée au provider suivant si le premier n'a pas répondu après son 95e centile de latence ;
+la première réponse gagne. L'état est propre à chaque processus.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ai_providers import POOL_SIZE, ProviderClient, ProviderError
+
+HEALTH_WINDOW = int(os.getenv('AI_HEALTH_WINDOW', 50))  # derniers appels pris en compte
+BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', 3))
+BREAKER_COOLDOWN = float(os.getenv('AI_BREAKER_COOLDOWN', 30))  # secondes
+HEDGE_ENABLED = os.getenv('AI_HEDGE', '0') == '1'  # Une requête de secours peut doubler le coût
+HEDGE_MIN_DELAY = float(os.getenv('AI_HEDGE_MIN_DELAY', 1))
+HEDGE_MAX_DELAY = float(os.getenv('AI_HEDGE_MAX_DELAY', 10))  # aussi utilisé tant que l'historique est court
+ROUTE_DEADLINE = float(os.getenv('AI_ROUTE_DEADLINE', 45))  # au-delà, le template est utilisé
+MIN_SAMPLES = 5
+
+class ProviderHealth:
+    """Latences et erreurs récentes d'un provider, et état de son disjoncteur"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=HEALTH_WINDOW)  # secondes, appels réussis
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)  # True = succès
+        self.consecutive_failures = 0
+        self.opened_at = None  # disjoncteur ouvert depuis (time.monotonic)
+        self.trial_started = None  # appel d'essai en cours (half-open)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+            return 'open'
+        return 'half_open'
+
+    def acquire(self) -> bool:
+        """Autorise un appel ; en half-open, un seul appel d'essai à la fois"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running():
+                self.trial_started = time.monotonic()
+                return True
+            return False
+
+    def available(self) -> bool:
+        """Comme acquire() mais sans réserver l'appel d'essai"""
+        state = self.state
+        return state == 'closed' or (state == 'half_open' and not self._trial_running())
+
+    def _trial_running(self) -> bool:
+        # Un essai sans résultat (client déconnecté pendant un flux) expire après le délai du disjoncteur
+        return self.trial_started is not None and time.monotonic() - self.trial_started < BREAKER_COOLDOWN
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        with self._lock:
+            self.outcomes.append(ok)
+            self.trial_started = None
+            if ok:
+                if latency is not None:
+                    self.latencies.append(latency)
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                self.consecutive_failures += 1
+                if self.opened_at is not None or self.consecutive_failures >= BREAKER_FAILURES:
+                    # Ouverture, ou réouverture après un essai raté
+                    self.opened_at = time.monotonic()
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self.latencies)
+        if len(values) < MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            outcomes = list(self.outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def to_dict(self) -> Dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            'state': self.state,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_latency': round(p50, 3) if p50 is not None else None,
+            'p95_latency': round(p95, 3) if p95 is not None else None,
+            'samples': len(self.outcomes)
+        }
+
+class ProviderRouter:
+    """Choisit les providers, bascule sur le suivant en cas d'échec et envoie les requêtes de secours"""
+
+    def __init__(self, providers: Dict[str, ProviderClient]):
+        self.providers = providers
+        self.health = {name: ProviderHealth() for name in providers}
+        # Les appels tournent dans ce pool pour pouvoir attendre le premier qui répond
+        self._executor = ThreadPoolExecutor(max_workers=POOL_SIZE * 2, thread_name_prefix='ai-route')
+
+    def candidates(self, preferred: Optional[str]) -> List[ProviderClient]:
+        """Providers configurés et disponibles : le provider demandé d'abord, puis par fiabilité et latence"""
+        others = sorted(
+            (c for name, c in self.providers.items() if name != preferred),
+            key=lambda c: (self.health[c.name].error_rate(), self.health[c.name].percentile(50) or HEDGE_MAX_DELAY)
+        )
+        first = [self.providers[preferred]] if preferred in self.providers else []
+        return [c for c in first + others if c.configured and self.health[c.name].available()]
+
+    def record(self, client: ProviderClient, ok: bool, latency: Optional[float] = None):
+        self.health[client.name].record(ok, latency)
+
+    def hedge_delay(self, client: ProviderClient) -> float:
+        p95 = self.health[client.name].percentile(95)
+        return HEDGE_MAX_DELAY if p95 is None else min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95))
+
+    def call(self, preferred: Optional[str],
+             fn: Callable[[ProviderClient], Dict]) -> Optional[Tuple[ProviderClient, Dict]]:
+        """
+        Exécute fn(client) sur le meilleur provider, avec bascule et requête de secours
+
+        Returns:
+            (client, résultat) de la première réponse réussie, None si aucun provider n'a répondu
+            avant AI_ROUTE_DEADLINE (l'appelant utilise alors le template)
+        """
+        remaining = self.candidates(preferred)
+        pending = {}  # future -> client
+        started = {}  # future -> début de l'appel
+        deadline = time.monotonic() + ROUTE_DEADLINE
+        hedged = False
+
+        def launch() -> bool:
+            while remaining:
+                client = remaining.pop(0)
+                if self.health[client.name].acquire():
+                    future = self._executor.submit(self._timed, client, fn)
+                    pending[future], started[future] = client, time.monotonic()
+                    return True
+            return False
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            timeout = deadline - now
+            can_hedge = HEDGE_ENABLED and not hedged and remaining and len(pending) == 1
+            if can_hedge:
+                future = next(iter(pending))
+                primary = pending[future]
+                timeout = min(timeout, started[future] + self.hedge_delay(primary) - now)
+
+            done, _ = wait(pending, timeout=max(0, timeout), return_when=FIRST_COMPLETED)
+            if not done:
+                if time.monotonic() >= deadline:
+                    print(f"[AI ROUTE] Aucune réponse après {ROUTE_DEADLINE:.0f}s")
+                    return None
+                hedged = launch()
+                if hedged:
+                    print(f"[AI ROUTE] {primary.error_label} lent, requête de secours envoyée")
+                continue
+
+            for future in done:
+                client = pending.pop(future)
+                try:
+                    return client, future.result()
+                except ProviderError as e:
+                    print(f"[AI ROUTE] {client.error_label}: {e}")
+            if not pending:
+                launch()  # Bascule sur le provider suivant
+        return None
+
+    def _timed(self, client: ProviderClient, fn: Callable[[ProviderClient], Dict]) -> Dict:
+        start = time.monotonic()
+        try:
+            result = fn(client)
+        except ProviderError:
+            self.record(client, False)
+            raise
+        except Exception as e:
+            self.record(client, False)
+            raise ProviderError(client.mask(f'Erreur inattendue: {e}'))
+        self.record(client, True, time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> Dict:
+        return {name: {'configured': client.configured, **self.health[name].to_dict()}
+                for name, client in self.providers.items()}
@@ -3,15 +3,45 @@ Service d'intelligence artificielle pour la génération de lettres de motivatio
 Supporte plusieurs providers : OpenAI, Anthropic Claude, Google Gemini
 """
 
-import os
-import requests
-from typing import Dict, Optional
+import re
+import json
+from typing import Dict, Iterator, Optional
+
+from ai_providers import PROVIDERS, ProviderError, get_provider
+from ai_router import ProviderRouter
+from metrics_service import record_ai_error
+from fetch_service import FetchError, page_fetcher
+
+COVER_LETTER_SYSTEM = 'Tu es un expert en rédaction de lettres de motivation professionnelles.'
+
+# Versions des prompts, incluses dans la clé du cache de résultats : à incrémenter à chaque modification
+PARSE_PROMPT_VERSION = '1'
+MATCHING_PROMPT_VERSION = '1'
+
+def normalize_text(text: Optional[str]) -> str:
+    """Texte comparable (clé de cache) : espaces multiples et retours à la ligne réduits à un espace"""
+    return ' '.join((text or '').split())
 
 class AIService:
-    def __init__(self):
-        self.openai_key = os.getenv('OPENAI_API_KEY')
-        self.anthropic_key = os.getenv('ANTHROPIC_API_KEY')
-        self.gemini_key = os.getenv('GEMINI_API_KEY')
+    def __init__(self, result_cache=None):
+        # Clients partagés (session HTTP persistante par provider)
+        self.providers = {name: get_provider(name) for name in PROVIDERS}
+        # Santé des providers, bascule et requêtes de secours pour la lettre de motivation
+        self.router = ProviderRouter(self.providers)
+        # Cache des résultats de parsing / matching (AIResultCacheStore), optionnel
+        self.result_cache = result_cache
+    
+    @property
+    def openai_key(self):
+        return self.providers['openai'].api_key
+    
+    @property
+    def anthropic_key(self):
+        return self.providers['anthropic'].api_key
+    
+    @property
+    def gemini_key(self):
+        return self.providers['gemini'].api_key
         
     def generate_cover_letter(
         self, 
@@ -25,22 +55,34 @@ class AIService:
         Args:
             job_data: Informations sur le poste (entreprise, annonce, etc.)
             user_profile: Profil de l'utilisateur (optionnel)
-            provider: 'openai', 'anthropic', ou 'gemini'
+            provider: 'openai', 'anthropic', ou 'gemini' (essayé en premier s'il est disponible)
             
         Returns:
             Dict avec la lettre générée et métadonnées
         """
         prompt = self._build_prompt(job_data, user_profile)
         
-        if provider == 'openai' and self.openai_key:
-            return self._generate_with_openai(prompt)
-        elif provider == 'anthropic' and self.anthropic_key:
-            return self._generate_with_claude(prompt)
-        elif provider == 'gemini' and self.gemini_key:
-            return self._generate_with_gemini(prompt)
-        else:
-            # Fallback : génération simple sans IA
-            return self._generate_template(job_data, user_profile)
+        answer = self.router.call(
+            provider, lambda client: client.complete(prompt, system=COVER_LETTER_SYSTEM, temperature=0.7,
+                                           operation='cover_letter')
+        )
+        if answer:
+            client, result = answer
+            return {
+                'success': True,
+                'letter': result['text'],
+                'provider': client.label,
+                'tokens_used': result['tokens_used']
+            }
+        # Fallback : génération simple sans IA
+        return self._template_fallback(job_data, user_profile)
+    
+    def _template_fallback(self, job_data: Dict, user_profile: Optional[Dict]) -> Dict:
+        """Dernier recours : lettre template, en précisant si des providers étaient configurés"""
+        result = self._generate_template(job_data, user_profile)
+        if any(client.configured for client in self.providers.values()):
+            result['provider'] = 'Template personnalisé (providers IA indisponibles)'
+        return result
     
     def _build_prompt(self, job_data: Dict, user_profile: Optional[Dict]) -> str:
         """Construit le prompt pour l'IA"""
@@ -108,123 +150,52 @@ Génère UNIQUEMENT la lettre complète, prête à être envoyée."""
         
         return prompt
     
-    def _generate_with_openai(self, prompt: str) -> Dict:
-        """Génère avec OpenAI GPT"""
-        try:
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.openai_key}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'gpt-4o-mini',  # Plus économique que GPT-4
-                    'messages': [
-                        {'role': 'system', 'content': 'Tu es un expert en rédaction de lettres de motivation professionnelles.'},
-                        {'role': 'user', 'content': prompt}
-                    ],
-                    'temperature': 0.7,
-                    'max_tokens': 1000
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                'success': True,
-                'letter': data['choices'][0]['message']['content'],
-                'provider': 'OpenAI GPT-4o-mini',
-                'tokens_used': data.get('usage', {}).get('total_tokens', 0)
-            }
-        except Exception as e:
-            error_msg = str(e)
-            if self.openai_key and self.openai_key in error_msg:
-                error_msg = error_msg.replace(self.openai_key, '***')
-            return {
-                'success': False,
-                'error': f'Erreur OpenAI: {error_msg}'
-            }
+    # ============= Génération en streaming =============
     
-    def _generate_with_claude(self, prompt: str) -> Dict:
-        """Génère avec Anthropic Claude"""
-        try:
-            response = requests.post(
-                'https://api.anthropic.com/v1/messages',
-                headers={
-                    'x-api-key': self.anthropic_key,
-                    'anthropic-version': '2023-06-01',
-                    'content-type': 'application/json'
-                },
-                json={
-                    'model': 'claude-3-haiku-20240307',  # Version économique
-                    'max_tokens': 1024,
-                    'messages': [
-                        {'role': 'user', 'content': prompt}
-                    ]
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                'success': True,
-                'letter': data['content'][0]['text'],
-                'provider': 'Claude 3 Haiku',
-                'tokens_used': data.get('usage', {}).get('input_tokens', 0) + data.get('usage', {}).get('output_tokens', 0)
-            }
-        except Exception as e:
-            error_msg = str(e)
-            if self.anthropic_key and self.anthropic_key in error_msg:
-                error_msg = error_msg.replace(self.anthropic_key, '***')
-            return {
-                'success': False,
-                'error': f'Erreur Claude: {error_msg}'
-            }
-    
-    def _generate_with_gemini(self, prompt: str) -> Dict:
-        """Génère avec Google Gemini"""
-        try:
-            print("[GEMINI] Envoi de la requête...")
-            response = requests.post(
-                f'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={self.gemini_key}',
-                headers={'Content-Type': 'application/json'},
-                json={
-                    'contents': [{
-                        'parts': [{'text': prompt}]
-                    }],
-                    'generationConfig': {
-                        'temperature': 0.7,
-                        'maxOutputTokens': 2048  # Augmenté pour lettres plus longues
-                    }
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            print(f"[GEMINI] Réponse reçue")
-            print(f"[GEMINI] Data complète: {data}")
-            
-            letter_text = data['candidates'][0]['content']['parts'][0]['text']
-            print(f"[GEMINI] Longueur lettre: {len(letter_text)} caractères")
-            
-            return {
-                'success': True,
-                'letter': letter_text,
-                'provider': 'Google Gemini 2.5 Flash',
-                'tokens_used': 0  # Gemini ne retourne pas toujours cette info
-            }
-        except Exception as e:
-            error_msg = str(e)
-            # Masquer la clé API dans le message d'erreur
-            if self.gemini_key and self.gemini_key in error_msg:
-                error_msg = error_msg.replace(self.gemini_key, '***')
-            return {
-                'success': False,
-                'error': f'Erreur Gemini: {error_msg}'
-            }
+    def stream_cover_letter(
+        self,
+        job_data: Dict,
+        user_profile: Optional[Dict] = None,
+        provider: str = 'openai'
+    ) -> Iterator[Dict]:
+        """
+        Variante streaming de generate_cover_letter : le texte est transmis au fil de la génération
+        Les providers sont essayés dans l'ordre du routeur tant qu'aucun texte n'a été envoyé.
+        
+        Yields:
+            {'type': 'token', 'text': ...} pour chaque morceau, puis
+            {'type': 'done', 'provider': ..., 'tokens_used': ...}
+            ou {'type': 'error', 'error': ...} (clés API masquées)
+        """
+        prompt = self._build_prompt(job_data, user_profile)
+        
+        for client in self.router.candidates(provider):
+            if not self.router.health[client.name].acquire():
+                continue
+            started = False
+            try:
+                for event in client.stream(prompt, system=COVER_LETTER_SYSTEM, temperature=0.7,
+                                           operation='cover_letter'):
+                    if event['type'] == 'token':
+                        started = True
+                        yield event
+                    else:
+                        self.router.record(client, True)
+                        yield {'type': 'done', 'provider': client.label, 'tokens_used': event['tokens_used']}
+                return
+            except ProviderError as e:
+                self.router.record(client, False)
+                if started:
+                    # Texte déjà envoyé : impossible de basculer sans le dupliquer
+                    yield {'type': 'error', 'error': f'Erreur {client.error_label}: {e}'}
+                    return
+                print(f"[AI Stream] {client.error_label}: {e} - provider suivant")
+        
+        # Fallback : lettre template envoyée ligne par ligne
+        result = self._template_fallback(job_data, user_profile)
+        for line in re.findall(r'[^\n]*\n|[^\n]+', result['letter']):
+            yield {'type': 'token', 'text': line}
+        yield {'type': 'done', 'provider': result['provider'], 'tokens_used': 0}
     
     def _generate_template(self, job_data: Dict, user_profile: Optional[Dict]) -> Dict:
         """Génère une lettre template sans IA (fallback)"""
@@ -296,37 +267,22 @@ Dans l'attente de votre retour, je vous prie d'agréer, Madame, Monsieur, l'expr
         Accepte soit du texte direct, soit une URL à scraper
         """
         if not self.gemini_key:
-            return {'success': False, 'error': 'Gemini API key non configurée'}
+            return {'success': False, 'error': 'Gemini API key non configurée', 'retryable': False}
         
-        # Si URL fournie, scraper le contenu
+        # Si URL fournie, scraper le contenu (lecture bornée, texte conservé et revalidé)
         if url and not text:
             try:
                 print(f"[AI Parse] Scraping URL: {url}")
-                from bs4 import BeautifulSoup
-                
-                response = requests.get(url, timeout=15, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                
-                if response.status_code != 200:
-                    return {'success': False, 'error': f'Erreur lors du scraping: Status {response.status_code}'}
-                
-                soup = BeautifulSoup(response.content, 'lxml')
-                
-                # Extraire le texte principal (enlever scripts, styles, etc.)
-                for script in soup(['script', 'style', 'nav', 'header', 'footer']):
-                    script.decompose()
-                
-                text = soup.get_text(separator='\n', strip=True)
-                
-                # Limiter à 5000 caractères pour l'API
-                text = text[:5000]
-                
-                print(f"[AI Parse] Texte extrait: {len(text)} caractères")
-                
-            except Exception as e:
+                page = page_fetcher.fetch_text(url)
+            except FetchError as e:
                 print(f"[AI Parse] Erreur scraping: {e}")
-                return {'success': False, 'error': f'Erreur scraping: {str(e)}'}
+                if e.status:
+                    return {'success': False, 'error': f'Erreur lors du scraping: Status {e.status}',
+                            'retryable': not e.permanent}
+                return {'success': False, 'error': f'Erreur scraping: {str(e)}', 'retryable': not e.permanent}
+            
+            text = page['text']
+            print(f"[AI Parse] Texte extrait: {len(text)} caractères" + (" (cache)" if page['cached'] else ""))
         
         # Extraire le nom de l'entreprise depuis l'URL comme fallback
         url_company_hint = ""
@@ -360,83 +316,51 @@ IMPORTANT :
 - Pour l'entreprise, utilise toutes les infos disponibles (texte, URL, domaine)
 - Réponds UNIQUEMENT avec le JSON, sans texte avant ou après."""
 
+        client = self.providers['gemini']
+        cache_key, cached = self._cache_lookup(
+            'parse_announcement', {'text': normalize_text(text), 'url_hint': url_company_hint},
+            client, PARSE_PROMPT_VERSION
+        )
+        if cached:
+            print(f"[AI Parse] Résultat en cache")
+            return cached
+        
         try:
             print(f"[AI Parse] Envoi requête à Gemini...")
-            response = requests.post(
-                f'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={self.gemini_key}',
-                json={
-                    'contents': [{'parts': [{'text': prompt}]}],
-                    'generationConfig': {
-                        'temperature': 0.3,
-                        'maxOutputTokens': 800  # Augmenté pour éviter la troncature
-                    }
-                },
-                timeout=30
-            )
+            # 800 tokens : suffisant pour éviter la troncature du JSON
+            result = client.complete(prompt, temperature=0.3, max_tokens=800, operation='parse_announcement')
+        except ProviderError as e:
+            print(f"[AI Parse] ERREUR: {e}")
+            return {'success': False, 'error': f'Erreur API {e}', 'retryable': e.error_class != 'client_error'}
+        
+        text_response = self._extract_json(result['text'])
+        print(f"[AI Parse] JSON extrait ({len(text_response)} chars):\n{text_response}\n[FIN]")
+        
+        try:
+            parsed_data = json.loads(text_response)
+            print(f"[AI Parse] ✓ Parsing réussi")
             
-            print(f"[AI Parse] Status code: {response.status_code}")
+            return self._cache_store(cache_key, 'parse_announcement', client, PARSE_PROMPT_VERSION, {
+                'success': True,
+                'data': parsed_data,
+                'tokens_used': result['tokens_used']
+            })
+        except json.JSONDecodeError as je:
+            record_ai_error(client.name, 'parse_announcement', 'parse_failure')
+            print(f"[AI Parse] ✗ Erreur JSON: {je}")
+            print(f"[AI Parse] Position erreur: ligne {je.lineno}, colonne {je.colno}")
             
-            if response.status_code == 200:
-                result = response.json()
-                
-                text_response = result['candidates'][0]['content']['parts'][0]['text'].strip()
-                print(f"[AI Parse] Texte brut: {len(text_response)} caractères")
-                
-                # Nettoyer les markdown code blocks
-                # Enlever ```json au début
-                if text_response.startswith('```json'):
-                    text_response = text_response[7:].strip()
-                elif text_response.startswith('```'):
-                    text_response = text_response[3:].strip()
-                
-                # Enlever ``` à la fin
-                if text_response.endswith('```'):
-                    text_response = text_response[:-3].strip()
-                
-                # Enlever tout texte avant le premier { et après le dernier }
-                start_idx = text_response.find('{')
-                end_idx = text_response.rfind('}')
-                
-                if start_idx != -1 and end_idx != -1:
-                    text_response = text_response[start_idx:end_idx+1]
-                
-                print(f"[AI Parse] JSON extrait ({len(text_response)} chars):\n{text_response}\n[FIN]")
-                
-                import json
-                
-                try:
-                    parsed_data = json.loads(text_response)
-                    print(f"[AI Parse] ✓ Parsing réussi")
-                    
-                    return {
-                        'success': True,
-                        'data': parsed_data
-                    }
-                except json.JSONDecodeError as je:
-                    print(f"[AI Parse] ✗ Erreur JSON: {je}")
-                    print(f"[AI Parse] Position erreur: ligne {je.lineno}, colonne {je.colno}")
-                    
-                    return {
-                        'success': False, 
-                        'error': f'JSON invalide: {str(je)}'
-                    }
-            else:
-                error_text = response.text
-                print(f"[AI Parse] ERREUR: {error_text}")
-                return {'success': False, 'error': f'Erreur API {response.status_code}: {error_text}'}
-                
-        except Exception as e:
-            print(f"[AI Parse] EXCEPTION: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {'success': False, 'error': str(e)}
+            return {
+                'success': False, 
+                'error': f'JSON invalide: {str(je)}'
+            }
     
     def calculate_matching_score(self, job_data: Dict, user_profile: Dict) -> Dict:
         """
         Calcule un score de matching entre le profil utilisateur et l'offre (0-100)
         """
         if not self.gemini_key:
-            return {'success': False, 'error': 'Gemini API key non configurée'}
+            return {'success': False, 'error': 'Gemini API key non configurée', 'retryable': False}
         
         prompt = f"""Tu es un expert en recrutement. Analyse la compatibilité entre ce profil candidat et cette offre d'emploi.
 
@@ -462,89 +386,88 @@ Retourne UNIQUEMENT un JSON avec :
 
 IMPORTANT : JSON uniquement, sans texte additionnel."""
 
+        client = self.providers['gemini']
+        cache_key, cached = self._cache_lookup(
+            'matching_score',
+            {
+                'job': {key: normalize_text(str(value or '')) for key, value in job_data.items()},
+                'profile': {key: normalize_text(str(value or '')) for key, value in user_profile.items()}
+            },
+            client, MATCHING_PROMPT_VERSION
+        )
+        if cached:
+            return cached
+        
         try:
-            response = requests.post(
-                f'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={self.gemini_key}',
-                json={
-                    'contents': [{'parts': [{'text': prompt}]}],
-                    'generationConfig': {
-                        'temperature': 0.5,
-                        'maxOutputTokens': 800
-                    }
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 429:
+            result = client.complete(prompt, temperature=0.5, max_tokens=800, operation='matching_score')
+        except ProviderError as e:
+            if e.status == 429:
                 return {
                     'success': False,
                     'error': 'Quota API Gemini dépassé (429). Veuillez réessayer dans quelques minutes ou vérifier votre clé API.'
                 }
-            
-            if response.status_code == 200:
-                result = response.json()
-                text_response = result['candidates'][0]['content']['parts'][0]['text'].strip()
-                
-                print(f"[AI Service] Réponse brute Gemini: {text_response[:200]}...")
-                
-                # Nettoyer la réponse de manière plus robuste
-                if text_response.startswith('```'):
-                    # Extraire le contenu entre les ``` markers
-                    parts = text_response.split('```')
-                    if len(parts) >= 2:
-                        text_response = parts[1]
-                        # Supprimer le mot 'json' si présent au début
-                        if text_response.strip().startswith('json'):
-                            text_response = text_response.strip()[4:]
-                
-                # Supprimer les espaces et retours à la ligne au début et à la fin
-                text_response = text_response.strip()
-                
-                # Si la réponse contient du texte avant le JSON, essayer de l'extraire
-                if not text_response.startswith('{'):
-                    # Chercher le premier {
-                    start_idx = text_response.find('{')
-                    if start_idx != -1:
-                        text_response = text_response[start_idx:]
-                
-                # Si la réponse contient du texte après le JSON, essayer de le supprimer
-                if not text_response.endswith('}'):
-                    # Chercher le dernier }
-                    end_idx = text_response.rfind('}')
-                    if end_idx != -1:
-                        text_response = text_response[:end_idx + 1]
-                
-                print(f"[AI Service] JSON nettoyé: {text_response[:200]}...")
-                
-                import json
-                try:
-                    analysis = json.loads(text_response)
-                    
-                    # Valider la structure
-                    if not isinstance(analysis, dict):
-                        return {'success': False, 'error': 'Format de réponse invalide'}
-                    
-                    # S'assurer que tous les champs nécessaires sont présents
-                    if 'score' not in analysis:
-                        analysis['score'] = 50  # Valeur par défaut
-                    if 'points_forts' not in analysis:
-                        analysis['points_forts'] = []
-                    if 'points_faibles' not in analysis:
-                        analysis['points_faibles'] = []
-                    if 'conseils' not in analysis:
-                        analysis['conseils'] = []
-                    
-                    return {
-                        'success': True,
-                        'analysis': analysis
-                    }
-                except json.JSONDecodeError as je:
-                    print(f"[AI Service] Erreur JSON: {str(je)}")
-                    print(f"[AI Service] Texte problématique: {text_response}")
-                    return {'success': False, 'error': f'Impossible de parser la réponse: {str(je)}'}
-            else:
-                return {'success': False, 'error': f'Erreur API: {response.status_code}'}
-                
-        except Exception as e:
-            print(f"[AI Service] Exception: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            print(f"[AI Service] Exception: {e}")
+            return {'success': False, 'error': f'Erreur API: {e}', 'retryable': e.error_class != 'client_error'}
+        
+        print(f"[AI Service] Réponse brute Gemini: {result['text'][:200]}...")
+        text_response = self._extract_json(result['text'])
+        print(f"[AI Service] JSON nettoyé: {text_response[:200]}...")
+        
+        try:
+            analysis = json.loads(text_response)
+        except json.JSONDecodeError as je:
+            record_ai_error(client.name, 'matching_score', 'parse_failure')
+            print(f"[AI Service] Erreur JSON: {str(je)}")
+            print(f"[AI Service] Texte problématique: {text_response}")
+            return {'success': False, 'error': f'Impossible de parser la réponse: {str(je)}'}
+        
+        # Valider la structure
+        if not isinstance(analysis, dict):
+            record_ai_error(client.name, 'matching_score', 'parse_failure')
+            return {'success': False, 'error': 'Format de réponse invalide'}
+        
+        # S'assurer que tous les champs nécessaires sont présents
+        analysis.setdefault('score', 50)  # Valeur par défaut
+        analysis.setdefault('points_forts', [])
+        analysis.setdefault('points_faibles', [])
+        analysis.setdefault('conseils', [])
+        
+        return self._cache_store(cache_key, 'matching_score', client, MATCHING_PROMPT_VERSION, {
+            'success': True,
+            'analysis': analysis,
+            'tokens_used': result['tokens_used']
+        })
+    
+    def _cache_lookup(self, operation: str, inputs: Dict, client, prompt_version: str):
+        """Retourne (clé, résultat en cache ou None) ; (None, None) sans cache configuré"""
+        if not self.result_cache:
+            return None, None
+        key = self.result_cache.make_key(operation, inputs, client.model, prompt_version)
+        return key, self.result_cache.get(key)
+    
+    def _cache_store(self, key: Optional[str], operation: str, client, prompt_version: str, result: Dict) -> Dict:
+        """Met en cache un résultat réussi et le retourne"""
+        if key:
+            self.result_cache.put(key, operation, client.model, prompt_version, result)
+        return result
+    
+    @staticmethod
+    def _extract_json(text_response: str) -> str:
+        """Extrait l'objet JSON d'une réponse de modèle (blocs markdown et texte autour retirés)"""
+        text_response = text_response.strip()
+        
+        # Enlever ```json au début et ``` à la fin
+        if text_response.startswith('```json'):
+            text_response = text_response[7:].strip()
+        elif text_response.startswith('```'):
+            text_response = text_response[3:].strip()
+        if text_response.endswith('```'):
+            text_response = text_response[:-3].strip()
+        
+        # Enlever tout texte avant le premier { et après le dernier }
+        start_idx = text_response.find('{')
+        end_idx = text_response.rfind('}')
+        if start_idx != -1 and end_idx != -1:
+            text_response = text_response[start_idx:end_idx + 1]
+        
+        return text_response
@@ -1,36 +1,83 @@
 import os
 import io
 import csv
-from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, make_response, send_from_directory
+import json
+import base64
+import hashlib
+import socket
+import click
+from datetime import datetime, date, timedelta
+from flask import Flask, Response, abort, g, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_mail import Mail, Message
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_mail import Mail
 from werkzeug.utils import secure_filename
 from sqlalchemy import func, extract
+from sqlalchemy.orm import joinedload, selectinload, subqueryload
 from config import Config
-from models import db, User, Candidature, PasswordResetToken, Document
+from models import (
+    db, User, Candidature, CandidatureTag, PasswordResetToken, Document, AIJob,
+    normalize_tags, parse_date, bump_data_version
+)
+from search_service import ensure_search_index, apply_search
+from import_service import import_candidatures, iter_csv_rows, iter_json_rows
 from ai_service import AIService
+from ai_cache_service import AIResultCacheStore
 from chatbot_service import ChatBotService
+from cache_service import create_cache
+from job_service import enqueue, work
+from outbox_service import queue_email, work as send_emails
+from reminder_service import due_reminders, dispatch_due_reminders
+from metrics_service import metrics
+from perf_service import init_request_instrumentation
+from password_service import PasswordHasher, PasswordHasherBusy
+from auth_service import AccessTokens, TokenError
+from storage_service import DocumentStorage, unlink
+from stats_service import (
+    histogram, histogram_from_counters, stats_from_counters, get_timezone, GRANULARITES,
+    record_candidature, record_change, rebuild_counters
+)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Initialiser les services IA
-ai_service = AIService()
+# Initialiser les services IA (résultats de parsing / matching mis en cache en base)
+ai_service = AIService(result_cache=AIResultCacheStore())
 chatbot_service = ChatBotService()
 
+# Cache des réponses (statistiques, listes de candidatures)
+response_cache = create_cache(app.config)
+
+# Hachage des mots de passe dans un pool borné (429 quand il est saturé)
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    queue_size=app.config['PASSWORD_HASH_QUEUE']
+)
+
+# Jetons d'accès signés émis par /api/login (vérifiés sans requête SQL)
+access_tokens = AccessTokens(
+    app.config['SECRET_KEY'],
+    ttl=app.config['ACCESS_TOKEN_TTL'],
+    cache_size=app.config['ACCESS_TOKEN_CACHE_SIZE']
+)
+
 # Configuration pour l'upload de fichiers
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'png', 'jpg', 'jpeg'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 
+# Nombre de lignes lues et envoyées par paquet lors de l'export CSV
+EXPORT_CHUNK_SIZE = 500
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Créer le dossier uploads s'il n'existe pas
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Fichiers des documents stockés une seule fois par contenu (SHA-256)
+document_storage = DocumentStorage(UPLOAD_FOLDER)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -43,12 +90,23 @@ mail = Mail(app)
 # Configurer CORS
 CORS(app, resources={r"/api/*": {"origins": Config.CORS_ORIGINS}})
 
-# Créer les tables
+# Latence par route et requêtes SQL par requête (métriques, journal des requêtes lentes)
+init_request_instrumentation(app)
+
+# Créer les tables et l'index de recherche plein texte
 with app.app_context():
     db.create_all()
+    ensure_search_index()
 
 # ============= Routes d'authentification =============
 
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    """Pool de hachage saturé : refus immédiat plutôt que d'occuper un worker"""
+    response = jsonify({'error': 'Trop de connexions en cours, réessayez dans quelques secondes'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 @app.route('/api/register', methods=['POST'])
 def register():
     """Inscription d'un nouvel utilisateur"""
@@ -68,7 +126,7 @@ def register():
     new_user = User(
         username=data['username'],
         email=data['email'],
-        password_hash=generate_password_hash(data['password']),
+        password_hash=password_hasher.hash(data['password']),
         telephone=data.get('telephone'),
         ville=data.get('ville')
     )
@@ -91,12 +149,24 @@ def login():
     
     user = User.query.filter_by(username=data['username']).first()
     
-    if not user or not check_password_hash(user.password_hash, data['password']):
+    # Même coût de vérification que l'utilisateur existe ou non
+    if not password_hasher.verify(user.password_hash if user else None, data['password']):
         return jsonify({'error': 'Identifiants incorrects'}), 401
     
+    # Paramètres de hachage modifiés depuis : nouveau hachage (ignoré si le pool est saturé)
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash(data['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass
+    
     return jsonify({
         'message': 'Connexion réussie',
-        'user': user.to_dict()
+        'user': user.to_dict(),
+        'access_token': access_tokens.issue(user.id, user.token_version),
+        'token_type': 'Bearer',
+        'expires_in': access_tokens.ttl
     }), 200
 
 @app.route('/api/forgot-password', methods=['POST'])
@@ -116,17 +186,15 @@ def forgot_password():
     # Créer un token de réinitialisation
     reset_token = PasswordResetToken(user_id=user.id)
     db.session.add(reset_token)
-    db.session.commit()
     
     # Créer le lien de réinitialisation
     reset_link = f"{Config.FRONTEND_URL}/reset-password/{reset_token.token}"
     
-    # Envoyer l'email
-    try:
-        msg = Message(
-            subject='Réinitialisation de votre mot de passe - ApplicationTrack',
-            recipients=[user.email],
-            body=f'''Bonjour {user.username},
+    # Email mis en boîte d'envoi dans la même transaction que le token (envoyé par flask email-worker)
+    queue_email(
+        user.email,
+        'Réinitialisation de votre mot de passe - ApplicationTrack',
+        body=f'''Bonjour {user.username},
 
 Vous avez demandé la réinitialisation de votre mot de passe.
 
@@ -140,7 +208,7 @@ Si vous n'avez pas demandé cette réinitialisation, ignorez simplement cet emai
 Cordialement,
 L'équipe ApplicationTrack
 ''',
-            html=f'''
+        html=f'''
 <html>
 <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
     <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
@@ -169,11 +237,8 @@ L'équipe ApplicationTrack
 </body>
 </html>
 '''
-        )
-        mail.send(msg)
-    except Exception as e:
-        print(f"Erreur d'envoi d'email: {e}")
-        return jsonify({'error': 'Erreur lors de l\'envoi de l\'email'}), 500
+    )
+    db.session.commit()
     
     return jsonify({'message': 'Si un compte existe avec cet email, vous recevrez un lien de réinitialisation'}), 200
 
@@ -193,7 +258,9 @@ def reset_password(token):
     
     # Mettre à jour le mot de passe
     user = User.query.get(reset_token.user_id)
-    user.password_hash = generate_password_hash(data['password'])
+    user.password_hash = password_hasher.hash(data['password'])
+    # Les jetons d'accès émis avec l'ancien mot de passe sont révoqués
+    user.token_version = User.token_version + 1
     
     # Marquer le token comme utilisé
     reset_token.used = True
@@ -214,10 +281,164 @@ def verify_reset_token(token):
 
 # ============= Routes pour les candidatures =============
 
+# Expressions de tri autorisées pour la liste des candidatures (chacune couverte par un index)
+SORT_COLUMNS = {
+    'created_at': Candidature.created_at,
+    'date': Candidature.date,
+    'entreprise': func.lower(Candidature.entreprise)
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(value, candidature_id, sort_by, sort_order):
+    """Encode la position (valeur de tri, id) d'une candidature dans un curseur opaque"""
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    payload = json.dumps({'s': sort_by, 'o': sort_order, 'v': value, 'id': candidature_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Décode un curseur opaque, retourne None s'il est invalide"""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding).decode('utf-8'))
+        if not isinstance(data, dict) or 'v' not in data or not isinstance(data.get('id'), int):
+            return None
+        return data
+    except (ValueError, TypeError):
+        return None
+
+def wants_documents():
+    """Indique si les documents doivent être embarqués (?include_documents=false pour les exclure)"""
+    return request.args.get('include_documents', 'true').lower() not in ('false', '0', 'no')
+
+def load_candidature(candidature_id):
+    """Charge une candidature et ses documents (JOIN), puis ses tags (un seul SELECT IN)"""
+    return owned_candidatures() \
+        .options(joinedload(Candidature.documents), selectinload(Candidature.tag_links)) \
+        .filter_by(id=candidature_id) \
+        .first_or_404()
+
+# ============= Autorisation (jeton d'accès) =============
+
+def token_user_id():
+    """Utilisateur du jeton 'Authorization: Bearer', vérifié une fois par requête ; None sans jeton"""
+    if 'auth_user_id' not in g:
+        header = request.headers.get('Authorization', '')
+        scheme, _, token = header.partition(' ')
+        if scheme.lower() != 'bearer' or not token.strip():
+            g.auth_user_id = None
+        else:
+            try:
+                user_id, version = access_tokens.verify(token.strip())
+            except TokenError as e:
+                abort(401, description=str(e))
+            # Une seule lecture par requête (clé primaire, deux colonnes) : révocation du jeton
+            # et version des données pour l'ETag, sans charger l'utilisateur
+            row = db.session.query(User.token_version, User.data_version).filter_by(id=user_id).first()
+            if row is None or row.token_version != version:
+                abort(401, description='Jeton révoqué')
+            g.auth_user_id = user_id
+            g.auth_data_version = row.data_version
+    return g.auth_user_id
+
+def current_user_id(claimed=None):
+    """
+    Utilisateur autorisé pour la requête : celui du jeton (403 si `claimed` désigne un autre
+    utilisateur) ou, sans jeton et si AUTH_REQUIRED est désactivé, l'identifiant fourni par le client
+    """
+    user_id = token_user_id()
+    if user_id is not None:
+        if claimed not in (None, '') and str(claimed) != str(user_id):
+            abort(403)
+        return user_id
+    if app.config['AUTH_REQUIRED'] or claimed in (None, ''):
+        abort(401, description="Jeton d'accès requis")
+    try:
+        return int(claimed)
+    except (TypeError, ValueError):
+        abort(400, description='user_id invalide')
+
+def authorize_user(user_id):
+    """Accès aux données de user_id : le jeton suffit, sinon l'utilisateur doit exister (404)"""
+    user_data_version(user_id)
+    return user_id
+
+def user_data_version(user_id):
+    """
+    Version des données de user_id (ETag), après autorisation : déjà lue avec le jeton, sinon
+    seule cette colonne est lue (404 si l'utilisateur n'existe pas)
+    """
+    if current_user_id(user_id) == token_user_id():
+        return g.auth_data_version
+    version = db.session.query(User.data_version).filter_by(id=user_id).scalar()
+    if version is None:
+        abort(404)
+    return version
+
+def owned_candidatures():
+    """Candidatures accessibles : celles de l'utilisateur du jeton (toutes sans jeton, hors AUTH_REQUIRED)"""
+    user_id = token_user_id()
+    if user_id is not None:
+        return Candidature.query.filter_by(user_id=user_id)
+    if app.config['AUTH_REQUIRED']:
+        abort(401, description="Jeton d'accès requis")
+    return Candidature.query
+
+def owned_ai_jobs():
+    """Tâches IA accessibles : celles de l'utilisateur du jeton ; sans jeton (hors AUTH_REQUIRED), celles créées sans jeton"""
+    user_id = token_user_id()
+    if user_id is None and app.config['AUTH_REQUIRED']:
+        abort(401, description="Jeton d'accès requis")
+    return AIJob.query.filter(AIJob.user_id == user_id) if user_id is not None \
+        else AIJob.query.filter(AIJob.user_id.is_(None))
+
+# ============= Requêtes conditionnelles (ETag) =============
+
+def compute_etag(user_id, version, *extra):
+    """ETag fort : version des données de l'utilisateur + route et paramètres de la requête"""
+    params = sorted((name, value) for name, value in request.args.items(multi=True) if value != '')
+    key = json.dumps([request.path, params, *extra], default=str)
+    return f"{user_id}-{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+def not_modified(etag):
+    """Réponse 304 si le client possède déjà cette version (If-None-Match), sinon None"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+def with_etag(response, etag):
+    """Ajoute l'ETag ; no-cache force le navigateur à revalider à chaque affichage"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def cached_response(user_id, etag):
+    """304 si le client est à jour, sinon la réponse en cache (clé = utilisateur + ETag), sinon None"""
+    response = not_modified(etag)
+    if response:
+        return response
+    body = response_cache.get(f'user:{user_id}:{etag}')
+    if body is not None:
+        return with_etag(Response(body, mimetype='application/json'), etag)
+    return None
+
+def cache_response(user_id, etag, response):
+    """Met en cache le corps d'une réponse JSON réussie et lui ajoute son ETag"""
+    response_cache.set(f'user:{user_id}:{etag}', response.get_data())
+    return with_etag(response, etag)
+
 @app.route('/api/users/<int:user_id>/candidatures', methods=['GET'])
 def get_candidatures(user_id):
     """Récupérer toutes les candidatures d'un utilisateur avec recherche et filtres"""
-    user = User.query.get_or_404(user_id)
+    data_version = user_data_version(user_id)
+    
+    # Rien n'a changé depuis la dernière lecture : 304 ou réponse en cache, sans exécuter la requête
+    etag = compute_etag(user_id, data_version)
+    cached = cached_response(user_id, etag)
+    if cached:
+        return cached
     
     # Commencer par toutes les candidatures de l'utilisateur
     query = Candidature.query.filter_by(user_id=user_id)
@@ -227,24 +448,21 @@ def get_candidatures(user_id):
     if etat:
         query = query.filter(Candidature.etat == etat)
     
-    # Recherche par entreprise, annonce, notes, localisation
+    # Recherche plein texte par entreprise, annonce, notes, localisation, contact
+    rank = None
     search = request.args.get('search')
     if search:
-        search_pattern = f'%{search}%'
-        query = query.filter(
-            db.or_(
-                Candidature.entreprise.ilike(search_pattern),
-                Candidature.annonce.ilike(search_pattern),
-                Candidature.notes.ilike(search_pattern),
-                Candidature.localisation.ilike(search_pattern),
-                Candidature.contact_nom.ilike(search_pattern)
-            )
-        )
+        query, rank = apply_search(query, search)
     
-    # Filtre par tags
-    tags_filter = request.args.get('tags')
+    # Filtre exact par tags (?tags=java,python) : tous les tags (tags_mode=and, défaut) ou au moins un (or)
+    tags_filter = normalize_tags(request.args.get('tags', '').split(','))
     if tags_filter:
-        query = query.filter(Candidature.tags.ilike(f'%{tags_filter}%'))
+        matching = db.session.query(CandidatureTag.candidature_id) \
+            .filter(CandidatureTag.user_id == user_id, CandidatureTag.nom.in_(tags_filter))
+        if request.args.get('tags_mode', 'and') != 'or':
+            matching = matching.group_by(CandidatureTag.candidature_id) \
+                .having(func.count(CandidatureTag.nom) == len(tags_filter))
+        query = query.filter(Candidature.id.in_(matching))
     
     # Filtre par type de contrat
     type_contrat = request.args.get('type_contrat')
@@ -252,42 +470,107 @@ def get_candidatures(user_id):
         query = query.filter(Candidature.type_contrat == type_contrat)
     
     # Filtre par date (range)
-    date_debut = request.args.get('date_debut')
-    date_fin = request.args.get('date_fin')
-    if date_debut:
-        query = query.filter(Candidature.date >= date_debut)
-    if date_fin:
-        query = query.filter(Candidature.date <= date_fin)
-    
-    # Tri
-    sort_by = request.args.get('sort_by', 'created_at')
-    sort_order = request.args.get('sort_order', 'desc')
-    
-    if sort_by == 'date':
-        query = query.order_by(Candidature.date.desc() if sort_order == 'desc' else Candidature.date.asc())
-    elif sort_by == 'entreprise':
-        query = query.order_by(Candidature.entreprise.asc() if sort_order == 'asc' else Candidature.entreprise.desc())
-    else:  # created_at par défaut
-        query = query.order_by(Candidature.created_at.desc() if sort_order == 'desc' else Candidature.created_at.asc())
-    
-    candidatures = [c.to_dict() for c in query.all()]
-    return jsonify(candidatures), 200
+    for param, operator in (('date_debut', '__ge__'), ('date_fin', '__le__')):
+        value = request.args.get(param)
+        if value:
+            parsed = parse_date(value)
+            if parsed is None:
+                return jsonify({'error': f'Paramètre {param} invalide'}), 400
+            query = query.filter(getattr(Candidature.date, operator)(parsed))
+    
+    # Tri (l'id sert de départage pour un ordre stable) ; par pertinence par défaut lors d'une recherche
+    sort_by = request.args.get('sort_by') or ('pertinence' if rank is not None else 'created_at')
+    if sort_by not in SORT_COLUMNS and not (sort_by == 'pertinence' and rank is not None):
+        sort_by = 'created_at'
+    sort_order = 'asc' if request.args.get('sort_order', 'desc') == 'asc' else 'desc'
+    
+    # La valeur de tri est sélectionnée avec chaque ligne pour construire le curseur
+    sort_column = rank if sort_by == 'pertinence' else SORT_COLUMNS[sort_by]
+    query = query.add_columns(sort_column.label('sort_value'))
+    
+    if sort_order == 'desc':
+        query = query.order_by(sort_column.desc(), Candidature.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Candidature.id.asc())
+    
+    # Sans pagination demandée, on garde le format historique (liste complète)
+    include_documents = wants_documents()
+    
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is None and after is None:
+        # subqueryload : une seule requête pour tous les documents / tags, quel que soit le nombre de lignes
+        query = query.options(subqueryload(Candidature.tag_links))
+        if include_documents:
+            query = query.options(subqueryload(Candidature.documents))
+        candidatures = [c.to_dict(include_documents) for c, _ in query.all()]
+        return cache_response(user_id, etag, jsonify(candidatures))
+    
+    # Pagination par curseur (keyset) : pas d'OFFSET, coût constant quelle que soit la page
+    try:
+        limit = min(max(int(limit or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Paramètre limit invalide'}), 400
+    
+    if after:
+        cursor = decode_cursor(after)
+        if not cursor or cursor.get('s') != sort_by or cursor.get('o') != sort_order:
+            return jsonify({'error': 'Curseur invalide'}), 400
+        
+        value = cursor['v']
+        try:
+            if sort_by == 'created_at':
+                value = datetime.fromisoformat(value)
+            elif sort_by == 'date':
+                value = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Curseur invalide'}), 400
+        
+        if sort_order == 'desc':
+            query = query.filter(db.or_(
+                sort_column < value,
+                db.and_(sort_column == value, Candidature.id < cursor['id'])
+            ))
+        else:
+            query = query.filter(db.or_(
+                sort_column > value,
+                db.and_(sort_column == value, Candidature.id > cursor['id'])
+            ))
+    
+    # selectinload : un seul IN (...) car une page ne dépasse jamais MAX_PAGE_SIZE lignes
+    query = query.options(selectinload(Candidature.tag_links))
+    if include_documents:
+        query = query.options(selectinload(Candidature.documents))
+    
+    # On charge une ligne de plus pour savoir s'il existe une page suivante
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last, value = rows[-1]
+        next_cursor = encode_cursor(value, last.id, sort_by, sort_order)
+    
+    return cache_response(user_id, etag, jsonify({
+        'candidatures': [c.to_dict(include_documents) for c, _ in rows],
+        'next_cursor': next_cursor
+    }))
 
 @app.route('/api/users/<int:user_id>/candidatures', methods=['POST'])
 def create_candidature(user_id):
     """Créer une nouvelle candidature"""
-    user = User.query.get_or_404(user_id)
+    authorize_user(user_id)
     data = request.get_json()
     
     if not data or not data.get('entreprise') or not data.get('annonce') or not data.get('date'):
         return jsonify({'error': 'Données manquantes'}), 400
     
-    import json
-    from datetime import datetime as dt
+    date_candidature = parse_date(data['date'])
+    if date_candidature is None:
+        return jsonify({'error': 'Date invalide'}), 400
     
-    # Gérer les tags
-    tags = data.get('tags', [])
-    tags_json = json.dumps(tags) if tags else None
+    from datetime import datetime as dt
     
     # Gérer la date de rappel
     rappel_date = None
@@ -301,10 +584,9 @@ def create_candidature(user_id):
         user_id=user_id,
         entreprise=data['entreprise'],
         annonce=data['annonce'],
-        date=data['date'],
+        date=date_candidature,
         etat=data.get('etat', 'en_attente'),
         notes=data.get('notes', ''),
-        tags=tags_json,
         contact_nom=data.get('contact_nom'),
         contact_email=data.get('contact_email'),
         contact_telephone=data.get('contact_telephone'),
@@ -313,42 +595,98 @@ def create_candidature(user_id):
         localisation=data.get('localisation'),
         type_contrat=data.get('type_contrat')
     )
+    nouvelle_candidature.set_tags(data.get('tags', []))
     
     db.session.add(nouvelle_candidature)
+    record_candidature(nouvelle_candidature)
+    bump_data_version(user_id)
     db.session.commit()
+    response_cache.invalidate_user(user_id)
     
     return jsonify({
         'message': 'Candidature créée avec succès',
-        'candidature': nouvelle_candidature.to_dict()
+        'candidature': load_candidature(nouvelle_candidature.id).to_dict()
     }), 201
 
+@app.route('/api/users/<int:user_id>/candidatures/import', methods=['POST'])
+def bulk_import_candidatures(user_id):
+    """
+    Importer des candidatures en masse
+    
+    Accepte un fichier CSV (multipart, champ 'file') ou un tableau JSON
+    (éventuellement sous la clé 'candidatures'). ?dry_run=true valide sans rien écrire.
+    """
+    authorize_user(user_id)
+    dry_run = request.args.get('dry_run', request.form.get('dry_run', 'false')).lower() in ('true', '1', 'yes')
+    
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        rows = iter_csv_rows(file.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('candidatures')
+        if not isinstance(data, list):
+            return jsonify({'error': 'Fichier CSV ou tableau JSON attendu'}), 400
+        rows = iter_json_rows(data)
+    
+    try:
+        report = import_candidatures(rows, user_id, dry_run=dry_run)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Fichier CSV illisible : {e}'}), 400
+    finally:
+        # Des lots ont pu être validés même si le fichier est illisible plus loin
+        if not dry_run:
+            response_cache.invalidate_user(user_id)
+    
+    return jsonify(report), 200
+
 @app.route('/api/candidatures/<int:candidature_id>', methods=['GET'])
 def get_candidature(candidature_id):
     """Récupérer une candidature spécifique"""
-    candidature = Candidature.query.get_or_404(candidature_id)
-    return jsonify(candidature.to_dict()), 200
+    # Propriétaire et version lus sans charger la candidature
+    owner = owned_candidatures() \
+        .with_entities(Candidature.user_id, User.data_version) \
+        .join(User, User.id == Candidature.user_id) \
+        .filter(Candidature.id == candidature_id) \
+        .first_or_404()
+    etag = compute_etag(owner.user_id, owner.data_version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    candidature = load_candidature(candidature_id)
+    return with_etag(jsonify(candidature.to_dict()), etag)
 
 @app.route('/api/candidatures/<int:candidature_id>', methods=['PUT'])
 def update_candidature(candidature_id):
     """Mettre à jour une candidature"""
-    candidature = Candidature.query.get_or_404(candidature_id)
+    candidature = owned_candidatures().filter_by(id=candidature_id).first_or_404()
     data = request.get_json()
     
-    import json
     from datetime import datetime as dt
     
+    old_etat, old_contrat = candidature.etat, candidature.type_contrat
+    old_rappel = candidature.rappel_date
+    
     if 'entreprise' in data:
         candidature.entreprise = data['entreprise']
     if 'annonce' in data:
         candidature.annonce = data['annonce']
     if 'date' in data:
-        candidature.date = data['date']
+        date_candidature = parse_date(data['date'])
+        if date_candidature is None:
+            return jsonify({'error': 'Date invalide'}), 400
+        candidature.date = date_candidature
     if 'etat' in data:
         candidature.etat = data['etat']
     if 'notes' in data:
         candidature.notes = data['notes']
     if 'tags' in data:
-        candidature.tags = json.dumps(data['tags']) if data['tags'] else None
+        candidature.set_tags(data['tags'])
     if 'contact_nom' in data:
         candidature.contact_nom = data['contact_nom']
     if 'contact_email' in data:
@@ -363,6 +701,8 @@ def update_candidature(candidature_id):
                 pass
         else:
             candidature.rappel_date = None
+    if candidature.rappel_date != old_rappel:
+        candidature.rappel_sent_at = None  # Nouveau rappel : il sera envoyé à sa date
     if 'salaire' in data:
         candidature.salaire = data['salaire']
     if 'localisation' in data:
@@ -370,71 +710,130 @@ def update_candidature(candidature_id):
     if 'type_contrat' in data:
         candidature.type_contrat = data['type_contrat']
     
+    record_change(candidature.user_id, old_etat, candidature.etat, old_contrat, candidature.type_contrat)
+    bump_data_version(candidature.user_id)
     db.session.commit()
+    response_cache.invalidate_user(candidature.user_id)
     
     return jsonify({
         'message': 'Candidature mise à jour',
-        'candidature': candidature.to_dict()
+        'candidature': load_candidature(candidature_id).to_dict()
     }), 200
 
 @app.route('/api/candidatures/<int:candidature_id>', methods=['DELETE'])
 def delete_candidature(candidature_id):
     """Supprimer une candidature"""
-    candidature = Candidature.query.get_or_404(candidature_id)
+    candidature = owned_candidatures().filter_by(id=candidature_id).first_or_404()
+    user_id = candidature.user_id
+    # Fichiers supprimés après le commit, s'ils ne servent plus à aucun document
+    document_storage.delete_after_commit(*(document_storage.release(d) for d in candidature.documents))
+    record_candidature(candidature, delta=-1)
+    bump_data_version(user_id)
     db.session.delete(candidature)
     db.session.commit()
+    response_cache.invalidate_user(user_id)
     
     return jsonify({'message': 'Candidature supprimée'}), 200
 
 @app.route('/api/candidatures/<int:candidature_id>/etat', methods=['PATCH'])
 def update_etat(candidature_id):
     """Mettre à jour uniquement l'état d'une candidature"""
-    candidature = Candidature.query.get_or_404(candidature_id)
+    candidature = owned_candidatures().filter_by(id=candidature_id).first_or_404()
     data = request.get_json()
     
     if not data or 'etat' not in data:
         return jsonify({'error': 'État manquant'}), 400
     
+    record_change(candidature.user_id, candidature.etat, data['etat'])
     candidature.etat = data['etat']
+    bump_data_version(candidature.user_id)
     db.session.commit()
+    response_cache.invalidate_user(candidature.user_id)
     
     return jsonify({
         'message': 'État mis à jour',
-        'candidature': candidature.to_dict()
+        'candidature': load_candidature(candidature_id).to_dict()
     }), 200
 
+@app.route('/api/users/<int:user_id>/tags', methods=['GET'])
+def get_tags(user_id):
+    """Lister les tags d'un utilisateur avec le nombre de candidatures pour chacun (une seule requête)"""
+    data_version = user_data_version(user_id)
+    
+    etag = compute_etag(user_id, data_version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    rows = db.session.query(CandidatureTag.nom, func.count(CandidatureTag.candidature_id)) \
+        .filter(CandidatureTag.user_id == user_id) \
+        .group_by(CandidatureTag.nom) \
+        .order_by(func.count(CandidatureTag.candidature_id).desc(), CandidatureTag.nom) \
+        .all()
+    
+    return with_etag(jsonify([{'tag': nom, 'count': count} for nom, count in rows]), etag)
+
 # ============= Routes de statistiques =============
 
 @app.route('/api/users/<int:user_id>/stats', methods=['GET'])
 def get_stats(user_id):
     """Obtenir les statistiques des candidatures d'un utilisateur"""
-    user = User.query.get_or_404(user_id)
-    candidatures = user.candidatures
-    
-    stats = {
-        'total': len(candidatures),
-        'en_attente': len([c for c in candidatures if c.etat == 'en_attente']),
-        'entretien_passe': len([c for c in candidatures if c.etat == 'entretien_passe']),
-        'accepte': len([c for c in candidatures if c.etat == 'accepte']),
-        'refus_etude': len([c for c in candidatures if c.etat == 'refus_etude']),
-        'refuse_entretien': len([c for c in candidatures if c.etat == 'refuse_entretien']),
-        'sans_reponse': len([c for c in candidatures if c.etat == 'sans_reponse']),
-        'sans_reponse_entretien': len([c for c in candidatures if c.etat == 'sans_reponse_entretien'])
-    }
+    data_version = user_data_version(user_id)
+    
+    etag = compute_etag(user_id, data_version)
+    cached = cached_response(user_id, etag)
+    if cached:
+        return cached
+    
+    counters = stats_from_counters(user_id)
     
-    return jsonify(stats), 200
+    stats = {'total': counters['total']}
+    stats.update(counters['par_etat'])
+    
+    return cache_response(user_id, etag, jsonify(stats))
 
 @app.route('/api/users/<int:user_id>/stats/advanced', methods=['GET'])
 def get_advanced_stats(user_id):
-    """Obtenir des statistiques avancées avec timeline et taux de conversion"""
-    user = User.query.get_or_404(user_id)
+    """
+    Obtenir des statistiques avancées avec timeline et taux de conversion
+    
+    Paramètres optionnels :
+        granularity : 'day', 'week' ou 'month' pour la timeline (défaut 'day')
+        periods : nombre de périodes de la timeline (défaut 7)
+        mois : nombre de mois des statistiques mensuelles (défaut 6)
+        tz : fuseau horaire IANA, ex. 'Europe/Paris' (défaut STATS_TIMEZONE)
+    """
+    data_version = user_data_version(user_id)
+    
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITES:
+        return jsonify({'error': 'Granularité invalide (day, week ou month)'}), 400
     
-    # Statistiques de base
-    candidatures = user.candidatures
-    total = len(candidatures)
+    try:
+        periods = int(request.args.get('periods', 7))
+        mois = int(request.args.get('mois', 6))
+    except ValueError:
+        return jsonify({'error': 'Paramètres periods/mois invalides'}), 400
+    if not 1 <= periods <= GRANULARITES[granularity] or not 1 <= mois <= GRANULARITES['month']:
+        return jsonify({'error': 'Fenêtre de statistiques hors limites'}), 400
+    
+    tz = get_timezone(request.args.get('tz', app.config['STATS_TIMEZONE']))
+    if tz is None:
+        return jsonify({'error': 'Fuseau horaire inconnu'}), 400
+    
+    # La timeline dépend aussi du jour courant dans le fuseau demandé
+    etag = compute_etag(user_id, data_version, datetime.now(tz).date())
+    cached = cached_response(user_id, etag)
+    if cached:
+        return cached
+    
+    # Statistiques par état et par type de contrat, lues depuis les compteurs
+    counters = stats_from_counters(user_id)
+    stats_par_etat = counters['par_etat']
+    total = counters['total']
     
     if total == 0:
-        return jsonify({
+        return cache_response(user_id, etag, jsonify({
             'total': 0,
             'stats_par_etat': {},
             'taux_reponse': 0,
@@ -442,18 +841,7 @@ def get_advanced_stats(user_id):
             'taux_acceptation': 0,
             'timeline': [],
             'stats_mensuelles': []
-        }), 200
-    
-    # Statistiques par état
-    stats_par_etat = {
-        'en_attente': len([c for c in candidatures if c.etat == 'en_attente']),
-        'entretien_passe': len([c for c in candidatures if c.etat == 'entretien_passe']),
-        'accepte': len([c for c in candidatures if c.etat == 'accepte']),
-        'refus_etude': len([c for c in candidatures if c.etat == 'refus_etude']),
-        'refuse_entretien': len([c for c in candidatures if c.etat == 'refuse_entretien']),
-        'sans_reponse': len([c for c in candidatures if c.etat == 'sans_reponse']),
-        'sans_reponse_entretien': len([c for c in candidatures if c.etat == 'sans_reponse_entretien'])
-    }
+        }))
     
     # Taux de conversion
     reponses = total - stats_par_etat['sans_reponse'] - stats_par_etat['en_attente']
@@ -465,66 +853,148 @@ def get_advanced_stats(user_id):
     acceptations = stats_par_etat['accepte']
     taux_acceptation = (acceptations / total * 100) if total > 0 else 0
     
-    # Timeline des candidatures (7 derniers jours)
-    today = datetime.now()
-    timeline = []
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        count = len([c for c in candidatures if c.created_at.strftime('%Y-%m-%d') == date_str])
-        timeline.append({'date': date_str, 'count': count})
-    
-    # Statistiques mensuelles (6 derniers mois)
-    stats_mensuelles = []
-    for i in range(5, -1, -1):
-        date = today - timedelta(days=i*30)
-        mois = date.strftime('%Y-%m')
-        count = len([c for c in candidatures if c.created_at.strftime('%Y-%m') == mois])
-        stats_mensuelles.append({'mois': mois, 'count': count})
+    # Timeline (par défaut 7 derniers jours) et statistiques mensuelles (6 derniers mois) :
+    # compteurs journaliers dans le fuseau par défaut, sinon calcul SQL dans le fuseau demandé
+    if tz.key == app.config['STATS_TIMEZONE']:
+        timeline_data = histogram_from_counters(user_id, granularity, periods)
+        mensuel_data = histogram_from_counters(user_id, 'month', mois)
+    else:
+        timeline_data = histogram(user_id, granularity, periods, tz)
+        mensuel_data = histogram(user_id, 'month', mois, tz)
     
-    return jsonify({
+    timeline = [{'date': p['periode'], 'count': p['count']} for p in timeline_data]
+    stats_mensuelles = [{'mois': p['periode'], 'count': p['count']} for p in mensuel_data]
+    
+    return cache_response(user_id, etag, jsonify({
         'total': total,
         'stats_par_etat': stats_par_etat,
         'taux_reponse': round(taux_reponse, 2),
         'taux_entretien': round(taux_entretien, 2),
         'taux_acceptation': round(taux_acceptation, 2),
+        'stats_par_contrat': counters['par_contrat'],
         'timeline': timeline,
         'stats_mensuelles': stats_mensuelles
-    }), 200
+    }))
+
+@app.route('/api/users/<int:user_id>/rappels', methods=['GET'])
+def get_rappels(user_id):
+    """
+    Rappels échus ou proches, du plus ancien au plus récent (envoyés par email ou non)
+    
+    Paramètres optionnels :
+        days : rappels jusqu'à la fin du jour courant + days jours (défaut 0)
+        tz : fuseau horaire IANA du jour courant (défaut STATS_TIMEZONE)
+    """
+    data_version = user_data_version(user_id)
+    
+    days = request.args.get('days', 0, type=int)
+    if not 0 <= days <= 365:
+        return jsonify({'error': 'Paramètre days invalide (0 à 365)'}), 400
+    tz = get_timezone(request.args.get('tz', app.config['STATS_TIMEZONE']))
+    if tz is None:
+        return jsonify({'error': 'Fuseau horaire inconnu'}), 400
+    
+    today = datetime.now(tz).date()
+    etag = compute_etag(user_id, data_version, today)
+    response = not_modified(etag)
+    if response:
+        return response
+    
+    until = datetime.combine(today + timedelta(days=days + 1), datetime.min.time())
+    rappels = [{
+        'id': r.id,
+        'entreprise': r.entreprise,
+        'annonce': r.annonce,
+        'etat': r.etat,
+        'rappel_date': r.rappel_date.isoformat(),
+        'rappel_sent_at': r.rappel_sent_at.isoformat() if r.rappel_sent_at else None
+    } for r in due_reminders(user_id, until)]
+    
+    return with_etag(jsonify(rappels), etag)
 
 @app.route('/api/users/<int:user_id>/candidatures/export', methods=['GET'])
 def export_candidatures(user_id):
-    """Exporter les candidatures en CSV"""
-    user = User.query.get_or_404(user_id)
-    candidatures = user.candidatures
-    
-    # Créer le fichier CSV en mémoire
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # En-têtes
-    writer.writerow(['ID', 'Entreprise', 'Annonce', 'Date', 'État', 'Notes', 'Créé le', 'Mis à jour le'])
-    
-    # Données
-    for c in candidatures:
+    """Exporter les candidatures en CSV (réponse streamée, mémoire constante)"""
+    data_version = user_data_version(user_id)
+    
+    # Le nom du fichier contient la date du jour
+    etag = compute_etag(user_id, data_version, datetime.now().date())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    # Tags agrégés par candidature dans une sous-requête corrélée
+    aggregate = func.string_agg if db.engine.dialect.name == 'postgresql' else func.group_concat
+    tags = db.session.query(aggregate(CandidatureTag.nom, ', ')) \
+        .filter(CandidatureTag.candidature_id == Candidature.id) \
+        .correlate(Candidature) \
+        .scalar_subquery()
+    
+    # Seules les colonnes exportées sont lues, par lots (curseur serveur sur PostgreSQL)
+    rows = db.session.query(
+        Candidature.id,
+        Candidature.entreprise,
+        Candidature.annonce,
+        Candidature.date,
+        Candidature.etat,
+        Candidature.type_contrat,
+        Candidature.localisation,
+        Candidature.salaire,
+        tags.label('tags'),
+        Candidature.contact_nom,
+        Candidature.contact_email,
+        Candidature.contact_telephone,
+        Candidature.rappel_date,
+        Candidature.notes,
+        Candidature.created_at,
+        Candidature.updated_at
+    ).filter(Candidature.user_id == user_id) \
+        .order_by(Candidature.id) \
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        # En-têtes
         writer.writerow([
-            c.id,
-            c.entreprise,
-            c.annonce,
-            c.date,
-            c.etat,
-            c.notes or '',
-            c.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            c.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+            'ID', 'Entreprise', 'Annonce', 'Date', 'État', 'Type de contrat', 'Localisation', 'Salaire',
+            'Tags', 'Contact', 'Email contact', 'Téléphone contact', 'Rappel', 'Notes', 'Créé le', 'Mis à jour le'
         ])
+        
+        # Données, envoyées par paquets de EXPORT_CHUNK_SIZE lignes
+        for index, c in enumerate(rows, start=1):
+            writer.writerow([
+                c.id,
+                c.entreprise,
+                c.annonce,
+                c.date,
+                c.etat,
+                c.type_contrat or '',
+                c.localisation or '',
+                c.salaire or '',
+                c.tags or '',
+                c.contact_nom or '',
+                c.contact_email or '',
+                c.contact_telephone or '',
+                c.rappel_date.strftime('%Y-%m-%d %H:%M:%S') if c.rappel_date else '',
+                c.notes or '',
+                c.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                c.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
+            if index % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        yield buffer.getvalue()
     
     # Préparer la réponse
-    output.seek(0)
-    response = make_response(output.getvalue())
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
     response.headers['Content-Type'] = 'text/csv; charset=utf-8'
     response.headers['Content-Disposition'] = f'attachment; filename=candidatures_{user_id}_{datetime.now().strftime("%Y%m%d")}.csv'
     
-    return response
+    return with_etag(response, etag)
 
 # ============= Routes utilitaires =============
 
@@ -545,12 +1015,16 @@ def index():
 
 # ============= Routes pour les documents =============
 
+def owned_document(document_id, user_id):
+    """Document appartenant à une candidature de user_id (None sinon), en une seule requête"""
+    return Document.query \
+        .join(Candidature, Candidature.id == Document.candidature_id) \
+        .filter(Document.id == document_id, Candidature.user_id == user_id) \
+        .first()
+
 @app.route('/api/candidatures/<int:candidature_id>/documents', methods=['POST'])
 def upload_document(candidature_id):
-    user_id = request.form.get('user_id')
-    
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
+    user_id = current_user_id(request.form.get('user_id'))
     
     # Vérifier que la candidature existe et appartient à l'utilisateur
     candidature = Candidature.query.filter_by(id=candidature_id, user_id=user_id).first()
@@ -568,99 +1042,84 @@ def upload_document(candidature_id):
     if not allowed_file(file.filename):
         return jsonify({'error': 'File type not allowed'}), 400
     
-    # Créer un dossier pour l'utilisateur
-    user_folder = os.path.join(app.config['UPLOAD_FOLDER'], str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    
-    # Sécuriser le nom du fichier
-    original_filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{timestamp}_{original_filename}"
-    filepath = os.path.join(user_folder, filename)
-    
-    # Sauvegarder le fichier
-    file.save(filepath)
-    file_size = os.path.getsize(filepath)
+    # Fichier haché pendant sa réception, stocké une seule fois par contenu
+    temp_path, content_hash, file_size = document_storage.receive(file.stream)
     
-    # Créer l'entrée dans la base de données
     type_document = request.form.get('type_document', 'autre')
-    document = Document(
-        candidature_id=candidature_id,
-        nom_fichier=original_filename,
-        type_document=type_document,
-        url_fichier=filepath,
-        taille=file_size
-    )
-    
-    db.session.add(document)
-    db.session.commit()
+    stored_path = None
+    try:
+        stored_path, created = document_storage.attach(temp_path, content_hash, file_size)
+        document = Document(
+            candidature_id=candidature_id,
+            nom_fichier=secure_filename(file.filename),
+            type_document=type_document,
+            url_fichier=stored_path,
+            taille=file_size,
+            content_hash=content_hash
+        )
+        db.session.add(document)
+        bump_data_version(candidature.user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        document_storage.discard(temp_path)
+        # Fichier placé par ce dépôt : aucune ligne ne le référence après le rollback
+        if stored_path and created:
+            unlink(stored_path)
+        raise
+    response_cache.invalidate_user(candidature.user_id)
     
     return jsonify(document.to_dict()), 201
 
 @app.route('/api/candidatures/<int:candidature_id>/documents', methods=['GET'])
 def get_documents(candidature_id):
-    user_id = request.args.get('user_id')
-    
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
-    
-    # Vérifier que la candidature existe et appartient à l'utilisateur
-    candidature = Candidature.query.filter_by(id=candidature_id, user_id=user_id).first()
-    if not candidature:
+    user_id = current_user_id(request.args.get('user_id'))
+    
+    # Vérifier que la candidature existe et appartient à l'utilisateur (sans la charger)
+    owner = db.session.query(User.id, User.data_version) \
+        .join(Candidature, Candidature.user_id == User.id) \
+        .filter(Candidature.id == candidature_id, User.id == user_id) \
+        .first()
+    if not owner:
         return jsonify({'error': 'Candidature not found'}), 404
     
+    etag = compute_etag(owner.id, owner.data_version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
     documents = Document.query.filter_by(candidature_id=candidature_id).all()
-    return jsonify([doc.to_dict() for doc in documents]), 200
+    return with_etag(jsonify([doc.to_dict() for doc in documents]), etag)
 
 @app.route('/api/documents/<int:document_id>', methods=['DELETE'])
 def delete_document(document_id):
-    user_id = request.args.get('user_id')
-    
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
+    user_id = current_user_id(request.args.get('user_id'))
     
-    # Récupérer le document
-    document = Document.query.get(document_id)
+    # Document et propriétaire vérifiés dans la même requête
+    document = owned_document(document_id, user_id)
     if not document:
         return jsonify({'error': 'Document not found'}), 404
     
-    # Vérifier que la candidature appartient à l'utilisateur
-    candidature = Candidature.query.filter_by(id=document.candidature_id, user_id=user_id).first()
-    if not candidature:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    # Supprimer le fichier du système
-    try:
-        if os.path.exists(document.url_fichier):
-            os.remove(document.url_fichier)
-    except Exception as e:
-        print(f"Error deleting file: {e}")
-    
-    # Supprimer l'entrée de la base de données
+    # Supprimer l'entrée de la base de données ; le fichier part avec sa dernière référence, après le commit
+    document_storage.delete_after_commit(document_storage.release(document))
     db.session.delete(document)
+    bump_data_version(user_id)
     db.session.commit()
+    response_cache.invalidate_user(user_id)
     
     return jsonify({'message': 'Document deleted successfully'}), 200
 
 @app.route('/api/documents/<int:document_id>/download', methods=['GET'])
 def download_document(document_id):
-    user_id = request.args.get('user_id')
+    user_id = current_user_id(request.args.get('user_id'))
     
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
-    
-    # Récupérer le document
-    document = Document.query.get(document_id)
+    # Document et propriétaire vérifiés dans la même requête
+    document = owned_document(document_id, user_id)
     if not document:
         return jsonify({'error': 'Document not found'}), 404
     
-    # Vérifier que la candidature appartient à l'utilisateur
-    candidature = Candidature.query.filter_by(id=document.candidature_id, user_id=user_id).first()
-    if not candidature:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     # Envoyer le fichier
-    directory = os.path.dirname(document.url_fichier)
+    directory = os.path.abspath(os.path.dirname(document.url_fichier))
     filename = os.path.basename(document.url_fichier)
     return send_from_directory(directory, filename, as_attachment=True, download_name=document.nom_fichier)
 
@@ -668,78 +1127,181 @@ def download_document(document_id):
 def health():
     return jsonify({'status': 'ok', 'message': 'API is running'}), 200
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Compteurs du cache de réponses (hits, misses, évictions) pour le monitoring"""
+    return jsonify(response_cache.stats()), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métriques de tous les processus au format texte Prometheus"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/hello', methods=['GET'])
 def hello():
     return jsonify({'message': 'Hello from Flask!'}), 200
 
+# ============= Commandes CLI =============
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recalcule les compteurs de statistiques de tous les utilisateurs (flask rebuild-stats)"""
+    for (user_id,) in db.session.query(User.id).all():
+        rebuild_counters(user_id)
+        db.session.commit()
+        print(f"✅ Statistiques recalculées pour l'utilisateur {user_id}")
+
+@app.cli.command('ai-worker')
+@click.option('--once', is_flag=True, help='Traite les tâches disponibles puis s\'arrête')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Attente (s) quand la file est vide')
+def ai_worker_command(once, poll_interval):
+    """Exécute les tâches IA en file d'attente (flask ai-worker)"""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    print(f"[JOBS] Worker {worker_id} démarré")
+    work(worker_id, AI_JOB_HANDLERS, poll_interval=poll_interval, once=once)
+
+@app.cli.command('email-worker')
+@click.option('--once', is_flag=True, help='Envoie les emails en attente puis s\'arrête')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Attente (s) quand la boîte est vide')
+def email_worker_command(once, poll_interval):
+    """Envoie les emails de la boîte d'envoi (flask email-worker)"""
+    print(f"[MAIL] Expéditeur {socket.gethostname()}:{os.getpid()} démarré")
+    send_emails(poll_interval=poll_interval, once=once,
+                periodic=[(app.config['REMINDER_INTERVAL'], dispatch_reminders)])
+
+@app.cli.command('dispatch-reminders')
+def dispatch_reminders_command():
+    """Met en boîte d'envoi les rappels échus (flask dispatch-reminders, pour un cron)"""
+    dispatch_reminders()
+
+def dispatch_reminders():
+    """Rappels échus mis en boîte d'envoi ; les réponses en cache des utilisateurs notifiés sont invalidées"""
+    for user_id in dispatch_due_reminders():
+        response_cache.invalidate_user(user_id)
+
 # Gestionnaire d'erreurs
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Ressource non trouvée'}), 404
 
-# ============= Routes IA =============
+@app.errorhandler(400)
+def bad_request(error):
+    return jsonify({'error': error.description}), 400
+
+@app.errorhandler(401)
+def unauthorized(error):
+    response = jsonify({'error': error.description})
+    response.headers['WWW-Authenticate'] = 'Bearer'
+    return response, 401
+
+@app.errorhandler(403)
+def forbidden(error):
+    return jsonify({'error': 'Accès refusé'}), 403
+
+# ============= Routes IA (file d'attente) =============
+
+# Exécution des tâches IA par le worker (flask ai-worker) : payload -> résultat renvoyé au client
+AI_JOB_HANDLERS = {
+    'cover_letter': lambda p: cover_letter_result(
+        ai_service.generate_cover_letter(p['job_data'], p['user_profile'], p['provider'])
+    ),
+    'parse_announcement': lambda p: ai_service.parse_job_announcement(p['text'], p['url']),
+    'matching_score': lambda p: ai_service.calculate_matching_score(p['job_data'], p['user_profile'])
+}
+
+def cover_letter_result(result):
+    """Format de réponse de la génération de lettre"""
+    if result.get('success'):
+        return {
+            'success': True,
+            'letter': result['letter'],
+            'provider': result['provider'],
+            'tokens_used': result.get('tokens_used', 0)
+        }
+    return {
+        'success': False,
+        'error': result.get('error', 'Erreur lors de la génération'),
+        'retryable': result.get('retryable', True)
+    }
+
+def cover_letter_job_data(candidature):
+    """Données du poste utilisées par le prompt de la lettre de motivation"""
+    return {
+        'entreprise': candidature.entreprise,
+        'annonce': candidature.annonce,
+        'type_contrat': candidature.type_contrat,
+        'localisation': candidature.localisation,
+        'tags': candidature.tags
+    }
+
+def job_accepted(job):
+    """Réponse 202 : le client suit la tâche via GET /api/ai/jobs/<job_id>"""
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/ai/jobs/{job.id}'
+    }), 202
 
 @app.route('/api/ai/generate-cover-letter', methods=['POST'])
 def generate_cover_letter():
-    """Génère une lettre de motivation avec IA"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'Données manquantes'}), 400
-        
-        candidature_id = data.get('candidature_id')
-        user_profile = data.get('user_profile', {})
-        provider = data.get('provider', 'openai')  # 'openai', 'anthropic', 'gemini'
-        
-        print(f"[AI] Génération - ID: {candidature_id}, Provider: {provider}")
-        print(f"[AI] Profil: {user_profile}")
-        
-        # Récupérer la candidature
-        candidature = Candidature.query.get(candidature_id)
-        if not candidature:
-            print(f"[AI] ERREUR: Candidature non trouvée")
-            return jsonify({'error': 'Candidature non trouvée'}), 404
-        
-        # Préparer les données du job
-        job_data = {
-            'entreprise': candidature.entreprise,
-            'annonce': candidature.annonce,
-            'type_contrat': candidature.type_contrat,
-            'localisation': candidature.localisation,
-            'tags': candidature.tags
-        }
-        
-        print(f"[AI] Entreprise: {job_data['entreprise']}")
-        
-        # Générer la lettre
-        result = ai_service.generate_cover_letter(job_data, user_profile, provider)
-        
-        print(f"[AI] Résultat success: {result.get('success')}")
-        print(f"[AI] Provider utilisé: {result.get('provider')}")
-        print(f"[AI] ========== LETTRE COMPLÈTE ==========")
-        print(result.get('letter', ''))
-        print(f"[AI] ========== FIN LETTRE ==========")
-        
-        if result.get('success'):
-            return jsonify({
-                'success': True,
-                'letter': result['letter'],
-                'provider': result['provider'],
-                'tokens_used': result.get('tokens_used', 0)
-            })
-        else:
-            print(f"[AI] ERREUR: {result.get('error')}")
-            return jsonify({
-                'success': False,
-                'error': result.get('error', 'Erreur lors de la génération')
-            }), 500
-            
-    except Exception as e:
-        print(f"[AI] EXCEPTION: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+    """Met en file la génération d'une lettre de motivation avec IA"""
+    data = request.get_json(silent=True)
+    
+    if not data:
+        return jsonify({'error': 'Données manquantes'}), 400
+    
+    candidature_id = data.get('candidature_id')
+    user_profile = data.get('user_profile', {})
+    provider = data.get('provider', 'openai')  # 'openai', 'anthropic', 'gemini'
+    
+    print(f"[AI] Génération - ID: {candidature_id}, Provider: {provider}")
+    
+    # Récupérer la candidature
+    candidature = owned_candidatures().filter_by(id=candidature_id).first()
+    if not candidature:
+        print(f"[AI] ERREUR: Candidature non trouvée")
+        return jsonify({'error': 'Candidature non trouvée'}), 404
+    
+    job = enqueue('cover_letter', {
+        'job_data': cover_letter_job_data(candidature),
+        'user_profile': user_profile,
+        'provider': provider
+    }, user_id=token_user_id())
+    return job_accepted(job)
+
+@app.route('/api/ai/generate-cover-letter/stream', methods=['POST'])
+def stream_cover_letter():
+    """
+    Génère une lettre de motivation en streaming (Server-Sent Events)
+    
+    Événements : 'token' {"text"} au fil de la génération, puis 'done' {"provider", "tokens_used"}
+    ou 'error' {"error"}.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data:
+        return jsonify({'error': 'Données manquantes'}), 400
+    
+    provider = data.get('provider', 'openai')
+    user_profile = data.get('user_profile', {})
+    candidature = owned_candidatures().filter_by(id=data.get('candidature_id')).first()
+    if not candidature:
+        return jsonify({'error': 'Candidature non trouvée'}), 404
+    
+    job_data = cover_letter_job_data(candidature)
+    # Libérer la connexion à la base avant d'attendre le provider
+    db.session.close()
+    
+    def generate():
+        for event in ai_service.stream_cover_letter(job_data, user_profile, provider):
+            event_type = event.pop('type')
+            yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Pas de mise en tampon par un proxy nginx
+    return response
 
 @app.route('/api/ai/check-config', methods=['GET'])
 def check_ai_config():
@@ -750,76 +1312,75 @@ def check_ai_config():
         'gemini': bool(ai_service.gemini_key)
     })
 
+@app.route('/api/ai/providers/health', methods=['GET'])
+def ai_providers_health():
+    """État des disjoncteurs, taux d'erreur et latences récentes de chaque provider (processus courant)"""
+    return jsonify(ai_service.router.snapshot())
+
 @app.route('/api/ai/parse-announcement', methods=['POST'])
 def parse_announcement():
-    """Parse automatiquement une annonce d'emploi"""
-    try:
-        data = request.get_json()
-        text = data.get('text', '')
-        url = data.get('url')
-        
-        # Accepter soit text soit url
-        if not text and not url:
-            return jsonify({'success': False, 'error': 'Texte ou URL de l\'annonce requis'}), 400
-        
-        print(f"[Parse API] Text: {len(text) if text else 0} chars, URL: {url}")
-        
-        result = ai_service.parse_job_announcement(text, url)
-        
-        if result.get('success'):
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
-            
-    except Exception as e:
-        print(f"[Parse API] Exception: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+    """Met en file le parsing automatique d'une annonce d'emploi"""
+    data = request.get_json(silent=True) or {}
+    text = data.get('text', '')
+    url = data.get('url')
+    
+    # Accepter soit text soit url
+    if not text and not url:
+        return jsonify({'success': False, 'error': 'Texte ou URL de l\'annonce requis'}), 400
+    
+    print(f"[Parse API] Text: {len(text) if text else 0} chars, URL: {url}")
+    
+    job = enqueue('parse_announcement', {'text': text, 'url': url}, user_id=token_user_id())
+    return job_accepted(job)
 
 @app.route('/api/ai/matching-score', methods=['POST'])
 def matching_score():
-    """Calcule le score de matching entre profil et offre"""
-    try:
-        data = request.get_json()
-        candidature_id = data.get('candidature_id')
-        user_id = data.get('user_id')
-        
-        if not candidature_id or not user_id:
-            return jsonify({'success': False, 'error': 'candidature_id et user_id requis'}), 400
-        
-        # Récupérer la candidature
-        candidature = Candidature.query.get(candidature_id)
-        if not candidature:
-            return jsonify({'success': False, 'error': 'Candidature non trouvée'}), 404
-        
-        # Récupérer le profil utilisateur
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'success': False, 'error': 'Utilisateur non trouvé'}), 404
-        
-        job_data = {
-            'entreprise': candidature.entreprise,
-            'annonce': candidature.annonce,
-            'type_contrat': candidature.type_contrat,
-            'localisation': candidature.localisation
-        }
-        
-        user_profile = {
-            'experience': data.get('experience', ''),
-            'competences': data.get('competences', ''),
-            'ville': user.ville or ''
-        }
-        
-        result = ai_service.calculate_matching_score(job_data, user_profile)
-        
-        if result.get('success'):
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    """Met en file le calcul du score de matching entre profil et offre"""
+    data = request.get_json(silent=True) or {}
+    candidature_id = data.get('candidature_id')
+    user_id = data.get('user_id') or token_user_id()
+    
+    if not candidature_id or not user_id:
+        return jsonify({'success': False, 'error': 'candidature_id et user_id requis'}), 400
+    user_id = current_user_id(user_id)
+    
+    # Récupérer la candidature
+    candidature = owned_candidatures().filter_by(id=candidature_id).first()
+    if not candidature:
+        return jsonify({'success': False, 'error': 'Candidature non trouvée'}), 404
+    
+    # Récupérer le profil utilisateur
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'success': False, 'error': 'Utilisateur non trouvé'}), 404
+    
+    job_data = {
+        'entreprise': candidature.entreprise,
+        'annonce': candidature.annonce,
+        'type_contrat': candidature.type_contrat,
+        'localisation': candidature.localisation
+    }
+    
+    user_profile = {
+        'experience': data.get('experience', ''),
+        'competences': data.get('competences', ''),
+        'ville': user.ville or ''
+    }
+    
+    job = enqueue('matching_score', {'job_data': job_data, 'user_profile': user_profile},
+                  user_id=token_user_id())
+    return job_accepted(job)
+
+@app.route('/api/ai/jobs/<job_id>', methods=['GET'])
+def get_ai_job(job_id):
+    """
+    État d'une tâche IA : queued, running, succeeded ou dead (échecs répétés)
+    
+    'result' contient la réponse de l'endpoint d'origine une fois la tâche terminée.
+    Une tâche d'un autre utilisateur répond 404, comme une tâche inexistante.
+    """
+    job = owned_ai_jobs().filter(AIJob.id == job_id).first_or_404()
+    return jsonify(job.to_dict()), 200
 
 @app.route('/api/ai/chat', methods=['POST'])
 def chatbot_endpoint():
@@ -0,0 +1,64 @@
+"""
+Jetons d'accès signés (HMAC, itsdangerous) émis par /api/login
+Le jeton porte l'identifiant de l'utilisateur, la version de ses jetons (users.token_version) et
+sa date d'émission ; la signature est vérifiée sans accès à la base et le jeton expire après
+ACCESS_TOKEN_TTL secondes. Les jetons déjà vérifiés sont gardés dans un petit cache LRU propre au
+processus : les requêtes suivantes ne recalculent ni la signature ni le JSON. La version est
+comparée par l'appelant à celle de la base (révocation au changement de mot de passe). Changer
+SECRET_KEY invalide tous les jetons.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+TOKEN_SALT = 'access-token'
+
+class TokenError(Exception):
+    """Jeton absent de la signature attendue, altéré ou expiré"""
+
+class AccessTokens:
+    """Émission et vérification des jetons d'accès"""
+
+    def __init__(self, secret_key: str, ttl: int, cache_size: int = 10000):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._serializer = URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+        # jeton -> (user_id, version des jetons, expiration)
+        self._verified: 'OrderedDict[str, Tuple[int, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, user_id: int, version: int = 0) -> str:
+        return self._serializer.dumps({'uid': user_id, 'ver': version})
+
+    def verify(self, token: str) -> Tuple[int, int]:
+        """(utilisateur, version des jetons) du jeton ; TokenError s'il est invalide ou expiré"""
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is not None:
+                if entry[2] > now:
+                    self._verified.move_to_end(token)
+                    return entry[0], entry[1]
+                del self._verified[token]
+
+        try:
+            claims, issued_at = self._serializer.loads(token, max_age=self.ttl, return_timestamp=True)
+        except SignatureExpired:
+            raise TokenError('Jeton expiré')
+        except BadSignature:
+            raise TokenError('Jeton invalide')
+        user_id = claims.get('uid') if isinstance(claims, dict) else None
+        version = claims.get('ver', 0) if isinstance(claims, dict) else None
+        if not isinstance(user_id, int) or not isinstance(version, int):
+            raise TokenError('Jeton invalide')
+
+        # Seuls les jetons valides sont gardés : des jetons forgés ne peuvent pas remplir le cache
+        with self._lock:
+            self._verified[token] = (user_id, version, issued_at.timestamp() + self.ttl)
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return user_id, version
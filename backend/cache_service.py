@@ -0,0 +1,301 @@
+"""
+Cache des réponses de l'API (statistiques, listes de candidatures)
+
+Backends derrière la même interface, choisis par CACHE_BACKEND :
+- 'memory' : LRU + TTL dans le processus (défaut)
+- 'sqlite' : fichier SQLite partagé entre les workers gunicorn (CACHE_URL = chemin du fichier)
+- 'redis'  : serveur Redis ou compatible (CACHE_URL = redis://...), paquet `redis` requis
+- 'none'   : cache désactivé
+
+Les clés sont préfixées par l'utilisateur ('user:<id>:') et contiennent la version de ses
+données : une écriture rend donc les anciennes entrées inaccessibles, et invalidate_user()
+les supprime pour libérer la place. Une erreur du cache n'interrompt jamais une requête :
+elle est traitée comme un miss.
+"""
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+STATS = ('hits', 'misses', 'evictions')
+
+def user_prefix(user_id) -> str:
+    return f'user:{user_id}:'
+
+class BaseCache(ABC):
+    """Interface commune : get / set / invalidate_user / stats"""
+    name = 'base'
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self._get(key)
+        except Exception as e:
+            print(f"[CACHE] Lecture impossible ({self.name}): {e}")
+            return None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        try:
+            self._set(key, value, ttl or self.ttl)
+        except Exception as e:
+            print(f"[CACHE] Écriture impossible ({self.name}): {e}")
+
+    def invalidate_user(self, user_id):
+        """Supprime toutes les entrées d'un utilisateur (à appeler après chaque écriture)"""
+        try:
+            self._delete_prefix(user_prefix(user_id))
+        except Exception as e:
+            print(f"[CACHE] Invalidation impossible ({self.name}): {e}")
+
+    def stats(self) -> Dict:
+        try:
+            counters = self._read_counters()
+            entries = self._size()
+        except Exception as e:
+            print(f"[CACHE] Statistiques indisponibles ({self.name}): {e}")
+            counters, entries = {stat: 0 for stat in STATS}, None
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'backend': self.name,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            **counters,
+            'hit_ratio': round(counters['hits'] / lookups, 4) if lookups else 0
+        }
+
+    def _count(self, stat: str, n: int = 1):
+        try:
+            self._incr(stat, n)
+        except Exception:
+            pass
+
+    # À implémenter par chaque backend
+    @abstractmethod
+    def _get(self, key):
+        ...
+
+    @abstractmethod
+    def _set(self, key, value, ttl):
+        ...
+
+    @abstractmethod
+    def _delete_prefix(self, prefix):
+        ...
+
+    @abstractmethod
+    def _incr(self, stat, n):
+        ...
+
+    @abstractmethod
+    def _read_counters(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def _size(self) -> Optional[int]:
+        ...
+
+class NullCache(BaseCache):
+    """Cache désactivé : toujours un miss, rien n'est stocké"""
+    name = 'none'
+
+    def __init__(self, ttl: int = 0, max_entries: int = 0):
+        super().__init__(ttl, max_entries)
+        self._counters = {stat: 0 for stat in STATS}
+
+    def _get(self, key):
+        return None
+
+    def _set(self, key, value, ttl):
+        pass
+
+    def _delete_prefix(self, prefix):
+        pass
+
+    def _incr(self, stat, n):
+        self._counters[stat] += n
+
+    def _read_counters(self):
+        return dict(self._counters)
+
+    def _size(self):
+        return 0
+
+class MemoryCache(BaseCache):
+    """LRU + TTL en mémoire, propre à chaque processus"""
+    name = 'memory'
+
+    def __init__(self, ttl: int, max_entries: int):
+        super().__init__(ttl, max_entries)
+        self._entries = OrderedDict()  # clé -> (expiration, valeur), du moins au plus récemment utilisé
+        self._counters = {stat: 0 for stat in STATS}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self._counters['evictions'] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def _incr(self, stat, n):
+        with self._lock:
+            self._counters[stat] += n
+
+    def _read_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _size(self):
+        return len(self._entries)
+
+class SQLiteCache(BaseCache):
+    """
+    Cache dans un fichier SQLite (mode WAL) partagé par tous les workers d'une même machine.
+    Au-delà de max_entries, les entrées les plus anciennes sont supprimées.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_entries ('
+                     'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_created_at ON cache_entries (created_at)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.executemany('INSERT OR IGNORE INTO cache_stats (name, value) VALUES (?, 0)', [(s,) for s in STATS])
+
+    def _conn(self) -> sqlite3.Connection:
+        # Une connexion par thread (les connexions sqlite3 ne se partagent pas entre threads)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key):
+        conn = self._conn()
+        row = conn.execute('SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            if conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount:
+                self._count('evictions')
+            return None
+        return bytes(row[0])
+
+    def _set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)',
+                     (key, value, now + ttl, now))
+        excess = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] - self.max_entries
+        if excess > 0:
+            # Entrées expirées d'abord, puis les plus anciennes
+            evicted = conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY expires_at <= ? DESC, created_at LIMIT ?)',
+                (now, excess)
+            ).rowcount
+            self._count('evictions', evicted)
+
+    def _delete_prefix(self, prefix):
+        # Intervalle sur la clé primaire plutôt qu'un LIKE (utilise l'index)
+        self._conn().execute('DELETE FROM cache_entries WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff'))
+
+    def _incr(self, stat, n):
+        self._conn().execute('UPDATE cache_stats SET value = value + ? WHERE name = ?', (n, stat))
+
+    def _read_counters(self):
+        rows = self._conn().execute('SELECT name, value FROM cache_stats').fetchall()
+        counters = {stat: 0 for stat in STATS}
+        counters.update(dict(rows))
+        return counters
+
+    def _size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+class RedisCache(BaseCache):
+    """
+    Cache Redis (ou compatible) partagé entre processus et machines. L'expiration est gérée
+    par Redis ; la taille est bornée par sa politique d'éviction (maxmemory-policy).
+    """
+    name = 'redis'
+    STATS_KEY = 'cache:stats'
+
+    def __init__(self, url: str, ttl: int, max_entries: int):
+        import redis  # Dépendance optionnelle, seulement pour ce backend
+        super().__init__(ttl, max_entries)
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client.ping()
+
+    def _get(self, key):
+        return self.client.get(key)
+
+    def _set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def _delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f'{prefix}*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def _incr(self, stat, n):
+        self.client.hincrby(self.STATS_KEY, stat, n)
+
+    def _read_counters(self):
+        raw = self.client.hgetall(self.STATS_KEY)
+        counters = {stat: int(raw.get(stat.encode(), 0)) for stat in STATS}
+        # Évictions décidées par Redis lui-même (mémoire pleine)
+        counters['evictions'] += int(self.client.info('stats').get('evicted_keys', 0))
+        return counters
+
+    def _size(self):
+        return self.client.dbsize()
+
+def create_cache(config) -> BaseCache:
+    """Construit le backend configuré ; retombe sur le cache mémoire s'il est indisponible"""
+    backend = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_TTL', 300)
+    max_entries = config.get('CACHE_MAX_ENTRIES', 1000)
+
+    if backend == 'none':
+        return NullCache(ttl, max_entries)
+    try:
+        if backend == 'sqlite':
+            return SQLiteCache(config.get('CACHE_URL') or 'cache.db', ttl, max_entries)
+        if backend == 'redis':
+            return RedisCache(config.get('CACHE_URL') or 'redis://localhost:6379/0', ttl, max_entries)
+    except Exception as e:
+        print(f"[CACHE] Backend '{backend}' indisponible, cache en mémoire utilisé: {e}")
+    return MemoryCache(ttl, max_entries)
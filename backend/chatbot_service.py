@@ -3,13 +3,18 @@ Service de chatbot intelligent pour ApplicationTrack
 Utilise Gemini pour analyser et conseiller l'utilisateur sur ses candidatures
 """
 
-import os
-import requests
 from typing import Dict, List, Optional
 
+from ai_providers import ProviderError, get_provider
+
 class ChatBotService:
     def __init__(self):
-        self.gemini_key = os.getenv('GEMINI_API_KEY')
+        # Même client (et même pool de connexions) que AIService
+        self.gemini = get_provider('gemini')
+    
+    @property
+    def gemini_key(self):
+        return self.gemini.api_key
         
     def generate_response(
         self, 
@@ -113,48 +118,19 @@ Réponds maintenant de manière CONCISE et COMPLÈTE :"""
     def _generate_with_gemini(self, prompt: str) -> Dict:
         """Génère avec Gemini"""
         try:
-            response = requests.post(
-                f'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={self.gemini_key}',
-                headers={'Content-Type': 'application/json'},
-                json={
-                    'contents': [{
-                        'parts': [{'text': prompt}]
-                    }],
-                    'generationConfig': {
-                        'temperature': 0.7,
-                        'maxOutputTokens': 800,  # Réduit pour réponses plus courtes
-                        'topP': 0.95,
-                        'topK': 40
-                    }
-                },
-                timeout=30
-            )
-            
-            if not response.ok:
-                print(f"[CHATBOT] Erreur API: {response.status_code} - {response.text}")
-                raise Exception(f"Erreur API Gemini: {response.status_code}")
-            
-            data = response.json()
-            
-            if 'candidates' not in data or len(data['candidates']) == 0:
-                print(f"[CHATBOT] Pas de candidats dans la réponse: {data}")
-                raise Exception("Réponse Gemini vide")
-            
-            response_text = data['candidates'][0]['content']['parts'][0]['text']
-            
-            print(f"[CHATBOT] Réponse générée: {len(response_text)} caractères")
-            
-            return {
-                'success': True,
-                'response': response_text,
-                'provider': 'Gemini 2.5 Flash'
-            }
-        except requests.exceptions.RequestException as e:
-            print(f"[CHATBOT] Erreur réseau: {e}")
-            raise Exception(f"Erreur de connexion à l'API: {str(e)}")
-        except Exception as e:
+            # 800 tokens : réponses courtes
+            result = self.gemini.complete(prompt, temperature=0.7, max_tokens=800, operation='chat')
+        except ProviderError as e:
             print(f"[CHATBOT] Erreur: {e}")
-            raise e
+            raise Exception(f"Erreur API Gemini: {e}")
+        
+        print(f"[CHATBOT] Réponse générée: {len(result['text'])} caractères")
+        
+        return {
+            'success': True,
+            'response': result['text'],
+            'provider': 'Gemini 2.5 Flash'
+        }
     
     def _generate_fallback_response(self, user_message: str, candidatures: Optional[List[Dict]]) -> Dict:
         """Réponse de secours si Gemini ne fonctionne pas"""
@@ -17,6 +17,18 @@ class Config:
     # CORS settings - Allow production domains
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://localhost:5174').split(',')
     
+    # Hachage des mots de passe : méthode werkzeug ('scrypt:N:r:p' ou 'pbkdf2:sha256:iterations'),
+    # pool dédié et file bornée (au-delà, 429). Changer la méthode rehache à la connexion suivante.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))  # calculs en attente admis
+    
+    # Jetons d'accès émis par /api/login (en-tête Authorization: Bearer)
+    ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', 12 * 3600))  # secondes
+    ACCESS_TOKEN_CACHE_SIZE = int(os.environ.get('ACCESS_TOKEN_CACHE_SIZE', 10000))  # jetons vérifiés gardés
+    # true : jeton obligatoire ; false : les clients sans jeton restent identifiés par user_id
+    AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED', 'false').lower() == 'true'
+    
     # Mail Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -26,5 +38,42 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
     
+    # Boîte d'envoi (flask email-worker)
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))  # emails par lot, sur une connexion SMTP
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_DELAY = int(os.environ.get('EMAIL_RETRY_DELAY', 30))  # secondes, doublé à chaque tentative
+    EMAIL_LOCK_TIMEOUT = int(os.environ.get('EMAIL_LOCK_TIMEOUT', 300))  # email repris si l'expéditeur disparaît
+    EMAIL_SMTP_TIMEOUT = int(os.environ.get('EMAIL_SMTP_TIMEOUT', 30))
+    EMAIL_OUTBOX_RETENTION = int(os.environ.get('EMAIL_OUTBOX_RETENTION', 7 * 24 * 3600))  # emails envoyés conservés
+    
+    # Rappels par email (rappel_date), envoyés par flask email-worker ou flask dispatch-reminders
+    REMINDER_INTERVAL = int(os.environ.get('REMINDER_INTERVAL', 300))  # secondes entre deux passages
+    REMINDER_LOOKBACK = int(os.environ.get('REMINDER_LOOKBACK', 2 * 24 * 3600))  # rappels plus anciens ignorés
+    REMINDER_LOOKAHEAD = int(os.environ.get('REMINDER_LOOKAHEAD', 0))  # envoi anticipé (secondes)
+    REMINDER_BATCH_USERS = int(os.environ.get('REMINDER_BATCH_USERS', 200))  # utilisateurs par transaction
+    
+    # Fuseau horaire par défaut des statistiques (timeline, stats mensuelles)
+    STATS_TIMEZONE = os.environ.get('STATS_TIMEZONE', 'Europe/Paris')
+    
+    # Cache des réponses : 'memory' (défaut), 'sqlite' (fichier partagé entre workers), 'redis' ou 'none'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_URL = os.environ.get('CACHE_URL')
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1000))
+    
+    # File d'attente des tâches IA (flask ai-worker)
+    AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', 3))
+    AI_JOB_RETRY_DELAY = int(os.environ.get('AI_JOB_RETRY_DELAY', 10))  # secondes, doublé à chaque tentative
+    AI_JOB_LOCK_TIMEOUT = int(os.environ.get('AI_JOB_LOCK_TIMEOUT', 300))  # tâche reprise si le worker disparaît
+    
+    # Cache des résultats IA (parsing d'annonce, score de matching)
+    AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 7 * 24 * 3600))  # secondes
+    AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000))
+    
+    # Instrumentation des requêtes : journal des requêtes lentes, en-tête Server-Timing (toujours en debug)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_QUERIES = int(os.environ.get('SLOW_REQUEST_QUERIES', 50))
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
+    
     # Frontend URL for password reset links
     FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
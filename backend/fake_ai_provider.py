@@ -0,0 +1,58 @@
+"""
+Faux provider IA local pour tester le streaming sans clé ni réseau
+Imite les endpoints OpenAI, Anthropic et Gemini (réponses normales et flux SSE).
+
+Utilisation :
+    python fake_ai_provider.py            # écoute sur http://localhost:8099
+    OPENAI_BASE_URL=http://localhost:8099 OPENAI_API_KEY=test python app.py
+(idem avec ANTHROPIC_BASE_URL / GEMINI_BASE_URL)
+"""
+import os
+import json
+import time
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+LETTER = "Madame, Monsieur,\n\nCeci est une lettre générée par le faux provider local.\n\nCordialement,\nLe Candidat"
+TOKEN_DELAY = float(os.environ.get('FAKE_TOKEN_DELAY', 0.05))  # secondes entre deux morceaux
+
+def tokens():
+    return [word + ' ' for word in LETTER.split(' ')]
+
+def sse(events):
+    def generate():
+        for event in events:
+            yield f"data: {json.dumps(event) if not isinstance(event, str) else event}\n\n"
+            time.sleep(TOKEN_DELAY)
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def openai():
+    if not request.get_json().get('stream'):
+        return jsonify({'choices': [{'message': {'content': LETTER}}], 'usage': {'prompt_tokens': 30, 'completion_tokens': 12, 'total_tokens': 42}})
+    events = [{'choices': [{'delta': {'content': t}}]} for t in tokens()]
+    events += [{'choices': [], 'usage': {'prompt_tokens': 30, 'completion_tokens': 12, 'total_tokens': 42}}, '[DONE]']
+    return sse(events)
+
+@app.route('/v1/messages', methods=['POST'])
+def anthropic():
+    if not request.get_json().get('stream'):
+        return jsonify({'content': [{'text': LETTER}], 'usage': {'input_tokens': 30, 'output_tokens': 12}})
+    events = [{'type': 'message_start', 'message': {'usage': {'input_tokens': 30}}}]
+    events += [{'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': t}} for t in tokens()]
+    events += [{'type': 'message_delta', 'usage': {'output_tokens': 12}}, {'type': 'message_stop'}]
+    return sse(events)
+
+@app.route('/v1beta/models/<model>:generateContent', methods=['POST'])
+def gemini(model):
+    return jsonify({'candidates': [{'content': {'parts': [{'text': LETTER}]}}]})
+
+@app.route('/v1beta/models/<model>:streamGenerateContent', methods=['POST'])
+def gemini_stream(model):
+    events = [{'candidates': [{'content': {'parts': [{'text': t}]}}]} for t in tokens()]
+    events[-1]['usageMetadata'] = {'promptTokenCount': 30, 'candidatesTokenCount': 12, 'totalTokenCount': 42}
+    return sse(events)
+
+if __name__ == '__main__':
+    app.run(port=int(os.environ.get('PORT', 8099)), threaded=True)
@@ -0,0 +1,291 @@
+"""
+Récupération des pages d'annonces (parse_job_announcement avec une URL)
+Le corps est lu en streaming et borné à FETCH_MAX_BYTES ; le texte est extrait au fil de la
+lecture par le parseur lxml en mode événements (aucun arbre construit) et la lecture s'arrête
+dès que FETCH_MAX_CHARS caractères sont extraits. Le texte est conservé dans fetched_pages avec
+l'ETag / Last-Modified de la réponse : pendant FETCH_FRESH_FOR secondes la page n'est pas
+redemandée, ensuite elle est revalidée par une requête conditionnelle (304 = texte conservé).
+"""
+
+import os
+import re
+import codecs
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from flask import has_app_context
+from lxml import etree
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, FetchedPage
+
+FETCH_MAX_BYTES = int(os.getenv('FETCH_MAX_BYTES', 2 * 1024 * 1024))
+FETCH_MAX_CHARS = int(os.getenv('FETCH_MAX_CHARS', 5000))  # Texte envoyé au modèle
+FETCH_CONNECT_TIMEOUT = float(os.getenv('FETCH_CONNECT_TIMEOUT', 5))
+FETCH_READ_TIMEOUT = float(os.getenv('FETCH_READ_TIMEOUT', 15))
+FETCH_FRESH_FOR = int(os.getenv('FETCH_FRESH_FOR', 3600))  # secondes sans revalidation
+FETCH_RETENTION = int(os.getenv('FETCH_RETENTION', 30 * 24 * 3600))  # pages non consultées supprimées
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+CHUNK_SIZE = 16 * 1024
+SNIFF_BYTES = 4096  # Début du document examiné pour trouver le charset
+
+# Contenu ignoré (même liste qu'avant, plus les éléments sans texte lisible)
+SKIPPED_TAGS = {'script', 'style', 'nav', 'header', 'footer', 'noscript', 'svg', 'template'}
+
+_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+class FetchError(Exception):
+    """
+    Page impossible à récupérer ; status contient le code HTTP s'il y en a un
+    permanent : une nouvelle tentative échouerait de la même façon (URL invalide, 4xx, type de contenu)
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, permanent: Optional[bool] = None):
+        super().__init__(message)
+        self.status = status
+        if permanent is None:
+            permanent = status is not None and 400 <= status < 500 and status not in (408, 429)
+        self.permanent = permanent
+
+def _codec(name) -> Optional[str]:
+    try:
+        codec = codecs.lookup(name.decode('ascii') if isinstance(name, bytes) else name).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+    # Comme les navigateurs : latin-1 déclaré = windows-1252
+    return 'cp1252' if codec in ('latin-1', 'iso8859-1', 'ascii') else codec
+
+def detect_charset(content_type: Optional[str], head: bytes) -> str:
+    """
+    BOM, puis charset de l'en-tête Content-Type, puis balise <meta>, puis UTF-8 si le début du
+    document est de l'UTF-8 valide, sinon windows-1252 (comportement des navigateurs)
+    """
+    for bom, charset in _BOMS:
+        if head.startswith(bom):
+            return charset
+
+    match = _HEADER_CHARSET.search(content_type or '')
+    if match and _codec(match.group(1)):
+        return _codec(match.group(1))
+
+    match = _META_CHARSET.search(head[:SNIFF_BYTES])
+    if match and _codec(match.group(1)):
+        return _codec(match.group(1))
+
+    try:
+        # final=False : une séquence coupée à la fin du morceau n'est pas une erreur
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+class TextExtractor:
+    """
+    Cible du parseur lxml : reçoit les événements start / end / data sans construire d'arbre
+    Produit le même texte que get_text(separator='\\n', strip=True) sur la page nettoyée.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.lines = []
+        self.size = 0
+        self._skip_depth = 0
+        self._buffer = []
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.max_chars
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self._skip_depth or tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        if not self._skip_depth and not self.full:
+            self._buffer.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self) -> str:
+        self._flush()
+        return '\n'.join(self.lines)[:self.max_chars]
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        line = ''.join(self._buffer).strip()
+        self._buffer = []
+        if line and not self.full:
+            self.lines.append(line)
+            self.size += len(line) + 1
+
+def _url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+class PageFetcher:
+    """Client de récupération des pages ; session HTTP persistante partagée par le processus"""
+
+    def __init__(self, max_bytes: int = FETCH_MAX_BYTES, max_chars: int = FETCH_MAX_CHARS,
+                 fresh_for: int = FETCH_FRESH_FOR):
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.fresh_for = fresh_for
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+
+    def fetch_text(self, url: str) -> Dict:
+        """
+        Texte extrait de la page
+
+        Returns:
+            {'text': ..., 'cached': bool, 'revalidated': bool}
+
+        Raises:
+            FetchError si la page est inaccessible et absente du cache
+        """
+        if urlparse(url).scheme not in ('http', 'https'):
+            raise FetchError('URL invalide (http ou https attendu)', permanent=True)
+
+        page = self._load(url)
+        now = datetime.utcnow()
+        if page and page.checked_at and page.checked_at > now - timedelta(seconds=self.fresh_for):
+            return {'text': page.text, 'cached': True, 'revalidated': False}
+
+        headers = {}
+        if page and page.etag:
+            headers['If-None-Match'] = page.etag
+        if page and page.last_modified:
+            headers['If-Modified-Since'] = page.last_modified
+
+        try:
+            result = self._download(url, headers)
+        except FetchError as e:
+            if page is None:
+                raise
+            # Page inaccessible : le dernier texte connu reste utilisable
+            print(f"[FETCH] {url}: {e} - texte en cache utilisé")
+            return {'text': page.text, 'cached': True, 'revalidated': False}
+
+        if result is None:  # 304 Not Modified
+            self._touch(page, now)
+            return {'text': page.text, 'cached': True, 'revalidated': True}
+
+        self._store(url, result, now)
+        return {'text': result['text'], 'cached': False, 'revalidated': False}
+
+    def _download(self, url: str, headers: Dict) -> Optional[Dict]:
+        """GET en streaming ; None si la page n'a pas changé (304)"""
+        try:
+            response = self.session.get(url, headers=headers, stream=True,
+                                        timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT))
+        except requests.RequestException as e:
+            raise FetchError(str(e))
+
+        with response:
+            if response.status_code == 304 and headers:
+                return None
+            if response.status_code != 200:
+                raise FetchError(f'Status {response.status_code}', response.status_code)
+
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and not any(t in content_type.lower() for t in ('text/', 'html', 'xml')):
+                raise FetchError(f'Type de contenu non supporté : {content_type.split(";")[0]}', permanent=True)
+
+            try:
+                text, charset, bytes_read = self._extract(response, content_type)
+            except requests.RequestException as e:
+                raise FetchError(str(e))
+
+        print(f"[FETCH] {url}: {bytes_read} octets lus ({charset}), {len(text)} caractères extraits")
+        return {
+            'text': text,
+            'charset': charset,
+            'bytes_read': bytes_read,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+
+    def _extract(self, response, content_type: str):
+        """Lit le corps par morceaux et les passe au parseur jusqu'à max_bytes ou max_chars"""
+        chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+        head = b''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= SNIFF_BYTES:
+                break
+        head = head[:self.max_bytes]
+        charset = detect_charset(content_type, head)
+
+        # Décodage incrémental côté Python (tous les codecs, séquences coupées entre deux morceaux)
+        decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        extractor = TextExtractor(self.max_chars)
+        parser = etree.HTMLParser(target=extractor, remove_comments=True, no_network=True)
+        parser.feed(decoder.decode(head))
+        bytes_read = len(head)
+        for chunk in chunks:
+            if extractor.full or bytes_read >= self.max_bytes:
+                break
+            chunk = chunk[:self.max_bytes - bytes_read]
+            bytes_read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b'', final=True))
+        try:
+            text = parser.close()
+        except etree.XMLSyntaxError:  # Corps vide
+            text = extractor.close()
+        return text, charset, bytes_read
+
+    # Stockage (ignoré hors contexte d'application ; une erreur de base n'empêche pas la réponse)
+    def _load(self, url: str) -> Optional[FetchedPage]:
+        if not has_app_context():
+            return None
+        try:
+            return db.session.get(FetchedPage, _url_hash(url))
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[FETCH] Lecture du cache impossible: {e}")
+            return None
+
+    def _touch(self, page: FetchedPage, now: datetime):
+        try:
+            page.checked_at = now
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[FETCH] Mise à jour du cache impossible: {e}")
+
+    def _store(self, url: str, result: Dict, now: datetime):
+        if not has_app_context():
+            return
+        try:
+            db.session.merge(FetchedPage(
+                url_hash=_url_hash(url),
+                url=url,
+                text=result['text'],
+                etag=result['etag'] if len(result['etag'] or '') <= 255 else None,
+                last_modified=result['last_modified'],
+                charset=result['charset'],
+                bytes_read=result['bytes_read'],
+                fetched_at=now,
+                checked_at=now
+            ))
+            FetchedPage.query.filter(FetchedPage.checked_at < now - timedelta(seconds=FETCH_RETENTION)) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[FETCH] Écriture du cache impossible: {e}")
+
+page_fetcher = PageFetcher()
@@ -0,0 +1,212 @@
+"""
+Service d'import en masse des candidatures (CSV ou JSON)
+Le fichier est lu en flux, les lignes valides sont insérées par lots (un INSERT multi-lignes par lot)
+dans des transactions courtes, et chaque ligne invalide est signalée dans le rapport
+"""
+
+import io
+import csv
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from models import db, Candidature, CandidatureTag, normalize_tags, parse_date, bump_data_version
+from stats_service import record_bulk
+
+# Nombre de lignes insérées par INSERT / par transaction
+IMPORT_BATCH_SIZE = 500
+
+# Noms de colonnes acceptés pour chaque champ (mêmes alias que l'ancien import côté frontend)
+COLUMN_ALIASES = {
+    'entreprise': ['entreprise', 'company', 'societe'],
+    'annonce': ['annonce', 'poste', 'position', 'description'],
+    'date': ['date'],
+    'etat': ['etat', 'statut', 'status'],
+    'notes': ['notes', 'commentaires', 'comments'],
+    'tags': ['tags'],
+    'type_contrat': ['type_contrat', 'contrat', 'contract'],
+    'localisation': ['localisation', 'ville', 'location', 'city'],
+    'salaire': ['salaire', 'salary'],
+    'contact_nom': ['contact_nom', 'contact'],
+    'contact_email': ['contact_email', 'email'],
+    'contact_telephone': ['contact_telephone', 'telephone', 'phone'],
+    'rappel_date': ['rappel_date', 'rappel']
+}
+
+# Longueur maximale des colonnes String du modèle
+MAX_LENGTHS = {
+    'entreprise': 200,
+    'etat': 50,
+    'type_contrat': 50,
+    'localisation': 200,
+    'salaire': 100,
+    'contact_nom': 200,
+    'contact_email': 200,
+    'contact_telephone': 50
+}
+
+class RowValidationError(Exception):
+    """Ligne invalide : le message est renvoyé tel quel dans le rapport"""
+
+def iter_csv_rows(stream) -> Iterator[Tuple[int, Dict]]:
+    """Lit un CSV en flux (BOM et séparateur ';' ou ',' gérés), retourne (numéro de ligne, dict)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    first_line = text.readline()
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    headers = [h.strip().lower() for h in next(csv.reader([first_line], delimiter=delimiter), [])]
+
+    reader = csv.DictReader(text, fieldnames=headers, delimiter=delimiter)
+    for row in reader:
+        # La ligne 1 est l'en-tête
+        if not any((value or '').strip() for key, value in row.items() if key):
+            continue
+        yield reader.line_num + 1, row
+
+def iter_json_rows(items: Iterable) -> Iterator[Tuple[int, Dict]]:
+    """Numérote les éléments d'un tableau JSON à partir de 1"""
+    for index, item in enumerate(items, start=1):
+        yield index, item
+
+def _get(row: Dict, field: str) -> Optional[str]:
+    for alias in COLUMN_ALIASES[field]:
+        value = row.get(alias)
+        if value is not None and value != '' and value != []:
+            return value.strip() if isinstance(value, str) else value
+    return None
+
+def build_candidature(row: Dict, user_id: int, now: datetime) -> Dict:
+    """Valide une ligne et retourne les valeurs à insérer, lève RowValidationError sinon"""
+    if not isinstance(row, dict):
+        raise RowValidationError('Format de ligne invalide')
+
+    values = {field: _get(row, field) for field in COLUMN_ALIASES}
+
+    if not values['entreprise'] or not values['annonce']:
+        raise RowValidationError('Entreprise et annonce sont obligatoires')
+
+    # Tags : liste JSON, ou chaîne séparée par des virgules / points-virgules
+    tags = values['tags']
+    if isinstance(tags, str):
+        tags = tags.replace(';', ',').split(',')
+    if tags is not None and not isinstance(tags, list):
+        raise RowValidationError('Tags invalides')
+    values['tags'] = normalize_tags(tags)
+
+    if values['date']:
+        parsed = parse_date(values['date'])
+        if parsed is None:
+            raise RowValidationError(f"Date invalide : {values['date']}")
+        values['date'] = parsed
+
+    rappel_date = values['rappel_date']
+    if rappel_date:
+        try:
+            values['rappel_date'] = datetime.fromisoformat(str(rappel_date).replace('Z', '+00:00'))
+        except ValueError:
+            raise RowValidationError(f'Date de rappel invalide : {rappel_date}')
+
+    for field, max_length in MAX_LENGTHS.items():
+        if values[field] is not None:
+            values[field] = str(values[field])
+            if len(values[field]) > max_length:
+                raise RowValidationError(f'Champ {field} trop long ({max_length} caractères max)')
+
+    values.update({
+        'user_id': user_id,
+        'annonce': str(values['annonce']),
+        'notes': str(values['notes']) if values['notes'] is not None else '',
+        'date': values['date'] or now.date(),
+        'etat': values['etat'] or 'en_attente',
+        'created_at': now,
+        'updated_at': now
+    })
+    return values
+
+def _flush_batch(batch: List[Tuple[int, Dict]], user_id: int, dry_run: bool, errors: List[Dict]) -> int:
+    """Insère un lot dans sa propre transaction, retourne le nombre de lignes importées"""
+    if not batch:
+        return 0
+    if dry_run:
+        return len(batch)
+
+    # Horodatage propre à chaque ligne (décalé d'une microseconde) : il relie les identifiants
+    # renvoyés par la base aux lignes du lot, sans dépendre de l'ordre d'insertion
+    stamp = datetime.utcnow()
+    rows = [values for _, values in batch]
+    for index, row in enumerate(rows):
+        row['created_at'] = row['updated_at'] = stamp + timedelta(microseconds=index)
+    columns = [{key: value for key, value in row.items() if key != 'tags'} for row in rows]
+    try:
+        # Un seul INSERT ... VALUES (...), (...) pour tout le lot
+        stmt = insert(Candidature).values(columns)
+        if db.session.get_bind().dialect.insert_returning:
+            inserted = db.session.execute(stmt.returning(Candidature.id, Candidature.created_at)).all()
+        else:
+            # Base sans RETURNING (SQLite < 3.35) : relecture par horodatage
+            db.session.execute(stmt)
+            inserted = db.session.query(Candidature.id, Candidature.created_at) \
+                .filter(
+                    Candidature.user_id == user_id,
+                    Candidature.created_at >= stamp,
+                    Candidature.created_at <= rows[-1]['created_at']
+                ) \
+                .all()
+        ids = {created_at: candidature_id for candidature_id, created_at in inserted}
+        if len(inserted) != len(rows) or any(row['created_at'] not in ids for row in rows):
+            raise RuntimeError(f'{len(inserted)} identifiant(s) relu(s) pour {len(rows)} ligne(s)')
+
+        tag_rows = [
+            {'candidature_id': ids[row['created_at']], 'user_id': user_id, 'nom': nom}
+            for row in rows
+            for nom in row['tags']
+        ]
+        if tag_rows:
+            db.session.execute(insert(CandidatureTag), tag_rows)
+
+        record_bulk(user_id, rows)
+        bump_data_version(user_id)
+        db.session.commit()
+        return len(batch)
+    except Exception as e:
+        db.session.rollback()
+        print(f"[IMPORT] Erreur d'insertion du lot: {e}")
+        errors.extend({'row': line, 'error': "Erreur d'insertion en base"} for line, _ in batch)
+        return 0
+
+def import_candidatures(rows: Iterable[Tuple[int, Dict]], user_id: int, dry_run: bool = False) -> Dict:
+    """
+    Valide et insère des candidatures par lots de IMPORT_BATCH_SIZE
+
+    Args:
+        rows: itérable de (numéro de ligne, dict) produit par iter_csv_rows / iter_json_rows
+        user_id: propriétaire des candidatures
+        dry_run: si True, valide sans rien écrire en base
+
+    Returns:
+        Rapport {'total', 'imported', 'errors': [{'row', 'error'}], 'dry_run'}
+    """
+    now = datetime.utcnow()
+    total = 0
+    imported = 0
+    errors = []
+    batch = []
+
+    for line, row in rows:
+        total += 1
+        try:
+            batch.append((line, build_candidature(row, user_id, now)))
+        except RowValidationError as e:
+            errors.append({'row': line, 'error': str(e)})
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += _flush_batch(batch, user_id, dry_run, errors)
+            batch = []
+
+    imported += _flush_batch(batch, user_id, dry_run, errors)
+
+    return {
+        'total': total,
+        'imported': imported,
+        'errors': errors,
+        'dry_run': dry_run
+    }
@@ -0,0 +1,136 @@
+"""
+File d'attente des tâches IA, stockée dans la table ai_jobs
+Les routes enregistrent la tâche et répondent immédiatement ; `flask ai-worker` la réclame
+(SELECT ... FOR UPDATE SKIP LOCKED sur PostgreSQL, UPDATE conditionnel partout), l'exécute,
+la relance avec un délai croissant en cas d'échec, puis la passe en 'dead' après max_attempts.
+Une erreur qui ne peut pas disparaître (clé API absente, entrée invalide : résultat marqué
+'retryable': False) passe la tâche en 'dead' dès la première tentative.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from flask import current_app
+from models import db, AIJob
+
+def enqueue(kind: str, payload: Dict, user_id: Optional[int] = None) -> AIJob:
+    """Enregistre une tâche à exécuter dès que possible ; seul user_id pourra en lire le résultat"""
+    job = AIJob(
+        kind=kind,
+        user_id=user_id,
+        payload=json.dumps(payload),
+        max_attempts=current_app.config['AI_JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def claim_job(worker_id: str) -> Optional[AIJob]:
+    """
+    Réclame la prochaine tâche exécutable (en attente, ou verrouillée par un worker disparu)
+
+    FOR UPDATE SKIP LOCKED évite que deux workers PostgreSQL se bloquent sur la même ligne ;
+    l'UPDATE conditionnel garantit qu'un seul worker gagne, y compris sur SQLite où FOR UPDATE
+    n'existe pas.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['AI_JOB_LOCK_TIMEOUT'])
+
+    for _ in range(5):
+        job = AIJob.query \
+            .filter(db.or_(
+                db.and_(AIJob.status == 'queued', AIJob.run_after <= now),
+                db.and_(AIJob.status == 'running', AIJob.locked_at < stale)
+            )) \
+            .order_by(AIJob.run_after, AIJob.created_at) \
+            .with_for_update(skip_locked=True) \
+            .first()
+        if job is None:
+            db.session.rollback()
+            return None
+
+        claimed = AIJob.query \
+            .filter(AIJob.id == job.id, AIJob.status == job.status, AIJob.attempts == job.attempts) \
+            .update({
+                'status': 'running',
+                'attempts': AIJob.attempts + 1,
+                'locked_by': worker_id,
+                'locked_at': now,
+                'updated_at': now
+            }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+        # Un autre worker l'a prise entre le SELECT et l'UPDATE : on passe à la suivante
+
+    return None
+
+def complete_job(job: AIJob, worker_id: str, result: Optional[Dict], error: Optional[str],
+                 retryable: bool = True):
+    """Enregistre le résultat, ou planifie une nouvelle tentative, ou passe la tâche en 'dead'"""
+    now = datetime.utcnow()
+    if error is None:
+        values = {'status': 'succeeded', 'result': json.dumps(result), 'error': None}
+    elif not retryable or job.attempts >= job.max_attempts:
+        # Lettre morte : le client reçoit la dernière erreur comme résultat
+        values = {
+            'status': 'dead',
+            'result': json.dumps(result or {'success': False, 'error': error}),
+            'error': error
+        }
+    else:
+        delay = current_app.config['AI_JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+        values = {'status': 'queued', 'error': error, 'run_after': now + timedelta(seconds=delay)}
+
+    values.update({'locked_by': None, 'locked_at': None, 'updated_at': now})
+    # Si le verrou a expiré et qu'un autre worker a repris la tâche, ce résultat est ignoré
+    AIJob.query.filter_by(id=job.id, locked_by=worker_id, attempts=job.attempts) \
+        .update(values, synchronize_session=False)
+    db.session.commit()
+
+def run_job(job: AIJob, worker_id: str, handlers: Dict[str, Callable[[Dict], Dict]]):
+    """
+    Exécute une tâche réclamée ; un résultat {'success': False} compte comme un échec,
+    définitif s'il porte 'retryable': False
+    """
+    result, error, retryable = None, None, True
+    try:
+        handler = handlers.get(job.kind)
+        if handler is None:
+            error, retryable = f'Type de tâche inconnu : {job.kind}', False
+        else:
+            result = handler(json.loads(job.payload))
+            if not result.get('success'):
+                error = result.get('error') or 'Erreur inconnue'
+                retryable = result.get('retryable', True)
+    except Exception as e:
+        # Transaction éventuellement en échec (erreur SQL du handler) : complete_job doit pouvoir écrire
+        db.session.rollback()
+        error = str(e)
+    outcome = 'ok' if error is None else error if retryable else f'{error} (définitif)'
+    print(f"[JOBS] {job.kind} {job.id} tentative {job.attempts}/{job.max_attempts}: {outcome}")
+    complete_job(job, worker_id, result, error, retryable)
+
+def work(worker_id: str, handlers: Dict[str, Callable[[Dict], Dict]], poll_interval: float = 1.0,
+         once: bool = False):
+    """Boucle du worker : exécute les tâches disponibles, attend poll_interval quand la file est vide"""
+    while True:
+        try:
+            job = claim_job(worker_id)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            run_job(job, worker_id, handlers)
+        except Exception as e:
+            # Base indisponible, connexion coupée... : le worker continue ; une tâche non terminée
+            # est reprise à l'expiration de son verrou
+            db.session.rollback()
+            print(f"[JOBS] Erreur du worker {worker_id}: {e}")
+            if once:
+                return
+            time.sleep(poll_interval)
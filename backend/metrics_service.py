@@ -0,0 +1,293 @@
+"""
+Métriques au format texte Prometheus (GET /api/metrics)
+
+Chaque processus (worker gunicorn, ai-worker) agrège ses compteurs et histogrammes en mémoire
+et les écrit périodiquement dans son propre fichier de METRICS_DIR (écriture atomique, aucun
+verrou entre processus). À sa sortie, un processus verse ses valeurs dans metrics_aggregate.json
+et supprime son fichier ; l'export fait de même pour les fichiers des processus disparus sans
+passer par atexit (worker tué). Le nombre de fichiers reste donc borné par le nombre de processus
+vivants, et les compteurs restent croissants quand un worker redémarre. Vider METRICS_DIR au
+déploiement remet les compteurs à zéro.
+"""
+
+import os
+import re
+import json
+import glob
+import time
+import fcntl
+import atexit
+import secrets
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_DIR = os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'applicationtrack-metrics')
+FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # secondes
+AGGREGATE_FILE = 'metrics_aggregate.json'  # Valeurs des processus terminés
+LOCK_FILE = 'metrics.lock'
+_PROCESS_FILE = re.compile(r'metrics_(\d+)_[0-9a-f]+\.json$')
+
+# Appels IA : de quelques centaines de millisecondes à la minute
+AI_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+class Metric:
+    def __init__(self, name: str, kind: str, help_text: str, labels: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = ()):
+        self.name = name
+        self.kind = kind  # 'counter' ou 'histogram'
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Iterable[str], values: Iterable, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _merge(totals: Dict, entries: List):
+    """Ajoute les entrées d'un fichier [[nom, labels, valeur], ...] aux totaux"""
+    for name, labels, value in entries:
+        key = (name, tuple(labels))
+        current = totals.get(key)
+        if current is None:
+            totals[key] = value
+        elif isinstance(value, list):
+            if isinstance(current, list) and len(current) == len(value):
+                totals[key] = [a + b for a, b in zip(current, value)]
+        elif not isinstance(current, list):
+            totals[key] = current + value
+
+def _read_entries(path: str) -> Optional[List]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Processus d'un autre utilisateur
+    return True
+
+class MetricsRegistry:
+    """Compteurs et histogrammes du processus, partagés via un fichier par processus"""
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics: Dict[str, Metric] = {}
+        # (nom, valeurs des labels) -> valeur (compteur) ou [compte par bucket..., somme, nombre]
+        self._values: Dict[Tuple[str, Tuple[str, ...]], object] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Écriture ou suppression du fichier du processus
+        self._dirty = False
+        self._pid = None
+        self._path = None
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Metric:
+        return self.metrics.setdefault(name, Metric(name, 'counter', help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = AI_LATENCY_BUCKETS) -> Metric:
+        return self.metrics.setdefault(name, Metric(name, 'histogram', help_text, labels, tuple(buckets)))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+            self._dirty = True
+        self._ensure_flusher()
+
+    def observe(self, name: str, value: float, **labels):
+        metric = self.metrics[name]
+        key = self._key(name, labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(metric.buckets) + 2)
+            for i, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    counts[i] += 1  # Bucket non cumulatif ; cumulé à l'export
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+            self._dirty = True
+        self._ensure_flusher()
+
+    def _key(self, name: str, labels: Dict) -> Tuple[str, Tuple[str, ...]]:
+        return name, tuple(str(labels.get(label, '')) for label in self.metrics[name].labels)
+
+    # Partage entre processus
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Processus issu d'un fork : les valeurs héritées appartiennent au parent
+                self._values = {}
+            self._pid = pid
+            self._path = os.path.join(self.directory, f'metrics_{pid}_{secrets.token_hex(4)}.json')
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Écrit les valeurs du processus dans son fichier (remplacement atomique)"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty or self._path is None:
+                    return
+                entries = [[name, list(labels), value] for (name, labels), value in self._values.items()]
+                self._dirty = False
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self._path)
+            except OSError as e:
+                self._dirty = True
+                print(f"[METRICS] Écriture impossible: {e}")
+
+    def close(self):
+        """À la sortie du processus : ses valeurs rejoignent le fichier agrégé et son fichier est supprimé"""
+        if self._pid != os.getpid():
+            return  # Enregistrement hérité du parent par fork
+        self.flush()
+        with self._write_lock:
+            path, self._path = self._path, None  # Plus aucune écriture ensuite
+            if path is None or not os.path.exists(path):
+                return
+            try:
+                with self._directory_lock():
+                    self._fold([path])
+            except OSError as e:
+                print(f"[METRICS] Agrégation impossible: {e}")
+
+    @contextmanager
+    def _directory_lock(self):
+        """Verrou exclusif entre processus pour le fichier agrégé (lecture comprise)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Libéré à la fermeture du fichier
+            yield
+
+    def _fold(self, paths: List[str]):
+        """Verse ces fichiers de processus dans le fichier agrégé puis les supprime (verrou tenu)"""
+        aggregate_path = os.path.join(self.directory, AGGREGATE_FILE)
+        totals = {}
+        _merge(totals, _read_entries(aggregate_path) or [])
+        for path in paths:
+            _merge(totals, _read_entries(path) or [])
+        tmp_path = aggregate_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([[name, list(labels), value] for (name, labels), value in totals.items()], f)
+        os.replace(tmp_path, aggregate_path)
+        for path in paths:
+            os.remove(path)
+
+    def _collect(self) -> Dict[Tuple[str, Tuple[str, ...]], object]:
+        """Somme des valeurs de tous les processus, après agrégation des fichiers des processus disparus"""
+        totals = {}
+        pattern = os.path.join(self.directory, 'metrics_*.json')
+        with self._directory_lock():
+            dead = []
+            for path in glob.glob(pattern):
+                match = _PROCESS_FILE.search(os.path.basename(path))
+                if match and not _process_alive(int(match.group(1))):
+                    dead.append(path)
+            if dead:
+                try:
+                    self._fold(dead)
+                except OSError as e:
+                    print(f"[METRICS] Agrégation impossible: {e}")
+            for path in glob.glob(pattern):
+                _merge(totals, _read_entries(path) or [])
+
+        # Seules les métriques déclarées (et de même forme) sont exportées
+        collected = {}
+        for (name, labels), value in totals.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            if metric.kind == 'counter' and not isinstance(value, list):
+                collected[(name, labels)] = value
+            elif metric.kind == 'histogram' and isinstance(value, list) and len(value) == len(metric.buckets) + 2:
+                collected[(name, labels)] = value
+        return collected
+
+    def render(self) -> str:
+        """Export au format texte Prometheus (version 0.0.4)"""
+        self.flush()
+        totals = self._collect()
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            series = sorted(((labels, value) for (name, labels), value in totals.items() if name == metric.name),
+                            key=lambda item: item[0])
+            for labels, value in series:
+                if metric.kind == 'counter':
+                    lines.append(f'{metric.name}{_labels(metric.labels, labels)} {_format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    le = ('le', _format_number(bound))
+                    lines.append(f'{metric.name}_bucket{_labels(metric.labels, labels, le)} {cumulative}')
+                lines.append(f'{metric.name}_bucket{_labels(metric.labels, labels, ("le", "+Inf"))} {value[-1]}')
+                lines.append(f'{metric.name}_sum{_labels(metric.labels, labels)} {_format_number(value[-2])}')
+                lines.append(f'{metric.name}_count{_labels(metric.labels, labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+# ============= Appels IA =============
+
+AI_LABELS = ('provider', 'operation')
+
+metrics.counter('ai_requests_total', 'Appels aux providers IA', AI_LABELS + ('outcome',))
+metrics.counter('ai_errors_total', "Erreurs des appels IA par classe (timeout, rate_limit, server_error, "
+                "client_error, network, bad_response, parse_failure)", AI_LABELS + ('error_class',))
+metrics.histogram('ai_request_duration_seconds', 'Durée des appels IA, nouvelles tentatives comprises', AI_LABELS)
+metrics.counter('ai_tokens_total', 'Tokens consommés', AI_LABELS + ('direction',))
+metrics.counter('ai_cost_usd_total', 'Coût estimé des appels IA en dollars', AI_LABELS)
+
+def record_ai_call(provider: str, operation: str, duration: float, error_class: Optional[str] = None,
+                   input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0):
+    """Enregistre un appel à un provider (réussi si error_class est None)"""
+    metrics.inc('ai_requests_total', provider=provider, operation=operation,
+                outcome='error' if error_class else 'success')
+    metrics.observe('ai_request_duration_seconds', duration, provider=provider, operation=operation)
+    if error_class:
+        metrics.inc('ai_errors_total', provider=provider, operation=operation, error_class=error_class)
+    if input_tokens:
+        metrics.inc('ai_tokens_total', input_tokens, provider=provider, operation=operation, direction='input')
+    if output_tokens:
+        metrics.inc('ai_tokens_total', output_tokens, provider=provider, operation=operation, direction='output')
+    if cost:
+        metrics.inc('ai_cost_usd_total', cost, provider=provider, operation=operation)
+
+def record_ai_error(provider: str, operation: str, error_class: str):
+    """Erreur constatée après une réponse du provider (JSON invalide...)"""
+    metrics.inc('ai_errors_total', provider=provider, operation=operation, error_class=error_class)
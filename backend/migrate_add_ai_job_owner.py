@@ -0,0 +1,26 @@
+"""
+Migration : colonne ai_jobs.user_id (utilisateur qui a créé la tâche)
+GET /api/ai/jobs/<id> ne rend plus que les tâches du demandeur. Les tâches existantes, sans
+propriétaire, ne restent lisibles que sans jeton : elles sont de toute façon de courte durée.
+"""
+from app import app, db
+from sqlalchemy import text
+
+def migrate():
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE ai_jobs ADD COLUMN user_id INTEGER REFERENCES users(id)'))
+            db.session.commit()
+            print("✅ Colonne 'user_id' ajoutée")
+        except Exception as e:
+            db.session.rollback()
+            if 'already exists' in str(e).lower() or 'duplicate column' in str(e).lower():
+                print("ℹ️  Colonne 'user_id' existe déjà")
+            else:
+                print(f"❌ Erreur pour 'user_id': {e}")
+                return
+
+        print("\n🎉 Migration terminée avec succès!")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,25 @@
+"""
+Migration pour ajouter la colonne data_version à la table users
+(version des données de l'utilisateur, utilisée pour les ETag des réponses GET)
+"""
+from app import app, db
+from sqlalchemy import text
+
+def migrate():
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'))
+            print("✅ Colonne 'data_version' ajoutée")
+        except Exception as e:
+            db.session.rollback()
+            if 'already exists' in str(e).lower() or 'duplicate column' in str(e).lower():
+                print("ℹ️  Colonne 'data_version' existe déjà")
+            else:
+                print(f"❌ Erreur pour 'data_version': {e}")
+                return
+        
+        db.session.commit()
+        print("\n🎉 Migration terminée avec succès!")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,45 @@
+"""
+Migration pour l'envoi des rappels par email : colonne candidatures.rappel_sent_at et index
+Les rappels déjà passés sont marqués comme envoyés (ils étaient affichés dans l'application) :
+seuls les rappels à venir seront envoyés par email.
+"""
+from datetime import datetime
+from app import app, db
+from models import Candidature
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+NEW_INDEXES = ('ix_candidatures_user_rappel', 'ix_candidatures_rappel_pending')
+
+def migrate():
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE candidatures ADD COLUMN rappel_sent_at TIMESTAMP'))
+            db.session.commit()
+            print("✅ Colonne 'rappel_sent_at' ajoutée")
+
+            marked = Candidature.query \
+                .filter(Candidature.rappel_date < datetime.utcnow(), Candidature.rappel_sent_at.is_(None)) \
+                .update({'rappel_sent_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            print(f"✅ {marked} rappel(s) passé(s) marqué(s) comme envoyé(s)")
+        except Exception as e:
+            db.session.rollback()
+            if 'already exists' in str(e).lower() or 'duplicate column' in str(e).lower():
+                print("ℹ️  Colonne 'rappel_sent_at' existe déjà")
+            else:
+                print(f"❌ Erreur pour 'rappel_sent_at': {e}")
+                return
+
+        # Index (sans effet s'ils existent déjà) ; l'ancien index sur rappel_date seul devient inutile
+        with db.engine.begin() as conn:
+            for index in Candidature.__table__.indexes:
+                if index.name in NEW_INDEXES:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                    print(f"✅ Index '{index.name}' présent")
+            conn.execute(text('DROP INDEX IF EXISTS ix_candidatures_rappel_date'))
+
+        print("\n🎉 Migration terminée avec succès!")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,26 @@
+"""
+Migration : colonne users.token_version (révocation des jetons d'accès)
+Incrémentée à chaque réinitialisation du mot de passe ; les jetons émis avant portent l'ancienne
+version et sont refusés (401). Les jetons existants, sans version, correspondent à 0.
+"""
+from app import app, db
+from sqlalchemy import text
+
+def migrate():
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'))
+            db.session.commit()
+            print("✅ Colonne 'token_version' ajoutée")
+        except Exception as e:
+            db.session.rollback()
+            if 'already exists' in str(e).lower() or 'duplicate column' in str(e).lower():
+                print("ℹ️  Colonne 'token_version' existe déjà")
+            else:
+                print(f"❌ Erreur pour 'token_version': {e}")
+                return
+
+        print("\n🎉 Migration terminée avec succès!")
+
+if __name__ == '__main__':
+    migrate()
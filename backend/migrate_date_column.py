@@ -0,0 +1,85 @@
+"""
+Script de migration : colonne candidatures.date VARCHAR -> DATE, et création des index composites
+La conversion se fait par lots dans une colonne temporaire, puis la colonne est remplacée.
+Les dates illisibles prennent la date de création de la candidature (listées dans la sortie).
+"""
+from app import app, db
+from models import Candidature, parse_date
+from sqlalchemy import text, inspect
+from sqlalchemy.schema import CreateIndex
+
+BATCH_SIZE = 1000
+
+# Index créés par cette migration ; ceux des rappels viennent de migrate_add_reminders.py
+NEW_INDEXES = (
+    'ix_candidatures_user_created_at',
+    'ix_candidatures_user_date',
+    'ix_candidatures_user_etat',
+    'ix_candidatures_user_entreprise_lower',
+)
+
+def migrate():
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            columns = {col['name']: col for col in inspector.get_columns('candidatures')}
+            dialect = db.engine.dialect.name
+            
+            if 'date' in columns and 'DATE' != str(columns['date']['type']).upper():
+                # 1. Colonne temporaire
+                if 'date_tmp' not in columns:
+                    with db.engine.begin() as conn:
+                        conn.execute(text("ALTER TABLE candidatures ADD COLUMN date_tmp DATE"))
+                    print("✅ Colonne temporaire 'date_tmp' ajoutée")
+                
+                # 2. Conversion par lots (reprend là où elle s'est arrêtée si relancée)
+                last_id = 0
+                invalid = 0
+                while True:
+                    with db.engine.begin() as conn:
+                        rows = conn.execute(text(
+                            "SELECT id, date, created_at FROM candidatures "
+                            "WHERE id > :last_id AND date_tmp IS NULL ORDER BY id LIMIT :limit"
+                        ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+                        if not rows:
+                            break
+                        
+                        updates = []
+                        for row in rows:
+                            parsed = parse_date(row.date)
+                            if parsed is None:
+                                parsed = parse_date(str(row.created_at)) or parse_date('1970-01-01')
+                                invalid += 1
+                                print(f"⚠️  Candidature {row.id} : date illisible '{row.date}', remplacée par {parsed}")
+                            updates.append({'id': row.id, 'date_tmp': parsed})
+                        
+                        conn.execute(text("UPDATE candidatures SET date_tmp = :date_tmp WHERE id = :id"), updates)
+                        last_id = rows[-1].id
+                    print(f"✅ Candidatures jusqu'à l'id {last_id} converties")
+                
+                # 3. Remplacement de l'ancienne colonne
+                with db.engine.begin() as conn:
+                    conn.execute(text("DROP INDEX IF EXISTS ix_candidatures_user_date"))
+                    conn.execute(text("ALTER TABLE candidatures DROP COLUMN date"))
+                    conn.execute(text("ALTER TABLE candidatures RENAME COLUMN date_tmp TO date"))
+                    if dialect == 'postgresql':
+                        conn.execute(text("ALTER TABLE candidatures ALTER COLUMN date SET NOT NULL"))
+                print(f"✅ Colonne 'date' convertie en DATE ({invalid} date(s) illisible(s))")
+            else:
+                print("ℹ️  Colonne 'date' déjà de type DATE")
+            
+            # 4. Index composites (sans effet s'ils existent déjà)
+            with db.engine.begin() as conn:
+                for index in Candidature.__table__.indexes:
+                    if index.name in NEW_INDEXES:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                        print(f"✅ Index '{index.name}' présent")
+            
+            print("\n✅ Migration terminée avec succès!")
+            
+        except Exception as e:
+            print(f"\n❌ Erreur lors de la migration: {e}")
+            raise
+
+if __name__ == '__main__':
+    migrate()
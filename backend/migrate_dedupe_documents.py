@@ -0,0 +1,85 @@
+"""
+Migration vers le stockage des documents par contenu : colonne documents.content_hash, table
+document_files, puis déduplication des fichiers existants de uploads/<user_id>/ (un seul fichier
+par empreinte SHA-256 dans uploads/objects/). Relançable : seuls les documents sans empreinte
+sont traités. À lancer depuis le dossier backend/ (chemins url_fichier relatifs).
+"""
+import os
+from app import app, db, document_storage
+from models import Document, DocumentFile
+from sqlalchemy import func, text
+from sqlalchemy.schema import CreateIndex
+
+BATCH_SIZE = 100
+
+def migrate():
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)'))
+            db.session.commit()
+            print("✅ Colonne 'content_hash' ajoutée")
+        except Exception as e:
+            db.session.rollback()
+            if 'already exists' in str(e).lower() or 'duplicate column' in str(e).lower():
+                print("ℹ️  Colonne 'content_hash' existe déjà")
+            else:
+                print(f"❌ Erreur pour 'content_hash': {e}")
+                return
+
+        # Table document_files et index (sans effet s'ils existent déjà)
+        db.create_all()
+        with db.engine.begin() as conn:
+            for index in Document.__table__.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+        size_before = 0
+        migrated = missing = 0
+        last_id = 0
+        while True:
+            documents = Document.query \
+                .filter(Document.content_hash.is_(None), Document.id > last_id) \
+                .order_by(Document.id) \
+                .limit(BATCH_SIZE) \
+                .all()
+            if not documents:
+                break
+
+            sources = []
+            for document in documents:
+                last_id = document.id
+                source = document.url_fichier
+                if not os.path.isfile(source):
+                    print(f"⚠️  Document {document.id} : fichier introuvable ({source})")
+                    missing += 1
+                    continue
+                with open(source, 'rb') as f:
+                    temp_path, content_hash, size = document_storage.receive(f)
+                document.url_fichier, _ = document_storage.attach(temp_path, content_hash, size)
+                document.content_hash = content_hash
+                document.taille = size
+                size_before += size
+                sources.append(source)
+
+            # Les anciens fichiers ne sont supprimés qu'une fois les nouveaux chemins enregistrés
+            db.session.commit()
+            for source in sources:
+                os.remove(source)
+            migrated += len(sources)
+            print(f"✅ {migrated} document(s) migré(s)")
+
+        _remove_empty_folders(app.config['UPLOAD_FOLDER'])
+
+        stored = db.session.query(func.count(DocumentFile.content_hash), func.sum(DocumentFile.taille)).one()
+        print(f"\n📦 {stored[0]} fichier(s) distinct(s), {(stored[1] or 0) / 1024 / 1024:.1f} Mo stockés "
+              f"(documents migrés : {size_before / 1024 / 1024:.1f} Mo, fichiers introuvables : {missing})")
+        print("\n🎉 Migration terminée avec succès!")
+
+def _remove_empty_folders(root):
+    """Supprime les anciens dossiers uploads/<user_id>/ devenus vides"""
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name not in ('objects', 'tmp') and os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,66 @@
+"""
+Script de migration des tags : colonne JSON candidatures.tags -> table candidature_tags
+Les lignes sont traitées par lots ; relancer le script ne crée pas de doublons.
+"""
+import json
+from app import app, db
+from models import CandidatureTag, normalize_tags
+from sqlalchemy import text, inspect, insert
+
+BATCH_SIZE = 1000
+
+def migrate():
+    with app.app_context():
+        try:
+            # Créer la table candidature_tags si besoin
+            db.create_all()
+            
+            columns = [col['name'] for col in inspect(db.engine).get_columns('candidatures')]
+            if 'tags' not in columns:
+                print("ℹ️  Pas de colonne 'tags' à migrer")
+                return
+            
+            last_id = 0
+            migrated = 0
+            while True:
+                rows = db.session.execute(text(
+                    "SELECT id, user_id, tags FROM candidatures "
+                    "WHERE id > :last_id AND tags IS NOT NULL AND tags != '' "
+                    "ORDER BY id LIMIT :limit"
+                ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+                if not rows:
+                    break
+                
+                ids = [row.id for row in rows]
+                existing = set(db.session.query(CandidatureTag.candidature_id, CandidatureTag.nom)
+                               .filter(CandidatureTag.candidature_id.in_(ids)).all())
+                
+                tag_rows = []
+                for row in rows:
+                    try:
+                        tags = json.loads(row.tags)
+                    except ValueError:
+                        print(f"⚠️  Tags illisibles pour la candidature {row.id}: {row.tags}")
+                        continue
+                    for nom in normalize_tags(tags if isinstance(tags, list) else [tags]):
+                        if (row.id, nom) not in existing:
+                            tag_rows.append({'candidature_id': row.id, 'user_id': row.user_id, 'nom': nom})
+                
+                if tag_rows:
+                    db.session.execute(insert(CandidatureTag), tag_rows)
+                db.session.commit()
+                
+                migrated += len(tag_rows)
+                last_id = ids[-1]
+                print(f"✅ Candidatures jusqu'à l'id {last_id} traitées")
+            
+            print(f"\n✅ Migration terminée avec succès! ({migrated} tags créés)")
+            print("ℹ️  La colonne 'tags' n'est plus utilisée et peut être supprimée.")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Erreur lors de la migration: {e}")
+            raise
+
+if __name__ == '__main__':
+    migrate()
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 import secrets
+import json
 
 db = SQLAlchemy()
 
@@ -14,6 +15,10 @@ class User(db.Model):
     telephone = db.Column(db.String(20), nullable=True)
     ville = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Version des données de l'utilisateur, incrémentée à chaque écriture (sert aux ETag)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Version des jetons d'accès, incrémentée quand le mot de passe change (révoque les jetons émis)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relation avec les candidatures
     candidatures = db.relationship('Candidature', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -51,19 +56,31 @@ class PasswordResetToken(db.Model):
 
 class Candidature(db.Model):
     __tablename__ = 'candidatures'
+    # Index alignés sur les requêtes : toujours filtrées par user_id, triées avec l'id en départage
+    __table_args__ = (
+        db.Index('ix_candidatures_user_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_candidatures_user_date', 'user_id', 'date', 'id'),
+        db.Index('ix_candidatures_user_etat', 'user_id', 'etat'),
+        db.Index('ix_candidatures_user_rappel', 'user_id', 'rappel_date'),
+        # Rappels pas encore envoyés, seuls parcourus par le dispatcher
+        db.Index('ix_candidatures_rappel_pending', 'rappel_date',
+                 postgresql_where=db.text('rappel_sent_at IS NULL'),
+                 sqlite_where=db.text('rappel_sent_at IS NULL')),
+        db.Index('ix_candidatures_user_entreprise_lower', 'user_id', db.text('lower(entreprise)'), 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     entreprise = db.Column(db.String(200), nullable=False)
     annonce = db.Column(db.Text, nullable=False)
-    date = db.Column(db.String(20), nullable=False)
+    date = db.Column(db.Date, nullable=False)
     etat = db.Column(db.String(50), default='en_attente')
     notes = db.Column(db.Text, nullable=True)
-    tags = db.Column(db.String(500), nullable=True)  # Stocké comme JSON string
     contact_nom = db.Column(db.String(200), nullable=True)
     contact_email = db.Column(db.String(200), nullable=True)
     contact_telephone = db.Column(db.String(50), nullable=True)
     rappel_date = db.Column(db.DateTime, nullable=True)
+    rappel_sent_at = db.Column(db.DateTime, nullable=True)  # Rappel envoyé par email (remis à NULL si la date change)
     salaire = db.Column(db.String(100), nullable=True)
     localisation = db.Column(db.String(200), nullable=True)
     type_contrat = db.Column(db.String(50), nullable=True)  # CDI, CDD, Stage, Alternance
@@ -73,27 +90,100 @@ class Candidature(db.Model):
     # Relation avec les documents
     documents = db.relationship('Document', backref='candidature', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        import json
-        return {
+    # Relation avec les tags (une ligne par tag dans candidature_tags)
+    tag_links = db.relationship('CandidatureTag', lazy=True, cascade='all, delete-orphan',
+                                order_by='CandidatureTag.nom')
+    
+    @property
+    def tags(self):
+        return [link.nom for link in self.tag_links]
+    
+    def set_tags(self, tags):
+        """Remplace les tags (ajoute les nouveaux, retire les absents, conserve les autres)"""
+        wanted = normalize_tags(tags)
+        existing = {link.nom: link for link in self.tag_links}
+        
+        for nom, link in existing.items():
+            if nom not in wanted:
+                self.tag_links.remove(link)
+        for nom in wanted:
+            if nom not in existing:
+                self.tag_links.append(CandidatureTag(nom=nom, user_id=self.user_id))
+    
+    def to_dict(self, include_documents=True):
+        data = {
             'id': self.id,
             'entreprise': self.entreprise,
             'annonce': self.annonce,
-            'date': self.date,
+            'date': self.date.isoformat(),
             'etat': self.etat,
             'notes': self.notes,
-            'tags': json.loads(self.tags) if self.tags else [],
+            'tags': self.tags,
             'contact_nom': self.contact_nom,
             'contact_email': self.contact_email,
             'contact_telephone': self.contact_telephone,
             'rappel_date': self.rappel_date.isoformat() if self.rappel_date else None,
+            'rappel_sent_at': self.rappel_sent_at.isoformat() if self.rappel_sent_at else None,
             'salaire': self.salaire,
             'localisation': self.localisation,
             'type_contrat': self.type_contrat,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'documents': [doc.to_dict() for doc in self.documents]
+            'updated_at': self.updated_at.isoformat()
         }
+        
+        # Les vues liste peuvent désactiver l'embarquement des documents
+        if include_documents:
+            data['documents'] = [doc.to_dict() for doc in self.documents]
+        
+        return data
+
+# Formats de date acceptés en entrée (le format ISO est celui renvoyé par l'API)
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d.%m.%Y']
+
+def parse_date(value):
+    """Convertit une date saisie (ISO, JJ/MM/AAAA...) en date, retourne None si invalide"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        return None
+    
+    value = value.strip()
+    # Date-heure ISO (ex: 2025-01-31T10:00:00Z) : seule la partie date compte
+    if len(value) > 10 and value[10] in 'T ':
+        value = value[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def normalize_tags(tags):
+    """Nettoie une liste de tags : espaces retirés, vides et doublons supprimés, ordre conservé"""
+    result = []
+    for tag in tags or []:
+        nom = str(tag).strip()[:50]
+        if nom and nom not in result:
+            result.append(nom)
+    return result
+
+def bump_data_version(user_id):
+    """Incrémente atomiquement la version des données d'un utilisateur, dans la transaction en cours"""
+    User.query.filter_by(id=user_id) \
+        .update({'data_version': User.data_version + 1}, synchronize_session=False)
+
+class CandidatureTag(db.Model):
+    """Association candidature <-> tag, indexée pour les filtres exacts et les compteurs par tag"""
+    __tablename__ = 'candidature_tags'
+    __table_args__ = (
+        db.Index('ix_candidature_tags_user_nom', 'user_id', 'nom'),
+    )
+    
+    candidature_id = db.Column(db.Integer, db.ForeignKey('candidatures.id', ondelete='CASCADE'), primary_key=True)
+    nom = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
 class Document(db.Model):
     __tablename__ = 'documents'
@@ -104,6 +194,8 @@ class Document(db.Model):
     type_document = db.Column(db.String(50), nullable=False)  # cv, lettre_motivation, fiche_poste, autre
     url_fichier = db.Column(db.String(500), nullable=False)  # Chemin ou URL du fichier
     taille = db.Column(db.Integer, nullable=True)  # Taille en bytes
+    # Empreinte SHA-256 du contenu (document_files) ; NULL pour les fichiers d'avant la déduplication
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -116,3 +208,110 @@ class Document(db.Model):
             'taille': self.taille,
             'created_at': self.created_at.isoformat()
         }
+
+class DocumentFile(db.Model):
+    """Contenu déposé, stocké une seule fois quel que soit le nombre de documents qui le référencent"""
+    __tablename__ = 'document_files'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 hexadécimal
+    taille = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Documents qui référencent ce contenu
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserStatsCounter(db.Model):
+    """Compteurs de statistiques maintenus à chaque écriture (rollup par utilisateur)"""
+    __tablename__ = 'user_stats_counters'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'dimension', 'valeur', name='uq_user_stats_counter'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    dimension = db.Column(db.String(20), nullable=False)  # total, etat, type_contrat, jour
+    valeur = db.Column(db.String(50), nullable=False)  # ex: 'accepte', 'CDI', '2025-01-31'
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class AIJob(db.Model):
+    """Tâche IA en file d'attente, exécutée par `flask ai-worker` (identifiant aléatoire non devinable)"""
+    __tablename__ = 'ai_jobs'
+    __table_args__ = (
+        db.Index('ix_ai_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: secrets.token_hex(16))
+    kind = db.Column(db.String(50), nullable=False)  # cover_letter, parse_announcement, matching_score
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Demandeur (None sans jeton)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class AIResultCache(db.Model):
+    """Résultats IA mis en cache (parsing d'annonce, score de matching), clé = hash des entrées"""
+    __tablename__ = 'ai_result_cache'
+    
+    cache_key = db.Column(db.String(64), primary_key=True)  # sha256(opération, modèle, version du prompt, entrées)
+    operation = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON
+    tokens_used = db.Column(db.Integer, nullable=False, default=0)  # Coût de l'appel d'origine
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class FetchedPage(db.Model):
+    """Pages d'annonces récupérées : texte extrait et validateurs HTTP pour les requêtes conditionnelles"""
+    __tablename__ = 'fetched_pages'
+    
+    url_hash = db.Column(db.String(64), primary_key=True)  # sha256 de l'URL
+    url = db.Column(db.Text, nullable=False)
+    text = db.Column(db.Text, nullable=False)  # Texte extrait (déjà tronqué)
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    charset = db.Column(db.String(40))
+    bytes_read = db.Column(db.Integer, nullable=False, default=0)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)  # Dernier téléchargement complet
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Dernière validation (200 ou 304)
+
+class OutboxEmail(db.Model):
+    """Emails à envoyer, écrits dans la même transaction que l'action qui les déclenche"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))  # Lot de l'expéditeur qui l'envoie
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
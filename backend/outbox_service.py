@@ -0,0 +1,196 @@
+"""
+Boîte d'envoi des emails (table email_outbox)
+Les routes ajoutent l'email à la session dans la même transaction que l'action qui le déclenche
+(jeton de réinitialisation...) et répondent sans contacter le serveur SMTP. `flask email-worker`
+réclame les emails par lots, les envoie sur une seule connexion SMTP conservée tant que la file
+n'est pas vide, et retente les échecs avec un délai croissant jusqu'à EMAIL_MAX_ATTEMPTS.
+"""
+
+import time
+import secrets
+import smtplib
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from flask import current_app
+from flask_mail import Message
+from models import db, OutboxEmail
+from metrics_service import metrics
+
+PURGE_INTERVAL = 3600  # secondes entre deux purges des emails envoyés
+
+metrics.counter('emails_total', "Emails traités par l'expéditeur", ('outcome',))
+
+def queue_email(recipient: str, subject: str, body: str, html: Optional[str] = None) -> OutboxEmail:
+    """Ajoute un email à la session courante ; il part au commit de l'appelant"""
+    email = OutboxEmail(recipient=recipient, subject=subject, body=body, html=html)
+    db.session.add(email)
+    return email
+
+def claim_batch(limit: int) -> List[OutboxEmail]:
+    """
+    Réclame jusqu'à `limit` emails à envoyer (en attente, ou bloqués par un expéditeur disparu)
+
+    L'UPDATE conditionnel marque le lot avec un identifiant unique : deux expéditeurs ne peuvent
+    pas réclamer le même email, y compris sur SQLite où FOR UPDATE n'existe pas.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=config['EMAIL_LOCK_TIMEOUT'])
+    claimable = db.or_(
+        db.and_(OutboxEmail.status == 'pending', OutboxEmail.run_after <= now),
+        db.and_(OutboxEmail.status == 'sending', OutboxEmail.locked_at < stale)
+    )
+
+    ids = [row.id for row in db.session.query(OutboxEmail.id)
+           .filter(claimable)
+           .order_by(OutboxEmail.run_after, OutboxEmail.id)
+           .limit(limit)
+           .with_for_update(skip_locked=True)]
+    if not ids:
+        db.session.rollback()
+        return []
+
+    batch_id = secrets.token_hex(8)
+    OutboxEmail.query.filter(OutboxEmail.id.in_(ids), claimable).update({
+        'status': 'sending',
+        'attempts': OutboxEmail.attempts + 1,
+        'locked_by': batch_id,
+        'locked_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return OutboxEmail.query.filter_by(locked_by=batch_id, status='sending').order_by(OutboxEmail.id).all()
+
+def _finish(email: OutboxEmail, error: Optional[str], permanent: bool = False):
+    """Marque l'email envoyé, ou planifie une nouvelle tentative, ou le passe en 'dead'"""
+    config = current_app.config
+    now = datetime.utcnow()
+    if error is None:
+        values = {'status': 'sent', 'sent_at': now, 'last_error': None}
+        outcome = 'sent'
+    elif permanent or email.attempts >= config['EMAIL_MAX_ATTEMPTS']:
+        values = {'status': 'dead', 'last_error': error}
+        outcome = 'dead'
+    else:
+        delay = min(config['EMAIL_RETRY_DELAY'] * 2 ** (email.attempts - 1), 3600)
+        values = {'status': 'pending', 'last_error': error, 'run_after': now + timedelta(seconds=delay)}
+        outcome = 'retry'
+
+    values.update({'locked_by': None, 'locked_at': None})
+    # Si le verrou a expiré et qu'un autre expéditeur a repris l'email, ce résultat est ignoré
+    OutboxEmail.query.filter_by(id=email.id, locked_by=email.locked_by) \
+        .update(values, synchronize_session=False)
+    db.session.commit()
+    metrics.inc('emails_total', outcome=outcome)
+    print(f"[MAIL] Email {email.id} à {email.recipient} tentative {email.attempts}: {error or 'envoyé'}")
+
+def _is_permanent(error: Exception) -> bool:
+    """Refus définitif du serveur (code 5xx) : inutile de retenter"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return getattr(error, 'smtp_code', 0) >= 500 or isinstance(error, (ValueError, AssertionError))
+
+class SMTPSender:
+    """Connexion SMTP ouverte à la demande et réutilisée pour tous les emails d'une série"""
+
+    def __init__(self, config):
+        self.config = config
+        self.host = None
+
+    def send(self, email: OutboxEmail):
+        message = Message(
+            subject=email.subject,
+            recipients=[email.recipient],
+            body=email.body,
+            html=email.html,
+            sender=self.config['MAIL_DEFAULT_SENDER']
+        )
+        if self.config.get('MAIL_SUPPRESS_SEND'):
+            return
+        if self.host is None:
+            self.host = self._connect()
+        self.host.sendmail(message.sender, message.send_to, message.as_bytes())
+
+    def _connect(self) -> smtplib.SMTP:
+        config = self.config
+        smtp_class = smtplib.SMTP_SSL if config['MAIL_USE_SSL'] else smtplib.SMTP
+        host = smtp_class(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['EMAIL_SMTP_TIMEOUT'])
+        if config['MAIL_USE_TLS'] and not config['MAIL_USE_SSL']:
+            host.starttls()
+        if config['MAIL_USERNAME'] and config['MAIL_PASSWORD']:
+            host.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        return host
+
+    def close(self):
+        if self.host is not None:
+            try:
+                self.host.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.host = None
+
+def send_batch(sender: SMTPSender, batch: List[OutboxEmail]) -> bool:
+    """
+    Envoie un lot ; une erreur de connexion est reportée sur tous les emails restants du lot
+
+    Returns:
+        False si le serveur SMTP est injoignable
+    """
+    for index, email in enumerate(batch):
+        try:
+            sender.send(email)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError,
+                ValueError, AssertionError) as e:
+            # Refus propre à ce message (destinataire invalide...) : la connexion reste utilisable
+            _finish(email, str(e), permanent=_is_permanent(e))
+            continue
+        except OSError as e:  # Inclut SMTPException
+            # Serveur injoignable ou connexion perdue : le lot est reporté, reconnexion au prochain
+            sender.close()
+            for pending in batch[index:]:
+                _finish(pending, f'Connexion SMTP: {e}')
+            return False
+        _finish(email, None)
+    return True
+
+def purge_sent():
+    """Supprime les emails envoyés depuis plus de EMAIL_OUTBOX_RETENTION secondes"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['EMAIL_OUTBOX_RETENTION'])
+    OutboxEmail.query.filter(OutboxEmail.status == 'sent', OutboxEmail.sent_at < cutoff) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+
+def work(poll_interval: float = 1.0, once: bool = False,
+         periodic: Sequence[Tuple[float, Callable[[], object]]] = ()):
+    """
+    Boucle de l'expéditeur : la connexion SMTP reste ouverte tant que des emails arrivent
+
+    Args:
+        periodic: tâches (intervalle en secondes, fonction) exécutées avant l'envoi, ex. les rappels
+    """
+    config = current_app.config
+    sender = SMTPSender(config)
+    last_purge = None
+    last_runs = [None] * len(periodic)
+    try:
+        while True:
+            for index, (interval, task) in enumerate(periodic):
+                if last_runs[index] is None or time.monotonic() - last_runs[index] >= interval:
+                    last_runs[index] = time.monotonic()
+                    try:
+                        task()
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"[MAIL] Tâche périodique {task.__name__} en échec: {e}")
+            batch = claim_batch(config['EMAIL_BATCH_SIZE'])
+            if batch and send_batch(sender, batch):
+                continue
+            sender.close()
+            if last_purge is None or time.monotonic() - last_purge > PURGE_INTERVAL:
+                purge_sent()
+                last_purge = time.monotonic()
+            if once:
+                return
+            time.sleep(poll_interval)
+    finally:
+        sender.close()
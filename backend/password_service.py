@@ -0,0 +1,78 @@
+"""
+Hachage des mots de passe hors des threads de requête
+La dérivation de clé (scrypt, pbkdf2) est volontairement coûteuse : elle tourne dans un pool
+borné de PASSWORD_HASH_WORKERS threads (hashlib relâche le GIL pendant le calcul). Au plus
+PASSWORD_HASH_QUEUE calculs attendent en plus ; au-delà, PasswordHasherBusy est levée
+immédiatement et la route répond 429, au lieu d'occuper tous les workers gunicorn pendant une
+vague de connexions. Les hachages dont les paramètres diffèrent de PASSWORD_HASH_METHOD sont
+recalculés à la connexion suivante.
+"""
+
+import time
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from metrics_service import metrics
+
+HASH_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+metrics.counter('password_hash_total', 'Calculs de hachage de mot de passe (rejected = pool saturé, error = exception)',
+                ('operation', 'outcome'))
+metrics.histogram('password_hash_duration_seconds', "Durée des hachages, attente dans la file comprise",
+                  ('operation',), buckets=HASH_LATENCY_BUCKETS)
+
+class PasswordHasherBusy(Exception):
+    """Trop de hachages en cours ou en attente"""
+
+class PasswordHasher:
+    """Pool borné de hachage / vérification avec contrôle d'admission"""
+
+    def __init__(self, method: str, workers: int, queue_size: int):
+        self.method = method
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # Calculs admis : en cours + en attente
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._dummy_hash = None
+        self._dummy_lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run('hash', generate_password_hash, password, method=self.method)
+
+    def verify(self, pwhash: Optional[str], password: str) -> bool:
+        """Vérifie le mot de passe ; sans hachage (utilisateur inconnu), le même coût est payé"""
+        if pwhash is None:
+            self._run('verify', check_password_hash, self._dummy(), password)
+            return False
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Hachage calculé avec d'autres paramètres (algorithme, coût) que ceux configurés"""
+        return pwhash.split('$', 1)[0] != self._dummy().split('$', 1)[0]
+
+    def _dummy(self) -> str:
+        """Hachage d'un secret aléatoire : donne aussi la forme complète de la méthode configurée"""
+        if self._dummy_hash is None:
+            with self._dummy_lock:
+                if self._dummy_hash is None:
+                    self._dummy_hash = generate_password_hash(secrets.token_hex(16), method=self.method)
+        return self._dummy_hash
+
+    def _run(self, operation: str, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            metrics.inc('password_hash_total', operation=operation, outcome='rejected')
+            raise PasswordHasherBusy()
+        start = time.perf_counter()
+        try:
+            result = self._executor.submit(fn, *args, **kwargs).result()
+        except BaseException:
+            metrics.inc('password_hash_total', operation=operation, outcome='error')
+            raise
+        else:
+            metrics.inc('password_hash_total', operation=operation, outcome='ok')
+            return result
+        finally:
+            self._slots.release()
+            metrics.observe('password_hash_duration_seconds', time.perf_counter() - start, operation=operation)
@@ -0,0 +1,94 @@
+"""
+Instrumentation des requêtes HTTP : latence par route, nombre et durée des requêtes SQL
+Les requêtes SQL sont comptées par les événements du moteur SQLAlchemy et rattachées à la
+requête HTTP en cours (flask.g). Les valeurs alimentent /api/metrics ; une requête plus lente
+que SLOW_REQUEST_MS ou qui exécute plus de SLOW_REQUEST_QUERIES requêtes SQL est journalisée
+avec ses requêtes les plus lentes. En debug (ou avec SERVER_TIMING=true), la réponse porte un
+en-tête Server-Timing visible dans les outils de développement du navigateur.
+La durée mesurée s'arrête au retour de la vue : le corps des réponses streamées n'est pas compté.
+"""
+
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics_service import metrics
+
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+LOGGED_STATEMENTS = 10  # Requêtes SQL affichées dans le journal des requêtes lentes
+KEPT_STATEMENTS = 500  # Requêtes SQL conservées par requête HTTP (les suivantes sont seulement comptées)
+STATEMENT_MAX_LENGTH = 500
+
+HTTP_LABELS = ('method', 'route')
+
+metrics.counter('http_requests_total', 'Requêtes HTTP', HTTP_LABELS + ('status',))
+metrics.histogram('http_request_duration_seconds', 'Durée des requêtes HTTP (hors corps streamé)', HTTP_LABELS,
+                  buckets=HTTP_LATENCY_BUCKETS)
+metrics.histogram('http_request_db_queries', 'Requêtes SQL par requête HTTP', HTTP_LABELS,
+                  buckets=QUERY_COUNT_BUCKETS)
+metrics.counter('http_db_duration_seconds_total', 'Temps passé en base par route', HTTP_LABELS)
+metrics.counter('http_slow_requests_total', 'Requêtes au-delà du budget de temps ou de requêtes SQL', HTTP_LABELS)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'perf_start' in g:
+        conn.info.setdefault('perf_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('perf_query_start')
+    if not starts or not has_request_context() or 'perf_start' not in g:
+        return
+    duration = time.perf_counter() - starts.pop()
+    g.perf_sql_count += 1
+    g.perf_sql_time += duration
+    if len(g.perf_statements) < KEPT_STATEMENTS:
+        g.perf_statements.append((duration, statement))
+
+def init_request_instrumentation(app):
+    """Enregistre les hooks avant / après chaque requête"""
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    slow_queries = app.config['SLOW_REQUEST_QUERIES']
+
+    @app.before_request
+    def _start_timer():
+        g.perf_start = time.perf_counter()
+        g.perf_sql_count = 0
+        g.perf_sql_time = 0.0
+        g.perf_statements = []
+
+    @app.after_request
+    def _record_request(response):
+        if 'perf_start' not in g:
+            return response
+        duration = time.perf_counter() - g.perf_start
+        # Modèle de la route (/api/candidatures/<int:candidature_id>) : cardinalité bornée
+        labels = {'method': request.method, 'route': request.url_rule.rule if request.url_rule else 'unmatched'}
+
+        metrics.inc('http_requests_total', status=response.status_code, **labels)
+        metrics.observe('http_request_duration_seconds', duration, **labels)
+        metrics.observe('http_request_db_queries', g.perf_sql_count, **labels)
+        if g.perf_sql_time:
+            metrics.inc('http_db_duration_seconds_total', g.perf_sql_time, **labels)
+
+        if duration * 1000 > slow_ms or g.perf_sql_count > slow_queries:
+            metrics.inc('http_slow_requests_total', **labels)
+            _log_slow_request(duration, labels)
+
+        if app.debug or app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.perf_sql_time * 1000:.1f};desc="{g.perf_sql_count} SQL", '
+                f'app;dur={(duration - g.perf_sql_time) * 1000:.1f}, total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+def _log_slow_request(duration: float, labels: dict):
+    print(f"[PERF] Requête lente {request.method} {request.path} ({labels['route']}) : "
+          f"{duration * 1000:.0f} ms, {g.perf_sql_count} requêtes SQL ({g.perf_sql_time * 1000:.0f} ms)")
+    for query_time, statement in sorted(g.perf_statements, key=lambda s: s[0], reverse=True)[:LOGGED_STATEMENTS]:
+        statement = ' '.join(statement.split())
+        if len(statement) > STATEMENT_MAX_LENGTH:
+            statement = statement[:STATEMENT_MAX_LENGTH] + '...'
+        print(f"[PERF]   {query_time * 1000:7.1f} ms  {statement}")
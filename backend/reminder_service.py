@@ -0,0 +1,123 @@
+"""
+Rappels des candidatures (candidatures.rappel_date)
+Le dispatcher ne parcourt que les rappels non envoyés de la fenêtre [maintenant - REMINDER_LOOKBACK,
+maintenant + REMINDER_LOOKAHEAD] (index partiel ix_candidatures_rappel_pending). Il les marque
+envoyés par un UPDATE ... RETURNING : une ligne n'est rendue qu'au seul dispatcher qui l'a modifiée,
+même avec plusieurs processus. Un email récapitulatif par utilisateur est mis en boîte d'envoi
+dans la même transaction que le marquage : un rappel n'est donc jamais envoyé deux fois.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from html import escape
+from typing import List
+
+from flask import current_app
+from sqlalchemy import update
+from models import db, Candidature, User, bump_data_version
+from outbox_service import queue_email
+from metrics_service import metrics
+
+metrics.counter('reminders_sent_total', 'Rappels de candidature envoyés par email')
+
+def due_reminders(user_id: int, until: datetime) -> List:
+    """Rappels d'un utilisateur antérieurs à `until`, du plus ancien au plus récent (index user_id, rappel_date)"""
+    return db.session.query(
+        Candidature.id,
+        Candidature.entreprise,
+        Candidature.annonce,
+        Candidature.etat,
+        Candidature.rappel_date,
+        Candidature.rappel_sent_at
+    ).filter(
+        Candidature.user_id == user_id,
+        Candidature.rappel_date.isnot(None),
+        Candidature.rappel_date < until
+    ).order_by(Candidature.rappel_date, Candidature.id).all()
+
+def dispatch_due_reminders(now: datetime = None) -> List[int]:
+    """
+    Envoie un récapitulatif des rappels échus à chaque utilisateur concerné
+
+    Returns:
+        Identifiants des utilisateurs notifiés (leurs données ont changé : caches à invalider)
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    pending = db.and_(
+        Candidature.rappel_sent_at.is_(None),
+        Candidature.rappel_date > now - timedelta(seconds=config['REMINDER_LOOKBACK']),
+        Candidature.rappel_date <= now + timedelta(seconds=config['REMINDER_LOOKAHEAD'])
+    )
+
+    notified = []
+    while True:
+        # Par utilisateur entier, pour que ses rappels partent dans un seul email
+        user_ids = [user_id for (user_id,) in db.session.query(Candidature.user_id)
+                    .filter(pending).distinct().limit(config['REMINDER_BATCH_USERS'])]
+        if not user_ids:
+            db.session.rollback()
+            return notified
+
+        claimed = db.session.execute(
+            update(Candidature)
+            .where(pending, Candidature.user_id.in_(user_ids))
+            .values(rappel_sent_at=now)
+            .returning(Candidature.id, Candidature.user_id, Candidature.entreprise,
+                       Candidature.annonce, Candidature.rappel_date),
+            execution_options={'synchronize_session': False}
+        ).all()
+
+        by_user = defaultdict(list)
+        for row in claimed:
+            by_user[row.user_id].append(row)
+        users = db.session.query(User.id, User.username, User.email).filter(User.id.in_(list(by_user))).all()
+        for user in users:
+            rows = sorted(by_user[user.id], key=lambda row: row.rappel_date)
+            queue_email(user.email, *_digest(user.username, rows))
+            bump_data_version(user.id)
+        db.session.commit()
+
+        metrics.inc('reminders_sent_total', len(claimed))
+        notified.extend(by_user)
+        print(f"[RAPPELS] {len(claimed)} rappel(s) envoyé(s) à {len(by_user)} utilisateur(s)")
+
+def _digest(username: str, rows: List):
+    """(sujet, texte, html) de l'email récapitulatif"""
+    link = current_app.config['FRONTEND_URL']
+    subject = f'{len(rows)} rappel(s) de candidature - ApplicationTrack'
+    lines = [f"- {row.entreprise} : {row.annonce[:80]} (rappel du {row.rappel_date.strftime('%d/%m/%Y')})"
+             for row in rows]
+    body = f'''Bonjour {username},
+
+Vous avez {len(rows)} rappel(s) de candidature :
+
+{chr(10).join(lines)}
+
+Retrouvez vos candidatures sur {link}
+
+Cordialement,
+L'équipe ApplicationTrack
+'''
+    items = ''.join(
+        f"<li><strong>{escape(row.entreprise)}</strong> : {escape(row.annonce[:80])} "
+        f"<span style=\"color: #666;\">(rappel du {row.rappel_date.strftime('%d/%m/%Y')})</span></li>"
+        for row in rows
+    )
+    html = f'''
+<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+        <h2 style="color: #3B82F6;">Vos rappels de candidature</h2>
+        <p>Bonjour <strong>{escape(username)}</strong>,</p>
+        <ul>{items}</ul>
+        <p><a href="{link}" style="color: #3B82F6;">Voir mes candidatures</a></p>
+        <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
+        <p style="color: #999; font-size: 12px; text-align: center;">
+            L'équipe ApplicationTrack
+        </p>
+    </div>
+</body>
+</html>
+'''
+    return subject, body, html
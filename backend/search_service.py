@@ -0,0 +1,160 @@
+"""
+Recherche plein texte sur les candidatures
+- PostgreSQL : colonne tsvector générée (config française sans accents) + index GIN
+- SQLite : table virtuelle FTS5 (sans accents) synchronisée par triggers
+L'index couvre entreprise, annonce, notes, localisation et contact_nom. Il est maintenu par la
+base elle-même, donc à jour pour toutes les écritures (routes CRUD, import en masse...).
+Si aucun index n'est disponible, la recherche retombe sur des ILIKE.
+"""
+
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, text, table, column, literal_column
+from models import db, Candidature
+
+# Backend de recherche détecté au démarrage : 'postgresql', 'sqlite' ou None (ILIKE)
+_backend = None
+
+POSTGRES_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'fr_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION fr_unaccent (COPY = french);
+            ALTER TEXT SEARCH CONFIGURATION fr_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END
+    $$
+    """,
+    """
+    ALTER TABLE candidatures ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('fr_unaccent'::regconfig, coalesce(entreprise, '')), 'A') ||
+        setweight(to_tsvector('fr_unaccent'::regconfig, coalesce(contact_nom, '')), 'B') ||
+        setweight(to_tsvector('fr_unaccent'::regconfig, coalesce(localisation, '')), 'C') ||
+        setweight(to_tsvector('fr_unaccent'::regconfig, coalesce(annonce, '') || ' ' || coalesce(notes, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_candidatures_search ON candidatures USING GIN (search_vector)"
+]
+
+SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS candidatures_fts USING fts5(
+        entreprise, annonce, notes, localisation, contact_nom,
+        content='candidatures', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS candidatures_fts_ai AFTER INSERT ON candidatures BEGIN
+        INSERT INTO candidatures_fts(rowid, entreprise, annonce, notes, localisation, contact_nom)
+        VALUES (new.id, new.entreprise, new.annonce, new.notes, new.localisation, new.contact_nom);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS candidatures_fts_ad AFTER DELETE ON candidatures BEGIN
+        INSERT INTO candidatures_fts(candidatures_fts, rowid, entreprise, annonce, notes, localisation, contact_nom)
+        VALUES ('delete', old.id, old.entreprise, old.annonce, old.notes, old.localisation, old.contact_nom);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS candidatures_fts_au AFTER UPDATE OF entreprise, annonce, notes, localisation, contact_nom
+    ON candidatures BEGIN
+        INSERT INTO candidatures_fts(candidatures_fts, rowid, entreprise, annonce, notes, localisation, contact_nom)
+        VALUES ('delete', old.id, old.entreprise, old.annonce, old.notes, old.localisation, old.contact_nom);
+        INSERT INTO candidatures_fts(rowid, entreprise, annonce, notes, localisation, contact_nom)
+        VALUES (new.id, new.entreprise, new.annonce, new.notes, new.localisation, new.contact_nom);
+    END
+    """
+]
+
+# Suffixes retirés pour la racinisation française côté SQLite (FTS5 n'a pas de stemmer français)
+SUFFIXES = [
+    'issements', 'issement', 'ements', 'ement', 'ations', 'ation', 'atrices', 'atrice',
+    'ateurs', 'ateur', 'euses', 'euse', 'eurs', 'eur', 'istes', 'iste', 'ismes', 'isme',
+    'iques', 'ique', 'ables', 'able', 'ites', 'ite', 'ives', 'ive', 'ifs', 'if'
+]
+
+def ensure_search_index():
+    """Crée l'index plein texte s'il n'existe pas (idempotent) et détecte le backend utilisable"""
+    global _backend
+    dialect = db.engine.dialect.name
+    statements = {'postgresql': POSTGRES_SETUP, 'sqlite': SQLITE_SETUP}.get(dialect)
+    if not statements:
+        _backend = None
+        return
+
+    try:
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                created = not conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'candidatures_fts'"
+                )).first()
+            for statement in statements:
+                conn.execute(text(statement))
+            # Indexer les candidatures existantes à la création de la table FTS
+            if dialect == 'sqlite' and created:
+                conn.execute(text("INSERT INTO candidatures_fts(candidatures_fts) VALUES ('rebuild')"))
+        _backend = dialect
+    except Exception as e:
+        print(f"[SEARCH] Index plein texte indisponible, recherche par ILIKE: {e}")
+        _backend = None
+
+def search_backend() -> Optional[str]:
+    return _backend
+
+def _tokens(search: str) -> List[str]:
+    return re.findall(r'\w+', search.lower())[:10]
+
+def _racine(mot: str) -> str:
+    """Racinisation légère : sans accents, sans pluriel ni suffixe dérivationnel courant"""
+    mot = ''.join(c for c in unicodedata.normalize('NFKD', mot) if not unicodedata.combining(c))
+    if len(mot) > 4 and mot[-1] in 'sx':
+        mot = mot[:-1]
+    for suffix in SUFFIXES:
+        if mot.endswith(suffix) and len(mot) - len(suffix) >= 4:
+            return mot[:-len(suffix)]
+    return mot
+
+def apply_search(query, search: str) -> Tuple[object, Optional[object]]:
+    """
+    Ajoute le filtre de recherche à la requête
+
+    Returns:
+        (requête filtrée, expression de pertinence - plus grand = plus pertinent - ou None)
+    """
+    tokens = _tokens(search)
+    if not tokens:
+        return query, None
+
+    if _backend == 'postgresql':
+        # Préfixe sur chaque mot (racinisé par la config fr_unaccent), tous les mots requis
+        tsquery = func.to_tsquery('fr_unaccent', ' & '.join(f'{t}:*' for t in tokens))
+        vector = literal_column('candidatures.search_vector')
+        rank = func.ts_rank(vector, tsquery)
+        return query.filter(vector.op('@@')(tsquery)), rank
+
+    if _backend == 'sqlite':
+        fts_query = ' '.join(f'"{_racine(t)}"*' for t in tokens)
+        fts = table('candidatures_fts', column('rowid'))
+        # bm25 : plus petit = plus pertinent ; poids par colonne (entreprise en premier)
+        rank = -func.bm25(literal_column('candidatures_fts'), 10.0, 1.0, 2.0, 3.0, 5.0)
+        query = query.join(fts, fts.c.rowid == Candidature.id) \
+            .filter(text('candidatures_fts MATCH :fts_query').bindparams(fts_query=fts_query))
+        return query, rank
+
+    search_pattern = f'%{search}%'
+    return query.filter(
+        db.or_(
+            Candidature.entreprise.ilike(search_pattern),
+            Candidature.annonce.ilike(search_pattern),
+            Candidature.notes.ilike(search_pattern),
+            Candidature.localisation.ilike(search_pattern),
+            Candidature.contact_nom.ilike(search_pattern)
+        )
+    ), None
@@ -0,0 +1,323 @@
+"""
+Service de statistiques pour ApplicationTrack
+Les comptages sont lus depuis des compteurs maintenus à chaque écriture (UserStatsCounter),
+ou calculés côté base de données (GROUP BY), sans jamais charger d'objets ORM
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app
+from sqlalchemy import func, case, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Candidature, UserStatsCounter
+
+# États connus, toujours présents dans les statistiques (même à 0)
+ETATS = [
+    'en_attente',
+    'entretien_passe',
+    'accepte',
+    'refus_etude',
+    'refuse_entretien',
+    'sans_reponse',
+    'sans_reponse_entretien'
+]
+
+# Granularités acceptées et nombre maximal de périodes pour chacune
+GRANULARITES = {
+    'day': 366,
+    'week': 104,
+    'month': 60
+}
+
+def get_timezone(name: str):
+    """Retourne le fuseau horaire demandé, ou None s'il est inconnu"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def _period_start(now: datetime, granularity: str) -> datetime:
+    """Début (heure locale) de la période contenant `now`"""
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())  # Semaines ISO (lundi)
+    elif granularity == 'month':
+        start = start.replace(day=1)
+    return start
+
+def _shift(start: datetime, granularity: str, n: int) -> datetime:
+    """Décale un début de période de n périodes (mois calendaires pour 'month')"""
+    if granularity == 'day':
+        return start + timedelta(days=n)
+    if granularity == 'week':
+        return start + timedelta(weeks=n)
+    month_index = start.year * 12 + (start.month - 1) + n
+    return start.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+def _label(start: datetime, granularity: str) -> str:
+    return start.strftime('%Y-%m' if granularity == 'month' else '%Y-%m-%d')
+
+def _local_period_starts(granularity: str, periods: int, tz) -> List[datetime]:
+    """Débuts des périodes en heure locale (naïve), du plus ancien au plus récent. Retourne periods + 1 bornes."""
+    now = datetime.now(tz).replace(tzinfo=None)
+    current = _period_start(now, granularity)
+    return [_shift(current, granularity, -i) for i in range(periods - 1, -2, -1)]
+
+def _utc_offsets(start: datetime, end: datetime, tz) -> List[Tuple[Optional[datetime], int]]:
+    """
+    Décalages UTC du fuseau (en secondes) entre deux instants UTC naïfs : [(jusqu'à, décalage), ...],
+    le dernier sans borne. Les changements d'heure sont localisés à la seconde près.
+    """
+    def offset(moment: datetime) -> int:
+        return int(moment.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset().total_seconds())
+
+    spans = []
+    current = offset(start)
+    moment = start
+    while moment < end:
+        following = min(moment + timedelta(days=1), end)
+        if offset(following) != current:
+            # Recherche dichotomique du premier instant au nouveau décalage
+            low, high = moment, following
+            while high - low > timedelta(seconds=1):
+                middle = low + timedelta(seconds=(high - low).total_seconds() // 2)
+                if offset(middle) == current:
+                    low = middle
+                else:
+                    high = middle
+            spans.append((high, current))
+            current = offset(high)
+        moment = following
+    spans.append((None, current))
+    return spans
+
+def _local_date(column, start: datetime, end: datetime, tz):
+    """Jour local (YYYY-MM-DD) d'une colonne UTC naïve, pour les lignes comprises entre start et end"""
+    spans = _utc_offsets(start, end, tz)
+    sqlite_dialect = db.session.get_bind().dialect.name == 'sqlite'
+
+    def shift(offset: int):
+        # SQLite : modificateur de date() ; ailleurs : intervalle ajouté à la colonne
+        return f'{offset:+d} seconds' if sqlite_dialect else timedelta(seconds=offset)
+
+    if len(spans) == 1:
+        shifted = literal(shift(spans[0][1]))
+    else:
+        shifted = case(*[(column < until, shift(offset)) for until, offset in spans[:-1]],
+                       else_=shift(spans[-1][1]))
+    if sqlite_dialect:
+        return func.date(column, shifted)
+    return func.date(column + shifted)
+
+def _bucket_days(rows, local_starts: List[datetime], granularity: str, periods: int) -> List[Dict]:
+    """Range des comptages par jour local (YYYY-MM-DD) dans leurs périodes, périodes vides comprises"""
+    starts = [start.strftime('%Y-%m-%d') for start in local_starts]
+    counts = [0] * periods
+    for jour, count in rows:
+        index = bisect_right(starts, str(jour)) - 1
+        if 0 <= index < periods:
+            counts[index] += count
+    return [{'periode': _label(local_starts[i], granularity), 'count': counts[i]} for i in range(periods)]
+
+def histogram(user_id: int, granularity: str = 'day', periods: int = 7, tz=timezone.utc) -> List[Dict]:
+    """
+    Histogramme des candidatures créées par période, calculé en une requête GROUP BY
+
+    Les lignes de la fenêtre (index sur created_at) sont groupées par jour local : date() de
+    created_at décalé du décalage UTC de `tz` (quelques valeurs au plus, une par changement
+    d'heure). Les jours sont ensuite rangés dans leurs périodes (semaines, mois calendaires)
+    côté Python, ce qui fonctionne à l'identique sur SQLite et PostgreSQL.
+
+    Returns:
+        Liste de {'periode': label, 'count': n} du plus ancien au plus récent
+    """
+    local_starts = _local_period_starts(granularity, periods, tz)
+    bounds = [start.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None) for start in local_starts]
+
+    jour = _local_date(Candidature.created_at, bounds[0], bounds[-1], tz).label('jour')
+    rows = db.session.query(jour, func.count(Candidature.id)) \
+        .filter(
+            Candidature.user_id == user_id,
+            Candidature.created_at >= bounds[0],
+            Candidature.created_at < bounds[-1]
+        ) \
+        .group_by(jour) \
+        .all()
+
+    return _bucket_days(rows, local_starts, granularity, periods)
+
+# ============= Compteurs incrémentaux (rollup) =============
+
+def default_timezone():
+    """Fuseau horaire des compteurs journaliers (STATS_TIMEZONE)"""
+    return get_timezone(current_app.config['STATS_TIMEZONE']) or timezone.utc
+
+def _local_day(created_at: Optional[datetime], tz) -> str:
+    """Jour local (YYYY-MM-DD) d'une date de création stockée en UTC naïf"""
+    created_at = created_at or datetime.utcnow()
+    return created_at.replace(tzinfo=timezone.utc).astimezone(tz).strftime('%Y-%m-%d')
+
+def _etat_key(etat: Optional[str]) -> str:
+    return etat or 'inconnu'
+
+def _contrat_key(type_contrat: Optional[str]) -> str:
+    return type_contrat or 'non_precise'
+
+def _bump(user_id: int, dimension: str, valeur: str, delta: int):
+    """Incrémente atomiquement un compteur (UPSERT), dans la transaction en cours"""
+    dialect = db.session.get_bind().dialect.name
+    values = {'user_id': user_id, 'dimension': dimension, 'valeur': valeur, 'count': delta}
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(UserStatsCounter).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'dimension', 'valeur'],
+            set_={'count': UserStatsCounter.count + delta}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Autres bases : UPDATE puis INSERT si le compteur n'existe pas encore
+    updated = UserStatsCounter.query.filter_by(user_id=user_id, dimension=dimension, valeur=valeur) \
+        .update({'count': UserStatsCounter.count + delta}, synchronize_session=False)
+    if not updated:
+        db.session.add(UserStatsCounter(**values))
+
+def counters_initialized(user_id: int) -> bool:
+    """Le compteur 'total' sert de marqueur : absent, les compteurs seront reconstruits à la lecture"""
+    return db.session.query(UserStatsCounter.id) \
+        .filter_by(user_id=user_id, dimension='total', valeur='') \
+        .first() is not None
+
+def record_candidature(candidature: Candidature, delta: int = 1):
+    """Ajoute (delta=1) ou retire (delta=-1) une candidature de tous les compteurs de son utilisateur"""
+    user_id = candidature.user_id
+    if not counters_initialized(user_id):
+        return
+    _bump(user_id, 'total', '', delta)
+    _bump(user_id, 'etat', _etat_key(candidature.etat), delta)
+    _bump(user_id, 'type_contrat', _contrat_key(candidature.type_contrat), delta)
+    _bump(user_id, 'jour', _local_day(candidature.created_at, default_timezone()), delta)
+
+def record_bulk(user_id: int, rows: List[Dict]):
+    """Ajoute un lot de candidatures (dicts de valeurs insérées) : un seul UPSERT par compteur touché"""
+    if not rows or not counters_initialized(user_id):
+        return
+
+    tz = default_timezone()
+    deltas = {('total', ''): len(rows)}
+    for row in rows:
+        for key in (('etat', _etat_key(row.get('etat'))),
+                    ('type_contrat', _contrat_key(row.get('type_contrat'))),
+                    ('jour', _local_day(row.get('created_at'), tz))):
+            deltas[key] = deltas.get(key, 0) + 1
+
+    for (dimension, valeur), delta in deltas.items():
+        _bump(user_id, dimension, valeur, delta)
+
+def record_change(user_id: int, old_etat: Optional[str], new_etat: Optional[str],
+                  old_contrat: Optional[str] = None, new_contrat: Optional[str] = None):
+    """Déplace une candidature entre compteurs après un changement d'état ou de type de contrat"""
+    etat_changed = _etat_key(old_etat) != _etat_key(new_etat)
+    contrat_changed = _contrat_key(old_contrat) != _contrat_key(new_contrat)
+    if not (etat_changed or contrat_changed) or not counters_initialized(user_id):
+        return
+
+    if etat_changed:
+        _bump(user_id, 'etat', _etat_key(old_etat), -1)
+        _bump(user_id, 'etat', _etat_key(new_etat), 1)
+    if contrat_changed:
+        _bump(user_id, 'type_contrat', _contrat_key(old_contrat), -1)
+        _bump(user_id, 'type_contrat', _contrat_key(new_contrat), 1)
+
+def rebuild_counters(user_id: int):
+    """
+    Recalcule entièrement les compteurs d'un utilisateur depuis la table candidatures
+    (corrige toute dérive). Ne committe pas : à l'appelant de valider la transaction.
+    """
+    UserStatsCounter.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    tz = default_timezone()
+    counters = {('total', ''): 0}
+    rows = db.session.query(Candidature.etat, Candidature.type_contrat, Candidature.created_at) \
+        .filter(Candidature.user_id == user_id) \
+        .yield_per(1000)
+
+    for etat, type_contrat, created_at in rows:
+        for key in (('total', ''),
+                    ('etat', _etat_key(etat)),
+                    ('type_contrat', _contrat_key(type_contrat)),
+                    ('jour', _local_day(created_at, tz))):
+            counters[key] = counters.get(key, 0) + 1
+
+    db.session.add_all([
+        UserStatsCounter(user_id=user_id, dimension=dimension, valeur=valeur, count=count)
+        for (dimension, valeur), count in counters.items()
+    ])
+
+def ensure_counters(user_id: int):
+    """Initialise les compteurs d'un utilisateur qui n'en a pas encore (données antérieures au rollup)"""
+    if counters_initialized(user_id):
+        return
+
+    try:
+        rebuild_counters(user_id)
+        db.session.commit()
+    except IntegrityError:
+        # Une autre requête a initialisé les compteurs en même temps
+        db.session.rollback()
+
+def read_counters(user_id: int, dimension: str) -> Dict[str, int]:
+    """Lit les compteurs d'une dimension pour un utilisateur"""
+    rows = db.session.query(UserStatsCounter.valeur, UserStatsCounter.count) \
+        .filter_by(user_id=user_id, dimension=dimension) \
+        .all()
+    return {valeur: count for valeur, count in rows}
+
+def stats_from_counters(user_id: int) -> Dict:
+    """Total, répartition par état et par type de contrat, lus depuis les compteurs"""
+    ensure_counters(user_id)
+
+    counts = {etat: 0 for etat in ETATS}
+    par_contrat = {}
+    total = 0
+    rows = db.session.query(UserStatsCounter.dimension, UserStatsCounter.valeur, UserStatsCounter.count) \
+        .filter(
+            UserStatsCounter.user_id == user_id,
+            UserStatsCounter.dimension.in_(['total', 'etat', 'type_contrat'])
+        ) \
+        .all()
+
+    for dimension, valeur, count in rows:
+        if dimension == 'total':
+            total = count
+        elif dimension == 'etat' and (count or valeur in counts):
+            counts[valeur] = count
+        elif dimension == 'type_contrat' and count:
+            par_contrat[valeur] = count
+
+    return {'total': total, 'par_etat': counts, 'par_contrat': par_contrat}
+
+def histogram_from_counters(user_id: int, granularity: str = 'day', periods: int = 7) -> List[Dict]:
+    """
+    Même résultat que histogram() dans le fuseau STATS_TIMEZONE, mais en sommant les
+    compteurs journaliers de la fenêtre : le coût ne dépend pas de l'historique de l'utilisateur
+    """
+    ensure_counters(user_id)
+
+    local_starts = _local_period_starts(granularity, periods, default_timezone())
+    rows = db.session.query(UserStatsCounter.valeur, UserStatsCounter.count) \
+        .filter(
+            UserStatsCounter.user_id == user_id,
+            UserStatsCounter.dimension == 'jour',
+            UserStatsCounter.valeur >= local_starts[0].strftime('%Y-%m-%d'),
+            UserStatsCounter.valeur < local_starts[-1].strftime('%Y-%m-%d')
+        ) \
+        .all()
+
+    return _bucket_days(rows, local_starts, granularity, periods)
@@ -0,0 +1,164 @@
+"""
+Stockage des documents par contenu (uploads/objects/<2 premiers caractères>/<sha256>)
+Le fichier reçu est haché pendant son écriture dans uploads/tmp, puis placé sous son empreinte :
+un même CV joint à 200 candidatures n'est stocké qu'une fois. document_files compte les documents
+qui référencent chaque contenu. Retirer la dernière référence laisse la ligne à 0 ; après le commit,
+un DELETE conditionnel (ref_count <= 0) la supprime et le fichier est effacé avant que ce DELETE
+ne soit validé. Un dépôt concurrent du même contenu attend le verrou de la ligne ou la trouve
+référencée, et ne remet son fichier en place qu'après avoir pris sa référence : il n'est jamais perdu.
+"""
+
+import os
+import hashlib
+import secrets
+from typing import BinaryIO, Optional, Tuple
+
+from sqlalchemy import event, delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db, Document, DocumentFile
+
+CHUNK_SIZE = 64 * 1024
+PENDING_UNLINKS = 'storage_pending_unlinks'  # clé de session.info : fichiers à supprimer au commit
+
+class DocumentStorage:
+    """Fichiers des documents, dédupliqués par empreinte SHA-256"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash)
+
+    def receive(self, stream: BinaryIO) -> Tuple[str, str, int]:
+        """Écrit le flux dans un fichier temporaire en le hachant ; renvoie (chemin, empreinte, taille)"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        temp_path = os.path.join(self.tmp_dir, secrets.token_hex(16))
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        return temp_path, digest.hexdigest(), size
+
+    def attach(self, temp_path: str, content_hash: str, size: int) -> Tuple[str, bool]:
+        """
+        Ajoute une référence au contenu (dans la transaction en cours) et met le fichier en place
+
+        La référence est prise avant de mettre le fichier en place, et le fichier temporaire
+        remplace toujours la copie existante (contenu identique) : un fichier manquant, ou effacé
+        par la suppression concurrente de la dernière référence, est recréé par ce dépôt.
+
+        Returns:
+            (chemin du fichier, True s'il n'existait pas encore) ; si la transaction échoue, un
+            fichier créé ici n'est référencé par aucune ligne et doit être supprimé par l'appelant
+        """
+        _add_reference(content_hash, size)
+        path = self.path(content_hash)
+        created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return path, created
+
+    def release(self, document: Document) -> Optional[str]:
+        """
+        Retire la référence d'un document supprimé, dans la transaction en cours
+
+        Returns:
+            Chemin du fichier peut-être devenu inutile (dernière référence, ou document d'avant la
+            déduplication), à passer à delete_after_commit ; None si d'autres documents l'utilisent
+        """
+        if document.content_hash is None:
+            return document.url_fichier
+        DocumentFile.query.filter_by(content_hash=document.content_hash) \
+            .update({'ref_count': DocumentFile.ref_count - 1}, synchronize_session=False)
+        # Ligne verrouillée par l'UPDATE jusqu'au commit : lecture cohérente
+        remaining = db.session.query(DocumentFile.ref_count) \
+            .filter_by(content_hash=document.content_hash) \
+            .scalar()
+        return self.path(document.content_hash) if remaining is not None and remaining <= 0 else None
+
+    def delete_after_commit(self, *paths: Optional[str]):
+        """
+        Supprime ces fichiers après le commit de la transaction en cours (rien en cas de rollback) ;
+        un contenu de nouveau référencé entre-temps est conservé
+        """
+        pending = db.session.info.setdefault(PENDING_UNLINKS, [])
+        for path in paths:
+            if path:
+                # Empreinte connue pour les fichiers du stockage par contenu, None pour les anciens
+                content_hash = os.path.basename(path) if path.startswith(self.objects_dir + os.sep) else None
+                pending.append((path, content_hash))
+
+    def discard(self, temp_path: str):
+        unlink(temp_path)
+
+def unlink(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[STORAGE] Suppression impossible de {path}: {e}")
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_released_files(session):
+    pending = session.info.pop(PENDING_UNLINKS, None)
+    if not pending:
+        return
+    try:
+        # La session ne peut plus exécuter de SQL ici : transactions sur une connexion à part
+        with session.get_bind().connect() as conn:
+            for path, content_hash in pending:
+                if content_hash is None:
+                    unlink(path)  # Fichier d'avant la déduplication, propre au document
+                    continue
+                with conn.begin():
+                    # DELETE conditionnel : rien si un dépôt a repris une référence. Le fichier est
+                    # effacé avant le commit, tant que la ligne est verrouillée : un dépôt concurrent
+                    # attend ce commit pour recréer la ligne puis remettre son fichier en place.
+                    deleted = conn.execute(
+                        delete(DocumentFile).where(DocumentFile.content_hash == content_hash,
+                                                   DocumentFile.ref_count <= 0)
+                    ).rowcount
+                    if deleted:
+                        unlink(path)
+    except SQLAlchemyError as e:
+        # Lignes restées à 0 : réutilisées par le prochain dépôt du même contenu
+        print(f"[STORAGE] Suppression des fichiers libérés impossible: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_released_files(session):
+    session.info.pop(PENDING_UNLINKS, None)
+
+def _add_reference(content_hash: str, size: int):
+    """Incrémente atomiquement le compteur de références (UPSERT)"""
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(DocumentFile).values(content_hash=content_hash, taille=size, ref_count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['content_hash'],
+            set_={'ref_count': DocumentFile.ref_count + 1}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Autres bases : UPDATE puis INSERT si le contenu n'est pas encore connu
+    updated = DocumentFile.query.filter_by(content_hash=content_hash) \
+        .update({'ref_count': DocumentFile.ref_count + 1}, synchronize_session=False)
+    if not updated:
+        db.session.add(DocumentFile(content_hash=content_hash, taille=size, ref_count=1))
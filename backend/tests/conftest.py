@@ -0,0 +1,54 @@
+"""
+Tests sur une base SQLite temporaire : `python -m pytest` depuis backend/
+L'environnement est fixé avant l'import de l'application (config lue à l'import) ; uploads/ et
+les métriques sont écrits dans un dossier temporaire.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix='applicationtrack-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'test.db')
+os.environ['METRICS_DIR'] = os.path.join(WORKDIR, 'metrics')
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['CACHE_BACKEND'] = 'none'
+os.environ['AUTH_REQUIRED'] = 'false'  # Routes appelées sans jeton
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py crée uploads/ dans le dossier courant ; pytest doit garder le sien pour la collecte
+_cwd = os.getcwd()
+os.chdir(WORKDIR)
+from app import app as flask_app  # noqa: E402
+from models import db, User  # noqa: E402
+os.chdir(_cwd)
+
+@pytest.fixture(scope='session', autouse=True)
+def workdir():
+    """Documents reçus écrits sous WORKDIR/uploads"""
+    os.chdir(WORKDIR)
+    yield WORKDIR
+    os.chdir(_cwd)
+
+@pytest.fixture
+def app():
+    """Application sur une base vidée avant chaque test"""
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    user = User(username='alice', email='alice@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
@@ -0,0 +1,95 @@
+"""
+File d'attente des tâches IA : réclamation, nouvelles tentatives, lettre morte, expiration du verrou
+(sur SQLite : l'UPDATE conditionnel seul garantit la réclamation, FOR UPDATE SKIP LOCKED n'existe pas)
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from models import db, AIJob
+from job_service import enqueue, claim_job, complete_job, run_job
+
+def _reload(job_id):
+    db.session.expire_all()
+    return db.session.get(AIJob, job_id)
+
+def _make_runnable(job_id):
+    """Délai de nouvelle tentative écoulé"""
+    AIJob.query.filter_by(id=job_id).update({'run_after': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+def test_claim_then_success(app):
+    job = enqueue('echo', {'value': 1})
+
+    claimed = claim_job('w1')
+    assert claimed.id == job.id
+    assert (claimed.status, claimed.attempts, claimed.locked_by) == ('running', 1, 'w1')
+    assert claim_job('w2') is None  # Déjà réclamée
+
+    run_job(claimed, 'w1', {'echo': lambda payload: {'success': True, 'value': payload['value']}})
+    job = _reload(job.id)
+    assert job.status == 'succeeded'
+    assert json.loads(job.result) == {'success': True, 'value': 1}
+    assert job.locked_by is None
+
+def test_retry_with_backoff_then_dead(app):
+    app.config['AI_JOB_MAX_ATTEMPTS'] = 3
+    job = enqueue('flaky', {})
+    handlers = {'flaky': lambda payload: {'success': False, 'error': 'timeout'}}
+
+    for attempt in range(1, 4):
+        claimed = claim_job('w1')
+        assert claimed.attempts == attempt
+        run_job(claimed, 'w1', handlers)
+        job = _reload(job.id)
+        if attempt < 3:
+            assert job.status == 'queued'
+            assert job.run_after > datetime.utcnow()
+            assert claim_job('w1') is None  # Pas avant le délai
+            _make_runnable(job.id)
+
+    assert job.status == 'dead'
+    assert job.error == 'timeout'
+    assert json.loads(job.result) == {'success': False, 'error': 'timeout'}
+    assert claim_job('w1') is None
+
+def test_non_retryable_error_is_dead_at_first_attempt(app):
+    job = enqueue('config', {})
+    run_job(claim_job('w1'), 'w1', {
+        'config': lambda payload: {'success': False, 'error': 'clé absente', 'retryable': False}
+    })
+    job = _reload(job.id)
+    assert (job.status, job.attempts) == ('dead', 1)
+
+def test_handler_sql_error_leaves_session_usable(app):
+    job = enqueue('sql', {})
+
+    def handler(payload):
+        db.session.execute(text('SELECT * FROM table_absente'))
+
+    run_job(claim_job('w1'), 'w1', {'sql': handler})
+    job = _reload(job.id)
+    assert job.status == 'queued'
+    assert 'table_absente' in job.error
+
+def test_expired_lock_is_reclaimed_and_stale_result_ignored(app):
+    job = enqueue('slow', {})
+    first = claim_job('w1')
+
+    # Worker w1 disparu : verrou plus ancien que AI_JOB_LOCK_TIMEOUT
+    expired = datetime.utcnow() - timedelta(seconds=app.config['AI_JOB_LOCK_TIMEOUT'] + 1)
+    AIJob.query.filter_by(id=job.id).update({'locked_at': expired})
+    db.session.commit()
+
+    second = claim_job('w2')
+    assert second.id == job.id
+    assert (second.attempts, second.locked_by) == (2, 'w2')
+
+    # Le résultat tardif de w1 ne remplace pas l'exécution en cours de w2
+    complete_job(first, 'w1', {'success': True}, None)
+    job = _reload(job.id)
+    assert (job.status, job.locked_by) == ('running', 'w2')
+
+    complete_job(second, 'w2', {'success': True}, None)
+    assert _reload(job.id).status == 'succeeded'
@@ -0,0 +1,60 @@
+"""
+Compteurs de statistiques (rollup) : après chaque écriture, ils doivent égaler une reconstruction
+complète depuis la table candidatures
+"""
+
+from models import db, UserStatsCounter
+from stats_service import ensure_counters, rebuild_counters
+
+def _counters(user_id):
+    """Compteurs non nuls (un décrément peut laisser une ligne à 0)"""
+    db.session.expire_all()
+    rows = UserStatsCounter.query.filter_by(user_id=user_id).all()
+    return {(row.dimension, row.valeur): row.count for row in rows if row.count}
+
+def _assert_matches_rebuild(user_id):
+    maintained = _counters(user_id)
+    rebuild_counters(user_id)
+    db.session.commit()
+    assert maintained == _counters(user_id)
+    return maintained
+
+def _create(client, user_id, **fields):
+    body = {'entreprise': 'Acme', 'annonce': 'Développeur', 'date': '2025-03-01', **fields}
+    response = client.post(f'/api/users/{user_id}/candidatures', json=body)
+    assert response.status_code == 201
+    return response.get_json()['candidature']['id']
+
+def test_counters_match_rebuild_after_each_write(client, user):
+    user_id = user.id
+    ensure_counters(user_id)
+
+    first = _create(client, user_id, type_contrat='CDI')
+    second = _create(client, user_id, etat='entretien')
+    third = _create(client, user_id, type_contrat='Stage')
+    counters = _assert_matches_rebuild(user_id)
+    assert counters[('total', '')] == 3
+    assert counters[('etat', 'en_attente')] == 2
+
+    assert client.patch(f'/api/candidatures/{first}/etat', json={'etat': 'accepte'}).status_code == 200
+    _assert_matches_rebuild(user_id)
+
+    response = client.put(f'/api/candidatures/{second}', json={'etat': 'refuse', 'type_contrat': 'CDD'})
+    assert response.status_code == 200
+    counters = _assert_matches_rebuild(user_id)
+    assert counters[('type_contrat', 'CDD')] == 1
+    assert ('etat', 'entretien') not in counters
+
+    assert client.delete(f'/api/candidatures/{third}').status_code == 200
+    counters = _assert_matches_rebuild(user_id)
+    assert ('type_contrat', 'Stage') not in counters
+
+    rows = [
+        {'entreprise': f'Import {i}', 'annonce': 'Poste', 'etat': 'en_attente' if i % 2 else 'entretien',
+         'type_contrat': 'CDI' if i % 3 else None}
+        for i in range(7)
+    ] + [{'entreprise': '', 'annonce': 'Ligne invalide'}]
+    response = client.post(f'/api/users/{user_id}/candidatures/import', json=rows)
+    assert response.status_code == 200
+    counters = _assert_matches_rebuild(user_id)
+    assert counters[('total', '')] == 9
@@ -0,0 +1,123 @@
+"""
+Stockage par contenu : compteur de références des fichiers partagés, suppression du fichier
+avec sa dernière référence (une seule fois), jamais avant le commit ni s'il est de nouveau référencé
+"""
+
+import io
+import os
+from datetime import datetime
+
+import pytest
+
+import storage_service
+from app import document_storage
+from models import db, Candidature, Document, DocumentFile
+
+CONTENT = b'%PDF-1.4 CV de test'
+
+@pytest.fixture
+def unlinked(monkeypatch):
+    """Chemins effacés par le stockage (la suppression réelle est conservée)"""
+    calls = []
+    real_unlink = storage_service.unlink
+
+    def unlink(path):
+        calls.append(path)
+        real_unlink(path)
+
+    monkeypatch.setattr(storage_service, 'unlink', unlink)
+    return calls
+
+@pytest.fixture
+def candidatures(user):
+    rows = [Candidature(user_id=user.id, entreprise=f'Acme {i}', annonce='Poste', date=datetime.utcnow())
+            for i in range(2)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+def _upload(client, user_id, candidature_id, content=CONTENT):
+    response = client.post(f'/api/candidatures/{candidature_id}/documents', data={
+        'user_id': str(user_id),
+        'file': (io.BytesIO(content), 'cv.pdf'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def _delete(client, user_id, document_id):
+    response = client.delete(f'/api/documents/{document_id}?user_id={user_id}')
+    assert response.status_code == 200
+
+def _ref_count(content_hash):
+    db.session.expire_all()
+    return db.session.query(DocumentFile.ref_count).filter_by(content_hash=content_hash).scalar()
+
+def test_last_reference_unlinks_file_once(client, user, candidatures, unlinked):
+    first = _upload(client, user.id, candidatures[0])
+    second = _upload(client, user.id, candidatures[1])
+
+    documents = Document.query.filter(Document.id.in_([first, second])).all()
+    content_hash = documents[0].content_hash
+    path = document_storage.path(content_hash)
+    assert {d.url_fichier for d in documents} == {path}
+    assert _ref_count(content_hash) == 2
+
+    _delete(client, user.id, first)
+    assert _ref_count(content_hash) == 1
+    assert os.path.exists(path)
+    assert unlinked == []
+
+    _delete(client, user.id, second)
+    assert _ref_count(content_hash) is None
+    assert not os.path.exists(path)
+    assert unlinked == [path]
+
+def test_candidature_delete_releases_its_documents(client, user, candidatures, unlinked):
+    _upload(client, user.id, candidatures[0])
+    _upload(client, user.id, candidatures[0])
+    content_hash = Document.query.first().content_hash
+
+    assert client.delete(f'/api/candidatures/{candidatures[0]}').status_code == 200
+    assert _ref_count(content_hash) is None
+    assert unlinked == [document_storage.path(content_hash)]
+    assert not os.path.exists(document_storage.path(content_hash))
+
+def test_rollback_keeps_file(client, user, candidatures, unlinked):
+    document_id = _upload(client, user.id, candidatures[0])
+    document = db.session.get(Document, document_id)
+
+    document_storage.delete_after_commit(document_storage.release(document))
+    db.session.delete(document)
+    db.session.rollback()
+
+    assert _ref_count(document.content_hash) == 1
+    assert os.path.exists(document.url_fichier)
+    assert unlinked == []
+
+def test_new_reference_before_commit_keeps_file(client, user, candidatures, unlinked):
+    document_id = _upload(client, user.id, candidatures[0])
+    document = db.session.get(Document, document_id)
+    content_hash, path = document.content_hash, document.url_fichier
+
+    # Dernière référence retirée puis reprise par un nouveau dépôt du même contenu avant le commit
+    document_storage.delete_after_commit(document_storage.release(document))
+    db.session.delete(document)
+    temp_path, received_hash, size = document_storage.receive(io.BytesIO(CONTENT))
+    assert received_hash == content_hash
+    document_storage.attach(temp_path, received_hash, size)
+    db.session.add(Document(candidature_id=candidatures[1], nom_fichier='cv.pdf', type_document='cv',
+                            url_fichier=path, taille=size, content_hash=content_hash))
+    db.session.commit()
+
+    assert _ref_count(content_hash) == 1
+    assert os.path.exists(path)
+    assert unlinked == []
+
+def test_upload_restores_missing_file(client, user, candidatures):
+    document_id = _upload(client, user.id, candidatures[0])
+    path = db.session.get(Document, document_id).url_fichier
+    os.remove(path)
+
+    _upload(client, user.id, candidatures[1])
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
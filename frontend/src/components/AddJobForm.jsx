@@ -1,5 +1,6 @@
 import { useState } from 'react';
 import { X, Plus, Tag, User, Mail, Phone, Sparkles, Loader, Link as LinkIcon } from 'lucide-react';
+import { runAIJob } from '../services/api';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000/api';
 
@@ -107,17 +108,10 @@ function AddJobForm({ onAddJob }) {
     
     try {
       console.log('[AI Parse Frontend] URL:', `${API_URL}/ai/parse-announcement`);
-      const response = await fetch(`${API_URL}/ai/parse-announcement`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ 
-          text: parseMode === 'text' ? aiParseText : '',
-          url: parseMode === 'url' ? aiParseUrl : null
-        })
+      const result = await runAIJob('parse-announcement', {
+        text: parseMode === 'text' ? aiParseText : '',
+        url: parseMode === 'url' ? aiParseUrl : null
       });
-
-      console.log('[AI Parse Frontend] Status:', response.status);
-      const result = await response.json();
       console.log('[AI Parse Frontend] Résultat:', result);
 
       if (result.success && result.data) {
@@ -23,47 +23,6 @@ export default function CSVImport({ user, onImportComplete, onClose }) {
     }
   };
 
-  const parseCSV = (text) => {
-    const lines = text.split('\n').filter(line => line.trim());
-    if (lines.length < 2) {
-      throw new Error('Le fichier CSV doit contenir au moins une ligne d\'en-tête et une ligne de données.');
-    }
-
-    const headers = lines[0].split(',').map(h => h.trim().toLowerCase());
-    const rows = [];
-
-    for (let i = 1; i < lines.length; i++) {
-      const values = lines[i].split(',').map(v => v.trim());
-      const row = {};
-      
-      headers.forEach((header, index) => {
-        row[header] = values[index] || '';
-      });
-
-      rows.push(row);
-    }
-
-    return rows;
-  };
-
-  const mapRowToCandidature = (row) => {
-    const today = new Date().toISOString().split('T')[0];
-    
-    return {
-      entreprise: row.entreprise || row.company || row.societe || '',
-      annonce: row.annonce || row.poste || row.position || row.description || '',
-      date: row.date || today,
-      etat: row.etat || row.statut || row.status || 'en_attente',
-      notes: row.notes || row.commentaires || row.comments || '',
-      type_contrat: row.type_contrat || row.contrat || row.contract || '',
-      localisation: row.localisation || row.ville || row.location || row.city || '',
-      salaire: row.salaire || row.salary || '',
-      contact_nom: row.contact_nom || row.contact || '',
-      contact_email: row.contact_email || row.email || '',
-      contact_telephone: row.contact_telephone || row.telephone || row.phone || ''
-    };
-  };
-
   const handleImport = async () => {
     if (!file) {
       setError('Veuillez sélectionner un fichier.');
@@ -75,57 +34,30 @@ export default function CSVImport({ user, onImportComplete, onClose }) {
     setResults(null);
 
     try {
-      const text = await file.text();
-      const rows = parseCSV(text);
+      // Le fichier est envoyé en une seule requête : le serveur le lit en flux et insère par lots
+      const formData = new FormData();
+      formData.append('file', file);
+
+      const response = await fetch(`${API_URL}/users/${user.id}/candidatures/import`, {
+        method: 'POST',
+        body: formData
+      });
+      const data = await response.json();
+
+      if (!response.ok) {
+        throw new Error(data.error || 'Erreur lors de l\'import');
+      }
 
-      if (rows.length === 0) {
+      if (data.total === 0) {
         throw new Error('Aucune donnée trouvée dans le fichier CSV.');
       }
 
       const importResults = {
-        total: rows.length,
-        success: 0,
-        errors: []
+        total: data.total,
+        success: data.imported,
+        errors: data.errors
       };
 
-      for (let i = 0; i < rows.length; i++) {
-        const row = rows[i];
-        const candidature = mapRowToCandidature(row);
-
-        if (!candidature.entreprise || !candidature.annonce) {
-          importResults.errors.push({
-            row: i + 2,
-            error: 'Entreprise et annonce sont obligatoires'
-          });
-          continue;
-        }
-
-        try {
-          const response = await fetch(`${API_URL}/users/${user.id}/candidatures`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(candidature)
-          });
-
-          if (response.ok) {
-            importResults.success++;
-          } else {
-            const data = await response.json();
-            importResults.errors.push({
-              row: i + 2,
-              error: data.error || 'Erreur inconnue'
-            });
-          }
-        } catch (err) {
-          importResults.errors.push({
-            row: i + 2,
-            error: err.message
-          });
-        }
-      }
-
       setResults(importResults);
 
       if (importResults.success > 0) {
@@ -185,7 +117,7 @@ Microsoft,Ingénieur DevOps,2025-12-18,entretien_passe,CDI,Lyon,55000€,Recomma
             <ul className="text-sm text-blue-800 space-y-1 ml-4">
               <li>• <strong>entreprise</strong> (obligatoire)</li>
               <li>• <strong>annonce</strong> (obligatoire)</li>
-              <li>• date, etat, type_contrat, localisation, salaire, notes</li>
+              <li>• date, etat, type_contrat, localisation, salaire, notes, tags, rappel_date</li>
               <li>• contact_nom, contact_email, contact_telephone</li>
             </ul>
             <button
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { FileText, Sparkles, Download, Copy, Check, Loader, AlertCircle } from 'lucide-react';
+import { streamCoverLetter } from '../services/api';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000/api';
 
@@ -56,19 +57,11 @@ export default function CoverLetterGenerator({ candidature, user, onClose }) {
     setGeneratedLetter('');
 
     try {
-      const response = await fetch(`${API_URL}/ai/generate-cover-letter`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-          candidature_id: candidature.id,
-          user_profile: userProfile,
-          provider: provider
-        })
-      });
-
-      const data = await response.json();
+      const data = await streamCoverLetter({
+        candidature_id: candidature.id,
+        user_profile: userProfile,
+        provider: provider
+      }, (text) => setGeneratedLetter(prev => prev + text));
 
       if (data.success) {
         setGeneratedLetter(data.letter);
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Calendar, Bell, Sparkles, Target, TrendingUp } from 'lucide-react';
+import { runAIJob, streamCoverLetter } from '../services/api';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000/api';
 
@@ -48,19 +49,12 @@ function JobConsultation({ job, onBack, etats, userId }) {
     try {
       console.log('[Matching Score] Envoi requête pour job:', job.id, 'user:', userId);
       
-      const response = await fetch(`${API_URL}/ai/matching-score`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          candidature_id: job.id,
-          user_id: userId,
-          experience: '3 ans',  // À adapter depuis le profil user
-          competences: 'React, Node.js, Python'  // À adapter
-        })
+      const data = await runAIJob('matching-score', {
+        candidature_id: job.id,
+        user_id: userId,
+        experience: '3 ans',  // À adapter depuis le profil user
+        competences: 'React, Node.js, Python'  // À adapter
       });
-
-      console.log('[Matching Score] Statut réponse:', response.status);
-      const data = await response.json();
       console.log('[Matching Score] Données reçues:', data);
       
       if (data.success && data.analysis) {
@@ -88,26 +82,19 @@ function JobConsultation({ job, onBack, etats, userId }) {
 
     setLoading(true);
     setError('');
+    setGeneratedLetter('');
 
     try {
-      const response = await fetch(`${API_URL}/ai/generate-cover-letter`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
+      const data = await streamCoverLetter({
+        candidature_id: job.id,
+        user_profile: {
+          name: coverLetterData.name,
+          skills: coverLetterData.skills,
+          experience: coverLetterData.experience,
+          motivation: coverLetterData.motivation
         },
-        body: JSON.stringify({
-          candidature_id: job.id,
-          user_profile: {
-            name: coverLetterData.name,
-            skills: coverLetterData.skills,
-            experience: coverLetterData.experience,
-            motivation: coverLetterData.motivation
-          },
-          provider: 'gemini' // Utilise Gemini par défaut
-        })
-      });
-
-      const data = await response.json();
+        provider: 'gemini' // Utilise Gemini par défaut
+      }, (text) => setGeneratedLetter(prev => prev + text));
 
       if (data.success) {
         setGeneratedLetter(data.letter);
@@ -100,6 +100,74 @@ export const exportCandidatures = async (userId) => {
   return response.blob();
 };
 
+// ============= Tâches IA =============
+
+// Les endpoints IA répondent tout de suite avec un job_id : on interroge l'état de la tâche
+// jusqu'à son résultat, qui a le même format que l'ancienne réponse synchrone
+export const runAIJob = async (endpoint, body, { interval = 1000, timeout = 180000 } = {}) => {
+  const response = await fetch(`${API_URL}/ai/${endpoint}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  const job = await response.json();
+  if (!response.ok || !job.job_id) {
+    return job;
+  }
+
+  const deadline = Date.now() + timeout;
+  while (Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, interval));
+    const status = await fetch(`${API_URL}/ai/jobs/${job.job_id}`).then(res => res.json());
+    if (status.status === 'succeeded' || status.status === 'dead') {
+      return status.result;
+    }
+  }
+  return { success: false, error: 'La tâche IA a pris trop de temps, réessayez plus tard.' };
+};
+
+// Génération de lettre en streaming (Server-Sent Events sur une requête POST) :
+// onToken reçoit chaque morceau de texte, le résultat final a le même format que runAIJob
+export const streamCoverLetter = async (body, onToken) => {
+  const response = await fetch(`${API_URL}/ai/generate-cover-letter/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  if (!response.ok) {
+    const error = await response.json();
+    return { success: false, error: error.error || 'Erreur lors de la génération' };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let letter = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Les événements sont séparés par une ligne vide
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const type = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+      if (type === 'token') {
+        letter += data.text;
+        onToken(data.text);
+      } else if (type === 'done') {
+        return { success: true, letter, provider: data.provider, tokens_used: data.tokens_used };
+      } else if (type === 'error') {
+        return { success: false, error: data.error };
+      }
+    }
+  }
+  return { success: false, error: 'Flux interrompu avant la fin de la génération' };
+};
+
 // ============= Health Check =============
 
 export const healthCheck = async () => {